@@ -0,0 +1,324 @@
+"""
+Admission control for Canvas-bound requests.
+
+Every user gets a token bucket: a request takes tokens by its route's cost
+(all-data fans out over every course, so it costs more than one course's
+data) and a user who runs dry is turned away with 429 and a Retry-After for
+when the bucket refills. Admitted requests then share a fixed number of
+Canvas slots per process. When all slots are busy, requests wait in one queue
+per user and a freed slot goes to the next user in turn, so one user's burst
+of reloads can't push everyone else to the back. A request that can't get a
+slot within GLIDE_ADMISSION_MAX_WAIT, or finds its user's queue or the whole
+queue full, is rejected right away instead of piling up in front of workers.
+Requests served by the ASGI app wait on a future of their event loop rather
+than a thread, in the same queues and under the same limits.
+"""
+import asyncio
+import collections
+import math
+import os
+import threading
+import time
+
+USER_RATE = float(os.getenv('GLIDE_USER_RATE', 4))           # tokens per second
+USER_BURST = float(os.getenv('GLIDE_USER_BURST', 20))
+CANVAS_SLOTS = int(os.getenv('GLIDE_CANVAS_SLOTS', 16))     # concurrent Canvas-bound requests per process
+MAX_WAIT = float(os.getenv('GLIDE_ADMISSION_MAX_WAIT', 2))
+MAX_USER_QUEUE = int(os.getenv('GLIDE_ADMISSION_USER_QUEUE', 4))
+MAX_QUEUE = int(os.getenv('GLIDE_ADMISSION_QUEUE', CANVAS_SLOTS * 4))
+ENABLED = os.getenv('GLIDE_ADMISSION', 'true').lower() == 'true'
+
+WARMUP_ROUTE = 'warmup'
+ROUTE_COSTS = {
+    '/api/canvas/all-data': 5,
+    '/api/canvas/load-more-courses': 3,
+    '/api/canvas/dashboard': 2,
+    '/api/canvas/analytics': 2,
+    # Worker warmup loads every current course of a user, like all-data
+    WARMUP_ROUTE: 5
+}
+# Cheap or long-lived routes that don't go through admission
+EXEMPT_ROUTES = {'/', '/api/canvas/status', '/api/canvas/stream', '/api/canvas/events'}
+EXEMPT_PREFIXES = ('/api/admin/',)
+# Idle full buckets are dropped after this long
+BUCKET_IDLE_SECONDS = 600
+# Smoothing of the slot hold time used for Retry-After estimates
+SERVICE_TIME_WEIGHT = 0.1
+
+
+class Rejected(Exception):
+    """A request turned away; retry_after is whole seconds for the Retry-After header"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Too many requests ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def is_admitted_route(route):
+    return route not in EXEMPT_ROUTES and not route.startswith(EXEMPT_PREFIXES)
+
+
+def route_cost(route):
+    return ROUTE_COSTS.get(route, 1)
+
+
+class TokenBuckets:
+    """One token bucket per user"""
+
+    def __init__(self, rate=USER_RATE, burst=USER_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}    # user_id -> [tokens, updated_at]
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+
+    def take(self, user_id, cost=1):
+        """Take cost tokens; 0 if taken, else seconds until the user has enough"""
+        cost = min(cost, self.burst)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if now - self._pruned_at >= BUCKET_IDLE_SECONDS:
+                self._prune(now)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0
+            return (cost - bucket[0]) / self.rate
+
+    def _prune(self, now):
+        self._pruned_at = now
+        for user_id, (tokens, updated_at) in list(self._buckets.items()):
+            if now - updated_at >= BUCKET_IDLE_SECONDS:
+                del self._buckets[user_id]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class ThreadWaiter:
+    """A queued request blocked in a thread"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.handed = False
+
+    def hand_over(self):
+        self.handed = True
+        self.event.set()
+        return True
+
+
+class AsyncWaiter:
+    """A queued request awaiting a future on its event loop"""
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.handed = False
+
+    def hand_over(self):
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            # The loop has closed; the slot goes to the next waiter
+            return False
+        self.handed = True
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class FairScheduler:
+    """A fixed number of slots, handed out round-robin between users' wait queues"""
+
+    def __init__(self, slots=CANVAS_SLOTS, max_user_queue=MAX_USER_QUEUE, max_queue=MAX_QUEUE):
+        self.slots = slots
+        self.max_user_queue = max_user_queue
+        self.max_queue = max_queue
+        self.active = 0
+        self.waiting = 0
+        self.service_time = 1.0
+        self._queues = collections.OrderedDict()    # user_id -> deque of waiters, next user first
+        self._lock = threading.Lock()
+
+    def retry_after(self):
+        """Rough seconds until a new request would get a slot"""
+        return max(1, math.ceil(self.service_time * (self.waiting + 1) / self.slots))
+
+    def _enqueue(self, user_id, timeout, make_waiter):
+        """None if a slot was free (and is now held), else the queued waiter; Rejected if the queues are full"""
+        with self._lock:
+            if self.active < self.slots and not self._queues:
+                self.active += 1
+                return None
+            queue = self._queues.get(user_id)
+            if self.waiting >= self.max_queue or (queue and len(queue) >= self.max_user_queue) or timeout <= 0:
+                raise Rejected('overloaded', self.retry_after())
+            waiter = make_waiter()
+            if queue is None:
+                queue = self._queues[user_id] = collections.deque()
+            queue.append(waiter)
+            self.waiting += 1
+            return waiter
+
+    def _withdraw(self, user_id, waiter):
+        """Take a waiter out of its queue; False if it was handed a slot first (it then holds it)"""
+        with self._lock:
+            if waiter.handed:
+                return False
+            queue = self._queues.get(user_id)
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[user_id]
+            self.waiting -= 1
+            return True
+
+    def acquire(self, user_id, timeout=MAX_WAIT):
+        """Block until a slot is free; Rejected if the queues are full or the wait runs out"""
+        waiter = self._enqueue(user_id, timeout, ThreadWaiter)
+        if waiter is None:
+            return 0
+        started = time.monotonic()
+        # The slot may be handed over just as the wait runs out
+        if waiter.event.wait(timeout) or not self._withdraw(user_id, waiter):
+            return time.monotonic() - started
+        raise Rejected('queue timeout', self.retry_after())
+
+    async def acquire_async(self, user_id, timeout=MAX_WAIT):
+        """acquire() for a coroutine: waits on the event loop without holding a thread"""
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(user_id, timeout, lambda: AsyncWaiter(loop))
+        if waiter is None:
+            return 0
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except asyncio.TimeoutError:
+            if self._withdraw(user_id, waiter):
+                raise Rejected('queue timeout', self.retry_after())
+        except asyncio.CancelledError:
+            # The client went away; pass on a slot that was already handed over
+            if not self._withdraw(user_id, waiter):
+                self.release()
+            raise
+        return time.monotonic() - started
+
+    def release(self, held=None):
+        """Free a slot, handing it straight to the next user in turn if anyone is waiting"""
+        with self._lock:
+            if held is not None:
+                self.service_time += SERVICE_TIME_WEIGHT * (held - self.service_time)
+            if not self._queues:
+                self.active -= 1
+                return
+            while self._queues:
+                user_id, queue = next(iter(self._queues.items()))
+                waiter = queue.popleft()
+                if queue:
+                    self._queues.move_to_end(user_id)
+                else:
+                    del self._queues[user_id]
+                self.waiting -= 1
+                if waiter.hand_over():
+                    return
+            self.active -= 1
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'active': self.active,
+                'waiting': self.waiting,
+                'waiting_users': len(self._queues),
+                'service_time': round(self.service_time, 3)
+            }
+
+
+class AdmissionController:
+    """Token buckets in front of the fair scheduler, with counters for the status endpoint"""
+
+    def __init__(self, buckets=None, scheduler=None, enabled=ENABLED):
+        self.buckets = buckets or TokenBuckets()
+        self.scheduler = scheduler or FairScheduler()
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.counts = collections.Counter()
+        self.wait_seconds = 0.0
+
+    def admit(self, user_id, route, timeout=MAX_WAIT):
+        """Admit one request: True if it holds a slot (release() it when done), Rejected otherwise"""
+        if not self._charge(user_id, route):
+            return False
+        try:
+            waited = self.scheduler.acquire(user_id, timeout)
+        except Rejected as e:
+            self._count_rejection(e)
+            raise
+        self._admitted(waited)
+        return True
+
+    async def admit_async(self, user_id, route, timeout=MAX_WAIT):
+        """admit() for the ASGI app, queueing on the event loop"""
+        if not self._charge(user_id, route):
+            return False
+        try:
+            waited = await self.scheduler.acquire_async(user_id, timeout)
+        except Rejected as e:
+            self._count_rejection(e)
+            raise
+        self._admitted(waited)
+        return True
+
+    def _charge(self, user_id, route):
+        """Take the route's tokens; False if the route isn't admitted, Rejected if the user ran dry"""
+        if not self.enabled or not is_admitted_route(route):
+            return False
+        wait = self.buckets.take(user_id, route_cost(route))
+        if wait:
+            self._count('rejected_rate_limit')
+            raise Rejected('rate limit', max(1, math.ceil(wait)))
+        return True
+
+    def _count_rejection(self, error):
+        self._count('rejected_timeout' if error.reason == 'queue timeout' else 'rejected_overloaded')
+
+    def _admitted(self, waited):
+        with self._lock:
+            self.counts['admitted'] += 1
+            if waited:
+                self.counts['queued'] += 1
+                self.wait_seconds += waited
+
+    def release(self, held=None):
+        self.scheduler.release(held)
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def metrics(self):
+        with self._lock:
+            counts = dict(self.counts)
+            queued = counts.get('queued', 0)
+            wait_seconds = self.wait_seconds
+        return dict(
+            self.scheduler.metrics(),
+            enabled=self.enabled,
+            users=len(self.buckets),
+            admitted=counts.get('admitted', 0),
+            queued=queued,
+            mean_queue_wait=round(wait_seconds / queued, 4) if queued else 0.0,
+            rejected_rate_limit=counts.get('rejected_rate_limit', 0),
+            rejected_overloaded=counts.get('rejected_overloaded', 0),
+            rejected_timeout=counts.get('rejected_timeout', 0)
+        )
+
+
+admission = AdmissionController()
@@ -0,0 +1,44 @@
+"""
+Summaries of Canvas course analytics.
+
+Canvas returns raw activity: the course's page views and participations per
+day, and a student's page views per hour plus one row per participation. The
+dashboard only needs totals, so these are reduced before caching.
+"""
+
+# Analytics lag behind activity by hours anyway
+ANALYTICS_TTL = 6 * 3600
+
+
+def summarize_student_activity(activity):
+    """/courses/:id/analytics/users/:id/activity -> page view and participation totals"""
+    page_views = (activity or {}).get('page_views') or {}
+    participations = (activity or {}).get('participations') or []
+
+    active_days = {timestamp[:10] for timestamp in page_views}
+    times = list(page_views) + [row.get('created_at') for row in participations if row.get('created_at')]
+
+    return {
+        'page_views': {'total': sum(page_views.values()), 'active_days': len(active_days)},
+        'participations': {'total': len(participations)},
+        'last_activity_at': max(times) if times else None
+    }
+
+
+def summarize_course_activity(days):
+    """/courses/:id/analytics/activity -> per-day page view and participation stats"""
+    days = days or []
+
+    def stats(field):
+        values = [day.get(field) or 0 for day in days]
+        return {
+            'total': sum(values),
+            'max': max(values) if values else 0,
+            'mean': round(sum(values) / len(values), 1) if values else 0
+        }
+
+    return {
+        'page_views': stats('views'),
+        'participations': stats('participations'),
+        'days': len(days)
+    }
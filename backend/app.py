@@ -1,10 +1,27 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-from canvas_manager import CanvasManager
+from canvas_manager import CanvasManager, professors_from_announcements, is_placeholder_professors, choose_course_professors, absorb_cached_snapshots
+from search_index import search_indexes, DOCUMENT_TYPES
+from timeline_index import timeline_indexes, canvas_timestamp, decode_cursor, TIMELINE_SYNC_INTERVAL
+from pagination import DEFAULT_PAGE_SIZE, InvalidCursor
+from events import apply_event, replay_events, check_token, EventError
+from push_hub import push_hub
+from deadlines import REQUEST_BUDGET
+from circuit_breaker import breaker_statuses
+from shared_cache import get_cache_store
+from rich_text import content_cache, without_bodies, find_body, BODY_FIELDS
+from file_store import get_file_content_cache, parse_range
+from startup import worker_init
+from admission import admission, Rejected
+import profiler
+import hmac
+import json
+import queue
 import os
 from dotenv import load_dotenv
 import concurrent.futures
 import threading
+import time
 
 # Load environment variables
 load_dotenv()
@@ -12,10 +29,69 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+@app.before_request
+def start_request_profile():
+    # Tags the thread with its route for the sampler; cProfiles the request if its route is sampled
+    g.route = request.url_rule.rule if request.url_rule else request.path
+    g.started_at = time.perf_counter()
+    g.profile = profiler.request_started(g.route)
+
+@app.teardown_request
+def finish_request_profile(error=None):
+    if 'route' in g:
+        profiler.request_finished(g.route, g.profile, time.perf_counter() - g.started_at)
+
+def request_user_id():
+    user_id = request.args.get('user_id')
+    if not user_id and request.is_json:
+        user_id = (request.get_json(silent=True) or {}).get('user_id')
+    return user_id or request.remote_addr
+
+def too_many_requests(rejected):
+    response = jsonify({"error": str(rejected)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(rejected.retry_after)
+    return response
+
+@app.before_request
+def sync_events():
+    # Events another worker received; a throttled read of the shared store's event log
+    replay_events()
+
+@app.before_request
+def admit_request():
+    # Per-user rate limit and a fair share of the process's Canvas slots; 429 when overloaded
+    try:
+        g.admitted = admission.admit(request_user_id(), g.route)
+    except Rejected as e:
+        g.admitted = False
+        return too_many_requests(e)
+    g.admitted_at = time.perf_counter()
+
+@app.teardown_request
+def release_admission(error=None):
+    if g.get('admitted'):
+        g.admitted = False
+        admission.release(time.perf_counter() - g.admitted_at)
+
 @app.route('/')
 def index():
     return jsonify({"status": "Canvas API Backend is running"})
 
+@app.route('/api/canvas/status', methods=['GET'])
+def status():
+    """Health of the Canvas hosts this process talks to, and cache gauges"""
+    return jsonify({
+        "data": {
+            "canvas_hosts": breaker_statuses(),
+            "cache": get_cache_store().metrics(),
+            "content": content_cache.metrics(),
+            "files": get_file_content_cache().metrics(),
+            "admission": admission.metrics()
+        },
+        "error": None
+    })
+
 @app.route('/api/canvas/init', methods=['POST'])
 def initialize_canvas():
     """Initialize Canvas API for a user"""
@@ -83,13 +159,21 @@ def get_course_data(course_id):
     load_discussions = request.args.get('load_discussions', 'true').lower() == 'true'
     load_groups = request.args.get('load_groups', 'true').lower() == 'true'
     load_analytics = request.args.get('load_analytics', 'true').lower() == 'true'
+    # bodies=excerpt leaves out full HTML bodies (see /content for one body)
+    full_bodies = request.args.get('bodies', 'full').lower() != 'excerpt'
 
     if not user_id:
         return jsonify({"error": "User ID is required"}), 400
 
+    # Optional time budget in seconds; sections that miss it come back under "pending"
+    try:
+        budget_seconds = float(request.args['timeout']) if request.args.get('timeout') else REQUEST_BUDGET
+    except ValueError:
+        return jsonify({"error": "timeout must be a number of seconds"}), 400
+
     try:
         # Initialize Canvas manager with user credentials from Firebase
-        canvas_manager = CanvasManager(user_id=user_id)
+        canvas_manager = CanvasManager(user_id=user_id, budget_seconds=budget_seconds)
 
         # Get complete class data - this is now cached
         course_data = canvas_manager.get_complete_class_data(course_id)
@@ -97,36 +181,14 @@ def get_course_data(course_id):
         if not course_data:
             return jsonify({"error": f"No data found for course {course_id}"}), 404
 
+        # The snapshot is shared through the cache store; trim and patch a copy, never the cached dict
+        course_data = dict(course_data)
+
         # Check if we need to extract professor info from announcements
-        if (not course_data.get('professors') or
-            (len(course_data['professors']) == 1 and course_data['professors'][0]['name'] == 'Course Instructor')):
-
-            # Try to extract professor info from announcements
-            if course_data.get('announcements'):
-                professors = []
-                for announcement in course_data['announcements']:
-                    if 'author' in announcement and announcement['author'] and 'display_name' in announcement['author']:
-                        prof_name = announcement['author']['display_name']
-                        prof_id = announcement['author'].get('id', 0)
-
-                        # Check if this professor is already in our list
-                        prof_exists = False
-                        for prof in professors:
-                            if prof['name'] == prof_name:
-                                prof_exists = True
-                                break
-
-                        if not prof_exists:
-                            professors.append({
-                                'id': prof_id,
-                                'name': prof_name,
-                                'role': 'Teacher',
-                                'email': None,
-                                'avatar_url': announcement['author'].get('avatar_image_url')
-                            })
-
-                if professors:
-                    course_data['professors'] = professors
+        if is_placeholder_professors(course_data.get('professors')):
+            professors = professors_from_announcements(course_data.get('announcements'))
+            if professors:
+                course_data['professors'] = professors
 
         # Remove data that wasn't requested to reduce payload size
         if not load_modules and 'modules' in course_data:
@@ -144,6 +206,9 @@ def get_course_data(course_id):
         if not load_analytics and 'analytics' in course_data:
             del course_data['analytics']
 
+        if not full_bodies:
+            course_data = without_bodies(course_data)
+
         return jsonify({
             "status": "success",
             "course_data": course_data
@@ -151,6 +216,38 @@ def get_course_data(course_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/canvas/course-data/<course_id>/content', methods=['GET'])
+def get_course_content(course_id):
+    """Get the full sanitized body (and its plain text) of one announcement, discussion, assignment or the syllabus"""
+    user_id = request.args.get('user_id')
+    kind = request.args.get('type')
+    entity_id = request.args.get('id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+    if kind not in BODY_FIELDS:
+        return jsonify({"error": f"type must be one of: {', '.join(BODY_FIELDS)}"}), 400
+    if kind != 'syllabus' and not entity_id:
+        return jsonify({"error": "id is required"}), 400
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        # Bodies are read from the cached course snapshot
+        course_data = canvas_manager.get_complete_class_data(course_id)
+        content = find_body(course_data, kind, entity_id) if course_data else None
+
+        if content is None:
+            return jsonify({"error": f"No {kind} content found"}), 404
+
+        return jsonify({
+            "data": content,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @app.route('/api/canvas/all-classes', methods=['GET'])
 def get_all_classes():
     """Get classes for a user (current semester by default)"""
@@ -164,8 +261,14 @@ def get_all_classes():
         # Initialize Canvas manager with user credentials from Firebase
         canvas_manager = CanvasManager(user_id=user_id)
 
-        # Get classes (current semester by default, or all if specified)
-        classes = canvas_manager.get_all_classes() if load_all else canvas_manager.get_current_classes()
+        # Get classes (current semester by default, all if specified, or a specific term set)
+        term = request.args.get('term')
+        if term == 'past':
+            classes = canvas_manager.get_past_classes()
+        elif term == 'future':
+            classes = canvas_manager.get_future_classes()
+        else:
+            classes = canvas_manager.get_all_classes() if load_all or term == 'all' else canvas_manager.get_current_classes()
 
         if not classes:
             return jsonify({"error": "No classes found"}), 404
@@ -260,10 +363,9 @@ def get_announcements():
             try:
                 announcements = canvas_manager.get_course_announcements(course_id)
                 if announcements:
+                    # Cached announcements are shared; tag copies with their course
                     for announcement in announcements:
-                        announcement['course_name'] = course_name
-                        announcement['course_id'] = course_id
-                        all_announcements.append(announcement)
+                        all_announcements.append(dict(announcement, course_name=course_name, course_id=course_id))
             except Exception as e:
                 print(f"Error getting announcements for course {course_id}: {str(e)}")
 
@@ -274,6 +376,235 @@ def get_announcements():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/canvas/grades', methods=['GET'])
+def get_grades():
+    """Get the user's grades across courses, with an overall average"""
+    user_id = request.args.get('user_id')
+    load_all = request.args.get('load_all', 'false').lower() == 'true'
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        summary = canvas_manager.get_grade_summary(load_all=load_all)
+
+        if summary is None:
+            return jsonify({"error": "No grades found"}), 404
+
+        return jsonify({
+            "data": summary,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/canvas/dashboard', methods=['GET'])
+def get_dashboard():
+    """Get the user's precomputed dashboard: courses, merged assignments, recent announcements and stats"""
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        dashboard = canvas_manager.get_dashboard()
+
+        if dashboard is None:
+            return jsonify({"error": "No dashboard data found"}), 404
+
+        return jsonify({
+            "data": dashboard,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/canvas/analytics', methods=['GET'])
+def get_analytics():
+    """Get activity analytics for the given courses (comma separated course_id) or all current ones"""
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    course_ids = [course_id for course_id in request.args.get('course_id', '').split(',') if course_id]
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        analytics = canvas_manager.get_courses_analytics(course_ids or None)
+
+        if analytics is None:
+            return jsonify({"error": "No analytics found"}), 404
+
+        return jsonify({
+            "data": analytics,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/canvas/search', methods=['GET'])
+def search_course_content():
+    """Search announcements, discussions, assignments, modules, files and syllabi"""
+    user_id = request.args.get('user_id')
+    query = request.args.get('q', '').strip()
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    if not query:
+        return jsonify({"error": "Search query is required"}), 400
+
+    # Optional filters: course_id and type may be repeated or comma separated
+    course_ids = [value for param in request.args.getlist('course_id') for value in param.split(',') if value]
+    types = [value for param in request.args.getlist('type') for value in param.split(',') if value]
+    unknown_types = [value for value in types if value not in DOCUMENT_TYPES]
+    if unknown_types:
+        return jsonify({"error": f"Unknown content type: {', '.join(unknown_types)}"}), 400
+
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = min(100, max(1, int(request.args.get('per_page', 20))))
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+
+    try:
+        # Served from the in-memory index, built as course data is loaded; snapshots
+        # other workers built are picked up from the cache store (no Canvas calls)
+        absorb_cached_snapshots(user_id)
+        index = search_indexes.peek(user_id)
+        if index is None:
+            results = {"results": [], "total": 0, "page": page, "per_page": per_page, "took_ms": 0}
+        else:
+            results = index.search(query, course_ids=course_ids, types=types, page=page, per_page=per_page)
+
+        return jsonify({
+            "data": results,
+            "indexed": index is not None,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Longest date range one calendar request may ask for
+CALENDAR_MAX_RANGE = 366 * 86400
+
+def parse_date_param(value):
+    """Epoch seconds for a YYYY-MM-DD or ISO-8601 query parameter"""
+    if not value:
+        return None
+    if len(value) == 10:
+        value = f"{value}T00:00:00Z"
+    timestamp = canvas_timestamp(value)
+    if timestamp is None:
+        raise ValueError(f"Invalid date: {value}")
+    return timestamp
+
+@app.route('/api/canvas/upcoming', methods=['GET'])
+def get_upcoming():
+    """Get assignments, tests and calendar events across all current courses, ordered by due date"""
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        start_ts = parse_date_param(request.args.get('start'))
+        end_ts = parse_date_param(request.args.get('end'))
+        limit = min(200, max(1, int(request.args.get('limit', 50))))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if start_ts is None:
+        start_ts = int(time.time())
+
+    course_ids = [value for param in request.args.getlist('course_id') for value in param.split(',') if value]
+    types = [value for param in request.args.getlist('type') for value in param.split(',') if value]
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid cursor: {str(e)}"}), 400
+
+    try:
+        index = timeline_indexes.peek(user_id)
+
+        # Only go to Canvas when the index is missing or hasn't been synced for TIMELINE_SYNC_INTERVAL
+        # (5 minutes); a sync then fetches only the courses whose entries are older than
+        # TIMELINE_COURSE_TTL (15 minutes). Follow-up pages of the same window are always served from the index
+        if index is None or (not cursor and time.time() - index.synced_at >= TIMELINE_SYNC_INTERVAL):
+            canvas_manager = CanvasManager(user_id=user_id)
+            index = canvas_manager.refresh_timeline()
+
+        items, next_cursor = index.query(
+            start_ts=start_ts,
+            end_ts=end_ts,
+            course_ids=course_ids,
+            types=types,
+            limit=limit,
+            cursor=cursor
+        )
+
+        return jsonify({
+            "data": items,
+            "next_cursor": next_cursor,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/canvas/calendar', methods=['GET'])
+def get_calendar():
+    """Get calendar events and assignment due dates for the user and their courses in a date range"""
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        start_ts = parse_date_param(request.args.get('start'))
+        end_ts = parse_date_param(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if start_ts is None:
+        start_ts = int(time.time())
+    if end_ts is None:
+        end_ts = start_ts + 14 * 86400
+    if end_ts <= start_ts or end_ts - start_ts > CALENDAR_MAX_RANGE:
+        return jsonify({"error": "end must be after start and within a year of it"}), 400
+
+    course_ids = [value for param in request.args.getlist('course_id') for value in param.split(',') if value]
+    types = [value for param in request.args.getlist('type') for value in param.split(',') if value]
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        events = canvas_manager.get_calendar(start_ts, end_ts, course_ids=course_ids or None, types=types or None)
+
+        if events is None:
+            return jsonify({"error": "Could not load calendar"}), 502
+
+        return jsonify({
+            "data": events,
+            "error": None
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+ALL_DATA_WORKERS = int(os.getenv('GLIDE_ALL_DATA_WORKERS', 16))
+all_data_executor = profiler.ProfiledThreadPoolExecutor(max_workers=ALL_DATA_WORKERS, name='all-data')
+
 @app.route('/api/canvas/all-data', methods=['GET'])
 def get_all_data():
     """Get Canvas data for a user (current semester by default)"""
@@ -314,6 +645,9 @@ def get_all_data():
             }
         }
 
+        # With the GraphQL engine, every course's tree comes from a few batched queries
+        canvas_manager.prefetch_course_trees([course['course_id'] for course in courses])
+
         # Thread-local storage for canvas_manager instances
         thread_local = threading.local()
 
@@ -338,31 +672,12 @@ def get_all_data():
                 try:
                     course_announcements = cm.get_course_announcements(course_id)
                     if course_announcements:
+                        # Cached announcements are shared; tag copies with their course
                         for announcement in course_announcements:
-                            announcement['course_name'] = course_name
-                            announcement['course_id'] = course_id
-                            announcements.append(announcement)
-
-                            # Extract professor info from announcements if available
-                            if 'author' in announcement and announcement['author'] and 'display_name' in announcement['author']:
-                                prof_name = announcement['author']['display_name']
-                                prof_id = announcement['author'].get('id', 0)
-
-                                # Check if this professor is already in our list
-                                prof_exists = False
-                                for prof in professor_info:
-                                    if prof['name'] == prof_name:
-                                        prof_exists = True
-                                        break
-
-                                if not prof_exists:
-                                    professor_info.append({
-                                        'id': prof_id,
-                                        'name': prof_name,
-                                        'role': 'Teacher',
-                                        'email': None,
-                                        'avatar_url': announcement['author'].get('avatar_image_url')
-                                    })
+                            announcements.append(dict(announcement, course_name=course_name, course_id=course_id))
+
+                        # Extract professor info from announcements if available
+                        professor_info = professors_from_announcements(course_announcements)
                 except Exception as e:
                     print(f"Error getting announcements for course {course_id}: {str(e)}")
 
@@ -370,47 +685,15 @@ def get_all_data():
             if load_professors:
                 try:
                     professors = cm.get_class_professors(course_id)
-                    if professors and professors[0]['name'] != 'Course Instructor':
-                        # Add professors data to result
-                        result[f"class_professors_{course_id}"] = {
-                            "data": professors,
-                            "error": None
-                        }
-                    elif professor_info:
-                        # Use professor info extracted from announcements
-                        result[f"class_professors_{course_id}"] = {
-                            "data": professor_info,
-                            "error": None
-                        }
-                    else:
-                        # Add placeholder professor data
-                        result[f"class_professors_{course_id}"] = {
-                            "data": [{
-                                "id": 0,
-                                "name": "Course Instructor",
-                                "role": "Teacher",
-                                "email": None
-                            }],
-                            "error": None
-                        }
                 except Exception as e:
                     print(f"Error getting professors for course {course_id}: {str(e)}")
-                    if professor_info:
-                        result[f"class_professors_{course_id}"] = {
-                            "data": professor_info,
-                            "error": None
-                        }
-                    else:
-                        # Add placeholder professor data
-                        result[f"class_professors_{course_id}"] = {
-                            "data": [{
-                                "id": 0,
-                                "name": "Course Instructor",
-                                "role": "Teacher",
-                                "email": None
-                            }],
-                            "error": None
-                        }
+                    professors = None
+
+                # Fall back to professor info extracted from announcements, then a placeholder
+                result[f"class_professors_{course_id}"] = {
+                    "data": choose_course_professors(professors, professor_info),
+                    "error": None
+                }
 
             return {
                 "result": result,
@@ -419,17 +702,17 @@ def get_all_data():
 
         # Process courses in parallel
         all_announcements = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=min(10, len(courses))) as executor:
-            future_to_course = {executor.submit(process_course, course): course for course in courses}
+        # One pool per process, so concurrent reloads share its workers instead of each starting ten
+        future_to_course = {all_data_executor.submit(process_course, course): course for course in courses}
 
-            for future in concurrent.futures.as_completed(future_to_course):
-                try:
-                    data = future.result()
-                    # Merge results into response_data
-                    response_data.update(data["result"])
-                    all_announcements.extend(data["announcements"])
-                except Exception as e:
-                    print(f"Error processing course: {str(e)}")
+        for future in concurrent.futures.as_completed(future_to_course):
+            try:
+                data = future.result()
+                # Merge results into response_data
+                response_data.update(data["result"])
+                all_announcements.extend(data["announcements"])
+            except Exception as e:
+                print(f"Error processing course: {str(e)}")
 
         if load_announcements:
             response_data["announcements"] = {
@@ -457,36 +740,12 @@ def get_course_professors(course_id):
         professors = canvas_manager.get_class_professors(course_id)
 
         # If we got placeholder data, try to extract from announcements
-        if not professors or (len(professors) == 1 and professors[0]['name'] == 'Course Instructor'):
+        if is_placeholder_professors(professors):
             try:
                 # Get announcements for this course
-                announcements = canvas_manager.get_course_announcements(course_id)
-
-                if announcements:
-                    extracted_professors = []
-                    for announcement in announcements:
-                        if 'author' in announcement and announcement['author'] and 'display_name' in announcement['author']:
-                            prof_name = announcement['author']['display_name']
-                            prof_id = announcement['author'].get('id', 0)
-
-                            # Check if this professor is already in our list
-                            prof_exists = False
-                            for prof in extracted_professors:
-                                if prof['name'] == prof_name:
-                                    prof_exists = True
-                                    break
-
-                            if not prof_exists:
-                                extracted_professors.append({
-                                    'id': prof_id,
-                                    'name': prof_name,
-                                    'role': 'Teacher',
-                                    'email': None,
-                                    'avatar_url': announcement['author'].get('avatar_image_url')
-                                })
-
-                    if extracted_professors:
-                        professors = extracted_professors
+                extracted_professors = professors_from_announcements(canvas_manager.get_course_announcements(course_id))
+                if extracted_professors:
+                    professors = extracted_professors
             except Exception as e:
                 print(f"Error extracting professors from announcements: {str(e)}")
 
@@ -498,6 +757,175 @@ def get_course_professors(course_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def paginated_resource_response(course_id, fetch_page_method):
+    """Shared handler for the cursor-paginated course resource endpoints"""
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    cursor = request.args.get('cursor') or None
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        page = fetch_page_method(canvas_manager)(course_id, cursor=cursor, limit=limit)
+
+        if page is None:
+            return jsonify({"error": f"No data found for course {course_id}"}), 404
+
+        return jsonify({
+            "data": page['items'],
+            "next_cursor": page['next_cursor'],
+            "limit": page['limit'],
+            "error": None
+        })
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/canvas/course-files/<course_id>', methods=['GET'])
+def get_course_files(course_id):
+    """Get one page of files for a course"""
+    return paginated_resource_response(course_id, lambda cm: cm.get_course_files_page)
+
+@app.route('/api/canvas/course-files/<course_id>/<file_id>/content', methods=['GET'])
+def get_course_file_content(course_id, file_id):
+    """Download a course file through the shared disk cache; supports single byte ranges"""
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    try:
+        # Initialize Canvas manager with user credentials from Firebase
+        canvas_manager = CanvasManager(user_id=user_id)
+
+        path, file = canvas_manager.open_course_file(course_id, file_id)
+        if path is None:
+            return jsonify({"error": f"File {file_id} not found in course {course_id}"}), 404
+
+        content_cache = get_file_content_cache()
+        etag = os.path.basename(path)
+        if etag in request.if_none_match:
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+
+        handle, size = content_cache.open(path)
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": f'"{etag}"',
+            "Cache-Control": "private, max-age=3600",
+            "Content-Disposition": f'inline; filename="{(file.get("filename") or etag).replace(chr(34), "")}"'
+        }
+        # A range only applies to the version the client already has
+        byte_range = parse_range(request.headers.get('Range'), size)
+        if request.headers.get('If-Range') and request.headers['If-Range'].strip('"') != etag:
+            byte_range = None
+        if byte_range is False:
+            handle.close()
+            return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+
+        start, end = byte_range or (0, size - 1)
+        headers["Content-Length"] = str(end - start + 1)
+        status = 200
+        if byte_range:
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return Response(
+            content_cache.stream(handle, start, end),
+            status=status,
+            mimetype=file.get('content_type') or 'application/octet-stream',
+            headers=headers,
+            direct_passthrough=True
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/canvas/course-discussions/<course_id>', methods=['GET'])
+def get_course_discussions(course_id):
+    """Get one page of discussion topics for a course"""
+    return paginated_resource_response(course_id, lambda cm: cm.get_course_discussions_page)
+
+@app.route('/api/canvas/course-announcements/<course_id>', methods=['GET'])
+def get_course_announcements(course_id):
+    """Get one page of announcements for a course"""
+    return paginated_resource_response(course_id, lambda cm: cm.get_course_announcements_page)
+
+@app.route('/api/canvas/events', methods=['POST'])
+def ingest_events():
+    """Accept Canvas Live Events / webhook payloads and refresh the matching cached data"""
+    if not check_token(request.headers.get('X-Glide-Events-Token')):
+        return jsonify({"error": "Invalid or missing events token"}), 403
+
+    payload = request.get_json(silent=True)
+    if payload is None:
+        return jsonify({"error": "JSON body is required"}), 400
+
+    # A single event or a batch of events
+    events = payload if isinstance(payload, list) else [payload]
+
+    results = []
+    for event in events:
+        try:
+            results.append(apply_event(event))
+        except EventError as e:
+            results.append({"error": str(e)})
+        except Exception as e:
+            print(f"Error applying event: {str(e)}")
+            results.append({"error": str(e)})
+
+    return jsonify({
+        "status": "success",
+        "data": results,
+        "error": None
+    })
+
+# Idle streams get a comment line this often, so proxies keep the connection open
+STREAM_HEARTBEAT_SECONDS = 15
+
+def sse_message(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/canvas/stream', methods=['GET'])
+def stream_updates():
+    """
+    Server-sent events with per-course changes to the user's dashboard data.
+    Optional course_id (comma separated) limits the stream to those courses.
+    Here each open stream holds a worker thread; asgi.py serves the same
+    stream as a coroutine, which is how many open dashboards should be served.
+    """
+    user_id = request.args.get('user_id')
+
+    if not user_id:
+        return jsonify({"error": "User ID is required"}), 400
+
+    course_ids = [course_id for course_id in request.args.get('course_id', '').split(',') if course_id]
+    subscription = push_hub.subscribe(user_id, course_ids or None)
+
+    def events():
+        try:
+            yield sse_message('ready', {"course_ids": course_ids or None})
+            while True:
+                try:
+                    message = subscription.queue.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_message(message['type'], message)
+        finally:
+            push_hub.unsubscribe(subscription)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/canvas/load-more-courses', methods=['GET'])
 def load_more_courses():
     """Load more courses (additional semesters) for a user"""
@@ -510,19 +938,12 @@ def load_more_courses():
         # Initialize Canvas manager with user credentials from Firebase
         canvas_manager = CanvasManager(user_id=user_id)
 
-        # Get all courses
-        all_courses = canvas_manager.get_all_classes()
-
-        # Get current semester courses
-        current_courses = canvas_manager.get_current_classes()
+        # Past and future terms come straight from the user's term index
+        additional_courses = canvas_manager.get_additional_classes()
 
-        if not all_courses:
+        if additional_courses is None:
             return jsonify({"error": "No courses found"}), 404
 
-        # Filter out current semester courses to get additional courses
-        current_course_ids = [course['course_id'] for course in current_courses]
-        additional_courses = [course for course in all_courses if course['course_id'] not in current_course_ids]
-
         return jsonify({
             "status": "success",
             "data": additional_courses,
@@ -531,6 +952,66 @@ def load_more_courses():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def check_admin_token(provided):
+    """Admin routes need the shared secret from GLIDE_ADMIN_TOKEN (and are off without one)"""
+    expected = os.getenv('GLIDE_ADMIN_TOKEN')
+    return bool(expected) and bool(provided) and hmac.compare_digest(expected, provided)
+
+@app.route('/api/admin/profiler', methods=['GET', 'POST'])
+def profiler_admin():
+    """
+    GET: sampler summary, route profiles and thread-pool stats.
+    POST {"sampler": "start"|"stop"|"reset", "interval_ms": 10}
+         {"route": "/api/canvas/all-data", "sample_rate": 0.1, "max_requests": 20}  (sample_rate 0 stops)
+         {"reset_routes": true}
+    """
+    if not check_admin_token(request.headers.get('X-Glide-Admin-Token')):
+        return jsonify({"error": "Invalid or missing admin token"}), 403
+
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        try:
+            action = body.get('sampler')
+            if action == 'start':
+                profiler.sampler.start(float(body['interval_ms']) / 1000 if body.get('interval_ms') is not None else None)
+            elif action == 'stop':
+                profiler.sampler.stop()
+            elif action == 'reset':
+                profiler.sampler.reset()
+            elif action is not None:
+                return jsonify({"error": "sampler must be start, stop or reset"}), 400
+
+            if body.get('route'):
+                max_requests = int(body['max_requests']) if body.get('max_requests') else None
+                profiler.route_profiler.configure(body['route'], float(body.get('sample_rate', 1)), max_requests)
+            if body.get('reset_routes'):
+                profiler.route_profiler.reset()
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid profiler settings: {str(e)}"}), 400
+
+    try:
+        limit = int(request.args.get('limit', profiler.TOP_FUNCTIONS))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+
+    return jsonify({
+        "data": {
+            "sampler": profiler.sampler.summary(),
+            "routes": profiler.route_profiler.summary(request.args.get('route'), limit),
+            "pools": profiler.pool_summary()
+        },
+        "error": None
+    })
+
+@app.route('/api/admin/profiler/stacks', methods=['GET'])
+def profiler_stacks():
+    """Sampled stacks in folded format (flamegraph.pl, speedscope); optional route filter"""
+    if not check_admin_token(request.headers.get('X-Glide-Admin-Token')):
+        return jsonify({"error": "Invalid or missing admin token"}), 403
+
+    return Response(profiler.sampler.folded(request.args.get('route')), mimetype='text/plain')
+
 if __name__ == '__main__':
+    worker_init()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,311 @@
+"""
+ASGI entry point.
+
+    uvicorn asgi:app --workers 2
+
+The dashboard's hot read routes are served by async handlers on
+AsyncCanvasManager, so thousands of in-flight requests can wait on Canvas from
+a few processes. The /stream endpoint is served here too, so open dashboards
+cost a coroutine each rather than a worker thread. Every other route falls through to the Flask app, run in a
+thread pool, so the JSON contracts of the whole API stay as they are.
+"""
+import asyncio
+import contextlib
+import functools
+import time
+
+import anyio
+import httpx
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import app as flask_app, sse_message, STREAM_HEARTBEAT_SECONDS
+from async_canvas import AsyncCanvasManager
+from canvas_manager import professors_from_announcements, is_placeholder_professors, choose_course_professors
+from term_index import PAST, FUTURE
+from startup import worker_init
+from admission import admission, Rejected
+from events import event_log, replay_events
+from push_hub import push_hub
+
+# Upper bound on concurrent per-course work inside one all-data request
+COURSE_CONCURRENCY = 10
+
+
+def flag(request, name, default):
+    return request.query_params.get(name, default).lower() == 'true'
+
+
+async def get_manager(request):
+    return await AsyncCanvasManager.create(request.app.state.http, user_id=request.query_params.get('user_id'))
+
+
+def user_id_required(handler):
+    @functools.wraps(handler)
+    async def wrapper(request):
+        user_id = request.query_params.get('user_id')
+        if not user_id:
+            return JSONResponse({"error": "User ID is required"}, status_code=400)
+        # Events another worker received (throttled; the store is only read, in a thread, when due)
+        if event_log.due():
+            await anyio.to_thread.run_sync(replay_events)
+        try:
+            # Queues on the event loop, not in a thread
+            admitted = await admission.admit_async(user_id, request.url.path)
+        except Rejected as e:
+            return JSONResponse({"error": str(e)}, status_code=429, headers={'Retry-After': str(e.retry_after)})
+        started = time.perf_counter()
+        try:
+            return await handler(request)
+        except Exception as e:
+            return JSONResponse({"error": str(e)}, status_code=500)
+        finally:
+            if admitted:
+                admission.release(time.perf_counter() - started)
+    return wrapper
+
+
+async def index(request):
+    return JSONResponse({"status": "Canvas API Backend is running"})
+
+
+@user_id_required
+async def all_courses_id(request):
+    canvas_manager = await get_manager(request)
+    load_all = flag(request, 'load_all', 'false')
+    courses = await (canvas_manager.get_all_classes() if load_all else canvas_manager.get_current_classes())
+
+    if not courses:
+        return JSONResponse({"error": "No courses found"}, status_code=404)
+
+    return JSONResponse({
+        "status": "success",
+        "course_ids": [course['course_id'] for course in courses],
+        "courses": courses
+    })
+
+
+@user_id_required
+async def all_classes(request):
+    canvas_manager = await get_manager(request)
+    load_all = flag(request, 'load_all', 'false')
+    term = request.query_params.get('term')
+    if term in (PAST, FUTURE):
+        classes = (await canvas_manager.get_course_term_index()).courses(statuses={term})
+    else:
+        classes = await (canvas_manager.get_all_classes() if load_all or term == 'all' else canvas_manager.get_current_classes())
+
+    if not classes:
+        return JSONResponse({"error": "No classes found"}, status_code=404)
+
+    return JSONResponse({"data": classes, "error": None})
+
+
+@user_id_required
+async def class_assignments(request):
+    course_id = request.path_params['course_id']
+    canvas_manager = await get_manager(request)
+    assignments = await canvas_manager.get_class_assignments(course_id)
+
+    if not assignments:
+        return JSONResponse({"error": f"No assignments found for course {course_id}"}, status_code=404)
+
+    return JSONResponse({"data": assignments, "error": None})
+
+
+@user_id_required
+async def user_profile(request):
+    canvas_manager = await get_manager(request)
+    user = canvas_manager.user
+
+    return JSONResponse({
+        "data": {
+            "id": user.id,
+            "name": user.name,
+            "email": getattr(user, 'email', None),
+            "bio": getattr(user, 'bio', None),
+            "avatar_url": getattr(user, 'avatar_url', None)
+        },
+        "error": None
+    })
+
+
+async def course_announcements(canvas_manager, course):
+    """A course's announcements, tagged with the course they came from"""
+    course_id = course['course_id']
+    try:
+        announcements = await canvas_manager.get_course_announcements(course_id) or []
+    except Exception as e:
+        print(f"Error getting announcements for course {course_id}: {str(e)}")
+        return []
+    return [dict(announcement, course_name=course['course_name'], course_id=course_id) for announcement in announcements]
+
+
+@user_id_required
+async def announcements(request):
+    canvas_manager = await get_manager(request)
+    load_all = flag(request, 'load_all', 'false')
+    courses = await (canvas_manager.get_all_classes() if load_all else canvas_manager.get_current_classes())
+
+    if not courses:
+        return JSONResponse({"error": "No courses found"}, status_code=404)
+
+    per_course = await asyncio.gather(*(course_announcements(canvas_manager, course) for course in courses))
+    return JSONResponse({
+        "data": [announcement for course_list in per_course for announcement in course_list],
+        "error": None
+    })
+
+
+@user_id_required
+async def all_data(request):
+    canvas_manager = await get_manager(request)
+    load_all = flag(request, 'load_all', 'false')
+    load_announcements = flag(request, 'load_announcements', 'true')
+    load_professors = flag(request, 'load_professors', 'true')
+
+    courses = await (canvas_manager.get_all_classes() if load_all else canvas_manager.get_current_classes())
+
+    if not courses:
+        return JSONResponse({"error": "No courses found"}, status_code=404)
+
+    response_data = {
+        "all_classes": {
+            "data": courses,
+            "error": None
+        },
+        "user_profile": {
+            "data": {
+                "id": canvas_manager.user.id,
+                "name": canvas_manager.user.name,
+                "email": getattr(canvas_manager.user, 'email', None),
+                "avatar_url": getattr(canvas_manager.user, 'avatar_url', None)
+            },
+            "error": None
+        }
+    }
+
+    # With the GraphQL engine, every course's tree comes from a few batched queries
+    if load_professors:
+        await canvas_manager.prefetch_course_trees([course['course_id'] for course in courses])
+
+    semaphore = asyncio.Semaphore(COURSE_CONCURRENCY)
+
+    async def process_course(course):
+        course_id = course['course_id']
+        result = {}
+        course_list = []
+
+        async with semaphore:
+            if load_announcements:
+                course_list = await course_announcements(canvas_manager, course)
+
+            if load_professors:
+                try:
+                    professors = await canvas_manager.get_class_professors(course_id)
+                except Exception as e:
+                    print(f"Error getting professors for course {course_id}: {str(e)}")
+                    professors = None
+                result[f"class_professors_{course_id}"] = {
+                    "data": choose_course_professors(professors, professors_from_announcements(course_list)),
+                    "error": None
+                }
+
+        return result, course_list
+
+    all_announcements = []
+    for result, course_list in await asyncio.gather(*map(process_course, courses)):
+        response_data.update(result)
+        all_announcements.extend(course_list)
+
+    if load_announcements:
+        response_data["announcements"] = {
+            "data": all_announcements,
+            "error": None
+        }
+
+    return JSONResponse(response_data)
+
+
+@user_id_required
+async def course_professors(request):
+    course_id = request.path_params['course_id']
+    canvas_manager = await get_manager(request)
+    professors = await canvas_manager.get_class_professors(course_id)
+
+    if is_placeholder_professors(professors):
+        try:
+            extracted_professors = professors_from_announcements(await canvas_manager.get_course_announcements(course_id))
+            if extracted_professors:
+                professors = extracted_professors
+        except Exception as e:
+            print(f"Error extracting professors from announcements: {str(e)}")
+
+    return JSONResponse({"status": "success", "data": professors, "error": None})
+
+
+async def stream_updates(request):
+    """
+    Server-sent events with per-course changes to the user's dashboard data.
+    An open stream is a coroutine waiting on its queue, not a worker thread.
+    """
+    user_id = request.query_params.get('user_id')
+    if not user_id:
+        return JSONResponse({"error": "User ID is required"}, status_code=400)
+
+    course_ids = [course_id for course_id in request.query_params.get('course_id', '').split(',') if course_id]
+    subscription = push_hub.subscribe(user_id, course_ids or None, loop=asyncio.get_running_loop())
+
+    async def events():
+        try:
+            yield sse_message('ready', {"course_ids": course_ids or None})
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.queue.get(), STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_message(message['type'], message)
+        finally:
+            push_hub.unsubscribe(subscription)
+
+    return StreamingResponse(events(), media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+flask_wsgi = WSGIMiddleware(flask_app)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # One pooled HTTP client for every Canvas call made by this process
+    limits = httpx.Limits(max_connections=500, max_keepalive_connections=100)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0), limits=limits) as http:
+        app.state.http = http
+        # Returns at once: the Firestore client, warm Canvas connection and optional snapshot warmup start in background threads
+        worker_init()
+        yield
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/canvas/all-courses-id', all_courses_id),
+        Route('/api/canvas/all-classes', all_classes),
+        Route('/api/canvas/class-assignments/{course_id}', class_assignments),
+        Route('/api/canvas/user-profile', user_profile),
+        Route('/api/canvas/announcements', announcements),
+        Route('/api/canvas/all-data', all_data),
+        Route('/api/canvas/course-professors/{course_id}', course_professors),
+        Route('/api/canvas/stream', stream_updates),
+        Mount('/', app=flask_wsgi)
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan
+)
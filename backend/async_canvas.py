@@ -0,0 +1,408 @@
+"""
+Async Canvas client for the ASGI serving mode.
+
+AsyncCanvasManager mirrors the CanvasManager methods that the dashboard routes
+use, on top of one shared httpx.AsyncClient, so a slow Canvas call waits on the
+event loop instead of holding a worker thread. Results go through the same
+normalizers and the same cache store (with the same keys) as the sync manager,
+so both serving modes return identical JSON and share cached data.
+
+Requests share the sync path's per-request deadline and per-host circuit
+breaker. Work that blocks (a shared cache store's disk I/O, Firestore, HTML
+sanitizing) runs in a thread so it doesn't stall the event loop.
+"""
+import asyncio
+import collections
+import os
+import threading
+import time
+
+import anyio
+import httpx
+
+from canvas_manager import (
+    CanvasManager, normalize_announcement, normalize_assignment, bucket_assignments, placeholder_professors,
+    is_transient_error, known_users
+)
+from circuit_breaker import CircuitOpen, breaker_for
+from deadlines import DEFAULT_REQUEST_TIMEOUT, REQUEST_BUDGET, DeadlineExceeded, endpoint_family, latencies
+from firebase_utils import get_user_canvas_credentials
+from graphql_engine import GRAPHQL_ENABLED, GraphQLCourseLoader, course_trees
+from pipeline import run, transform
+from startup import active_users
+from shared_cache import get_cache_store
+from term_index import term_indexes, CURRENT
+from course_index import course_name_indexes
+from timeline_index import timeline_indexes
+
+CREDENTIALS_TTL = 300
+MAX_CREDENTIALS = int(os.getenv('GLIDE_MAX_CREDENTIALS', 1000))
+
+_inflight = {}
+
+
+class Record:
+    """Attribute view of a Canvas JSON object, so the sync normalizers accept it"""
+
+    def __init__(self, data):
+        self.__dict__.update(data)
+
+
+def is_async_transient_error(error):
+    """is_transient_error for httpx: connection failures, 5xx and rate limiting"""
+    if isinstance(error, httpx.HTTPStatusError):
+        response = error.response
+        return response.status_code >= 500 or (
+            response.status_code == 403 and b'Rate Limit Exceeded' in response.content
+        )
+    return isinstance(error, httpx.TransportError) or is_transient_error(error)
+
+
+async def off_loop(function, *args):
+    """Run a blocking call in a thread"""
+    return await anyio.to_thread.run_sync(function, *args)
+
+
+async def store_call(store, function, *args):
+    """The local store is in memory; a shared one does disk I/O, so it's called from a thread"""
+    if store.backend == 'local':
+        return function(*args)
+    return await off_loop(function, *args)
+
+
+class AsyncCanvasClient:
+    """
+    Minimal async Canvas REST client with Link-header pagination. Like
+    DeadlineSession, each request is capped by the time left in the budget and
+    refused while the host's circuit breaker is open.
+    """
+
+    def __init__(self, http, canvas_url, api_key, budget_seconds=None):
+        self.http = http
+        self.base_url = canvas_url.rstrip('/') + '/api/v1/'
+        self.graphql_url = canvas_url.rstrip('/') + '/api/graphql'
+        self.headers = {'Authorization': f"Bearer {api_key}"}
+        self.deadline = time.monotonic() + budget_seconds if budget_seconds else None
+
+    def remaining(self):
+        """Seconds left before the deadline (None without one)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    async def request(self, method, url, **kwargs):
+        breaker = breaker_for(url)
+        breaker.check()
+        timeout = DEFAULT_REQUEST_TIMEOUT
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Deadline passed before {method} {endpoint_family(url)}")
+            timeout = min(timeout, remaining)
+
+        started = time.monotonic()
+        try:
+            response = await self.http.request(method, url, headers=self.headers, timeout=timeout, **kwargs)
+        except httpx.TransportError as e:
+            # A timeout cut short by the caller's own budget says nothing about the host
+            if not (isinstance(e, httpx.TimeoutException) and timeout < DEFAULT_REQUEST_TIMEOUT):
+                breaker.record(False, time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        latencies.record(endpoint_family(url), elapsed)
+        breaker.record(response.status_code < 500, elapsed)
+        response.raise_for_status()
+        return response
+
+    async def get(self, endpoint, params=None):
+        response = await self.request('GET', self.base_url + endpoint, params=params)
+        return response.json()
+
+    async def graphql(self, query, variables):
+        response = await self.request('POST', self.graphql_url, json={'query': query, 'variables': variables})
+        return response.json()
+
+    async def paginate(self, endpoint, params=None):
+        """Yield Records page by page; the next page is only requested when needed"""
+        params = list(params or []) + [('per_page', 100)]
+        url = self.base_url + endpoint
+        while url:
+            response = await self.request('GET', url, params=params)
+            for element in response.json():
+                if element is not None:
+                    yield Record(element)
+            next_link = response.links.get('next')
+            url = next_link['url'] if next_link else None
+            params = None
+
+
+class CredentialsCache:
+    """Recently looked-up Canvas credentials, expiring after ttl_seconds, least recently used dropped past max_users"""
+
+    def __init__(self, ttl_seconds=CREDENTIALS_TTL, max_users=MAX_CREDENTIALS):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if time.time() - entry[1] >= self.ttl_seconds:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[0]
+
+    def put(self, user_id, credentials):
+        with self._lock:
+            self._entries[user_id] = (credentials, time.time())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+
+_credentials = CredentialsCache()
+
+
+async def get_canvas_credentials(user_id):
+    """Firestore lookups are blocking, so run them in a thread and remember the result briefly"""
+    credentials = _credentials.get(user_id)
+    if credentials:
+        return credentials
+
+    canvas_url, api_key, error = await off_loop(get_user_canvas_credentials, user_id)
+    if error:
+        print(f"Error getting Canvas credentials from Firebase: {error}")
+        canvas_url, api_key = None, None
+    credentials = (canvas_url or os.getenv('CANVAS_URL'), api_key or os.getenv('CANVAS_API_KEY'))
+    _credentials.put(user_id, credentials)
+    return credentials
+
+
+async def normalized(records, normalize, skip_errors=False):
+    """Normalizers sanitize HTML, which is CPU-bound, so they run in a thread"""
+    return await off_loop(lambda: list(run(records, transform(normalize, skip_errors=skip_errors))))
+
+
+class AsyncCanvasManager:
+    @classmethod
+    async def create(cls, http, user_id=None, budget_seconds=REQUEST_BUDGET):
+        canvas_url, api_key = await get_canvas_credentials(user_id) if user_id else (
+            os.getenv('CANVAS_URL'), os.getenv('CANVAS_API_KEY')
+        )
+        if not canvas_url or not api_key:
+            raise ValueError("Canvas URL and API Key are required")
+
+        manager = cls()
+        manager.canvas_url = canvas_url
+        manager.client = AsyncCanvasClient(http, canvas_url, api_key, budget_seconds)
+        manager.breaker = breaker_for(canvas_url)
+        try:
+            manager.user = Record(await manager.client.get('users/self'))
+            known_users[(canvas_url, api_key)] = manager.user
+        except CircuitOpen:
+            # Canvas is down: carry on as the user we saw last, serving cached data
+            manager.user = known_users.get((canvas_url, api_key))
+            if manager.user is None:
+                raise
+        manager.owner = user_id or f"{canvas_url}#{manager.user.id}"
+        if user_id:
+            active_users.record(user_id)
+        return manager
+
+    def __repr__(self):
+        # Same identity as the sync manager, so cache keys are shared between modes
+        return f"CanvasManager({self.owner})"
+
+    async def _cached(self, method, args, compute):
+        """Async counterpart of cache_with_ttl, using the sync method's cache keys"""
+        key = method.cache_prefix + str((self,) + args) + str({})
+        store = get_cache_store()
+        found, value = await store_call(store, store.get, key)
+        if found:
+            store.count('hits')
+            return value
+
+        store.count('misses')
+        pending = _inflight.get(key)
+        if pending is not None:
+            store.count('waits')
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        _inflight[key] = future
+        try:
+            store.count('computes')
+            value = await compute()
+            if method.cache_if is None or method.cache_if(value):
+                await store_call(store, store.set, key, value, method.ttl_seconds)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody may be waiting; don't let the loop warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            _inflight.pop(key, None)
+
+    async def list_courses_with_terms(self):
+        async def compute():
+            listing = []
+            async for course in self.client.paginate(f"users/{self.user.id}/courses", [('include[]', 'term')]):
+                term = getattr(course, 'term', None) or {}
+                listing.append({
+                    'course_name': course.name,
+                    'course_id': course.id,
+                    'course_code': getattr(course, 'course_code', None),
+                    'workflow_state': getattr(course, 'workflow_state', None),
+                    'start_date': getattr(course, 'start_at', None),
+                    'end_date': getattr(course, 'end_at', None),
+                    'term': {
+                        'id': term.get('id'),
+                        'name': term.get('name'),
+                        'start_at': term.get('start_at'),
+                        'end_at': term.get('end_at')
+                    } if term else None
+                })
+            return listing
+        return await self._cached(CanvasManager.list_courses_with_terms, (), compute)
+
+    def degraded(self):
+        return self.breaker.is_open()
+
+    async def get_course_term_index(self, ttl_seconds=1800):
+        index = term_indexes.get(self.owner)
+        if index.is_stale(ttl_seconds) and not (self.degraded() and index.refreshed_at):
+            listing = await self.list_courses_with_terms()
+            index.sync(listing)
+            course_name_indexes.get(self.owner).sync(listing)
+        return index
+
+    async def get_current_classes(self):
+        try:
+            return (await self.get_course_term_index()).courses(statuses={CURRENT})
+        except Exception as e:
+            print(f"Error fetching classes: {str(e)}")
+            return None
+
+    async def get_all_classes(self):
+        try:
+            return (await self.get_course_term_index()).courses()
+        except Exception as e:
+            print(f"Error fetching all classes: {str(e)}")
+            return None
+
+    async def get_course_announcements(self, course_id):
+        async def compute():
+            try:
+                records = [
+                    announcement async for announcement in self.client.paginate(
+                        f"courses/{course_id}/discussion_topics", [('only_announcements', 'true')]
+                    )
+                ]
+                return await normalized(records, normalize_announcement)
+            except Exception as e:
+                if is_async_transient_error(e):
+                    raise
+                print(f"Error fetching announcements: {str(e)}")
+                return None
+        return await self._cached(CanvasManager.get_course_announcements, (course_id,), compute)
+
+    async def prefetch_course_trees(self, course_ids):
+        """Async CanvasManager.prefetch_course_trees; the trees are shared with the sync manager"""
+        if not GRAPHQL_ENABLED:
+            return
+        trees = course_trees.get(self.owner)
+        missing = [course_id for course_id in course_ids if trees.get(course_id) is None]
+        if not missing:
+            return
+        try:
+            loaded = await GraphQLCourseLoader().load_async(missing, self.client.graphql)
+        except Exception as e:
+            print(f"Error loading course trees over GraphQL, using REST: {str(e)}")
+            loaded = {}
+        for course_id in missing:
+            trees.put(course_id, loaded.get(str(course_id)) or False)
+
+    async def course_tree(self, course_id):
+        if not GRAPHQL_ENABLED:
+            return None
+        await self.prefetch_course_trees([course_id])
+        return course_trees.get(self.owner).get(course_id) or None
+
+    async def get_class_professors(self, course_id):
+        async def fetch_professor(enrollment):
+            try:
+                user = await self.client.get(f"users/{enrollment.user_id}")
+                return {
+                    'id': user['id'],
+                    'name': user['name'],
+                    'role': enrollment.role,
+                    'email': user.get('email')
+                }
+            except Exception as inner_e:
+                if is_async_transient_error(inner_e):
+                    raise
+                print(f"Error fetching professor details: {str(inner_e)}")
+                return None
+
+        async def compute():
+            tree = await self.course_tree(course_id)
+            if tree is not None and tree['teachers']:
+                return tree['teachers']
+
+            try:
+                enrollments = [
+                    enrollment async for enrollment in self.client.paginate(
+                        f"courses/{course_id}/enrollments",
+                        [('type[]', 'TeacherEnrollment'), ('type[]', 'TaEnrollment')]
+                    )
+                ]
+                # Unlike the sync path, the per-teacher lookups run concurrently
+                professors = [
+                    professor for professor in await asyncio.gather(*map(fetch_professor, enrollments))
+                    if professor
+                ]
+            except Exception as e:
+                if is_async_transient_error(e):
+                    raise
+                print(f"Error fetching enrollments: {str(e)}")
+                try:
+                    course = await self.client.get(f"courses/{course_id}")
+                    professors = [{
+                        'id': 0,
+                        'name': f"Instructor of {course['name']}",
+                        'role': 'Teacher',
+                        'email': None
+                    }]
+                except Exception as course_e:
+                    if is_async_transient_error(course_e):
+                        raise
+                    professors = []
+
+            return professors or placeholder_professors()
+        return await self._cached(CanvasManager.get_class_professors, (course_id,), compute)
+
+    async def get_class_assignments(self, course_id):
+        try:
+            tree = await self.course_tree(course_id)
+            if tree is not None:
+                records = [Record(assignment) for assignment in tree['assignments']]
+            else:
+                records = [
+                    assignment async for assignment in self.client.paginate(
+                        f"courses/{course_id}/assignments", [('include[]', 'submission'), ('order_by', 'due_at')]
+                    )
+                ]
+            assignments = bucket_assignments(await normalized(records, normalize_assignment, skip_errors=True))
+            timeline_indexes.get(self.owner).replace_assignments(course_id, assignments)
+            return assignments
+        except Exception as e:
+            if is_async_transient_error(e):
+                raise
+            print(f"Error fetching assignments: {str(e)}")
+            return None
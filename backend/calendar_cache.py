@@ -0,0 +1,159 @@
+"""
+Calendar events by date range, cached as covered intervals.
+
+For every calendar context (user_<id>, course_<id>) the cache remembers which
+time spans have been fetched and the events found in them. A query only sends
+Canvas the spans it hasn't covered yet, and contexts that miss the same span
+share one request, up to the number of context_codes Canvas accepts at once.
+"""
+import concurrent.futures
+import threading
+import time
+from datetime import datetime, timezone
+
+from registry import UserRegistry
+from rich_text import with_body
+from search_index import as_course_id
+from timeline_index import canvas_timestamp
+
+CALENDAR_TTL = 900
+DAY = 86400
+# Canvas caps context_codes per calendar_events request at 10
+MAX_CONTEXTS_PER_REQUEST = 10
+EVENT_TYPES = ('event', 'assignment')
+
+
+def canvas_time(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def day_bounds(start_ts, end_ts):
+    """Widen a range to whole UTC days, so nearby queries reuse the same spans"""
+    return start_ts - start_ts % DAY, end_ts + (-end_ts % DAY)
+
+
+def normalize_calendar_event(event):
+    context_code = getattr(event, 'context_code', None) or ''
+    assignment = getattr(event, 'assignment', None) or {}
+    return with_body({
+        'id': event.id,
+        'type': 'assignment' if assignment or str(event.id).startswith('assignment_') else 'event',
+        'title': event.title,
+        'start_at': getattr(event, 'start_at', None),
+        'end_at': getattr(event, 'end_at', None),
+        'all_day': getattr(event, 'all_day', False),
+        'location_name': getattr(event, 'location_name', None),
+        'description': getattr(event, 'description', None),
+        'context_code': context_code,
+        'course_id': as_course_id(context_code[len('course_'):]) if context_code.startswith('course_') else None,
+        'assignment_id': assignment.get('id'),
+        'url': getattr(event, 'html_url', None)
+    }, 'calendar_event')
+
+
+def subtract(span, covered):
+    """Parts of span (start, end) not inside any of the sorted, disjoint covered spans"""
+    start, end = span
+    gaps = []
+    for covered_start, covered_end, _ in covered:
+        if covered_end <= start:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > start:
+            gaps.append((start, covered_start))
+        start = max(start, covered_end)
+        if start >= end:
+            break
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+class CalendarCache:
+    """One user's fetched calendar spans and events, per context"""
+
+    def __init__(self, ttl_seconds=CALENDAR_TTL):
+        self._ttl = ttl_seconds
+        self._covered = {}     # context -> sorted [(start_ts, end_ts, fetched_at)]
+        self._events = {}      # context -> {event id: (start_ts, event)}
+        self._lock = threading.Lock()
+
+    def _fresh_coverage(self, context, now):
+        return [segment for segment in self._covered.get(context, []) if now - segment[2] < self._ttl]
+
+    def missing(self, contexts, start_ts, end_ts):
+        """Fetch plan: [(span_start, span_end, [contexts])], contexts batched per span"""
+        now = time.time()
+        by_span = {}
+        with self._lock:
+            for context in contexts:
+                for gap in subtract((start_ts, end_ts), self._fresh_coverage(context, now)):
+                    by_span.setdefault(gap, []).append(context)
+
+        plan = []
+        for (span_start, span_end), span_contexts in sorted(by_span.items()):
+            for i in range(0, len(span_contexts), MAX_CONTEXTS_PER_REQUEST):
+                plan.append((span_start, span_end, span_contexts[i:i + MAX_CONTEXTS_PER_REQUEST]))
+        return plan
+
+    def store(self, contexts, start_ts, end_ts, events, fetched_at=None):
+        """Record that [start_ts, end_ts) was fetched for these contexts, with what was found"""
+        fetched_at = fetched_at or time.time()
+        found = {}
+        for event in events:
+            timestamp = canvas_timestamp(event.get('start_at'))
+            if timestamp is not None:
+                found.setdefault(event.get('context_code'), {})[event['id']] = (timestamp, event)
+
+        with self._lock:
+            for context in contexts:
+                events_by_id = self._events.setdefault(context, {})
+                for event_id in [event_id for event_id, (timestamp, _) in events_by_id.items() if start_ts <= timestamp < end_ts]:
+                    del events_by_id[event_id]
+                events_by_id.update(found.get(context, {}))
+                self._cover(context, start_ts, end_ts, fetched_at)
+
+    def _cover(self, context, start_ts, end_ts, fetched_at):
+        """Add a segment, merging overlapping or touching ones (the merge keeps the older fetch time)"""
+        segments = sorted(self._fresh_coverage(context, time.time()) + [(start_ts, end_ts, fetched_at)])
+        merged = []
+        for segment in segments:
+            if merged and segment[0] <= merged[-1][1]:
+                last = merged[-1]
+                merged[-1] = (last[0], max(last[1], segment[1]), min(last[2], segment[2]))
+            else:
+                merged.append(segment)
+        self._covered[context] = merged
+
+    def invalidate(self, context):
+        with self._lock:
+            self._covered.pop(context, None)
+            self._events.pop(context, None)
+
+    def events(self, contexts, start_ts, end_ts, types=None):
+        with self._lock:
+            found = [
+                (timestamp, event)
+                for context in contexts
+                for timestamp, event in self._events.get(context, {}).values()
+                if start_ts <= timestamp < end_ts and (not types or event['type'] in types)
+            ]
+        found.sort(key=lambda entry: (entry[0], str(entry[1]['id'])))
+        return [event for _, event in found]
+
+    def query(self, contexts, start_ts, end_ts, fetch, types=None, max_workers=4):
+        """
+        Events of the contexts in [start_ts, end_ts), fetching only uncovered spans.
+        fetch(context_codes, start_ts, end_ts) returns the normalized events of one span.
+        """
+        plan = self.missing(contexts, *day_bounds(start_ts, end_ts))
+        if plan:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(plan))) as executor:
+                results = executor.map(lambda step: (step, fetch(step[2], step[0], step[1])), plan)
+                for (span_start, span_end, span_contexts), events in results:
+                    self.store(span_contexts, span_start, span_end, events)
+        return self.events(contexts, start_ts, end_ts, types)
+
+
+calendar_caches = UserRegistry(CalendarCache)
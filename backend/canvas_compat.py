@@ -0,0 +1,79 @@
+"""
+The canvasapi internals the backend relies on, kept in one place.
+
+canvasapi has no public way to build an object for a known id without
+fetching it, to swap the HTTP session its requests go through, or to read a
+PaginatedList one page at a time from an arbitrary page. All of that is done
+here through private attributes of the canvasapi versions in TESTED_VERSIONS.
+On any other version the first two fall back to the public (slower) path, and
+page reads fail loudly rather than misbehave.
+"""
+TESTED_VERSIONS = ('3.2.',)
+
+_supported = None
+
+
+def internals_supported():
+    """Whether the installed canvasapi has the private attributes used here"""
+    global _supported
+    if _supported is None:
+        import canvasapi
+        from canvasapi.paginated_list import PaginatedList
+        from canvasapi.requester import Requester
+        _supported = (
+            canvasapi.__version__.startswith(TESTED_VERSIONS)
+            and hasattr(Requester, 'request')
+            and hasattr(PaginatedList, '_get_next_page')
+        )
+        if not _supported:
+            print(f"canvasapi {canvasapi.__version__} is untested; using public API fallbacks where there are any")
+    return _supported
+
+
+def requester(canvas):
+    """The Requester behind a Canvas object, or None if it can't be reached safely"""
+    if not internals_supported():
+        return None
+    return getattr(canvas, '_Canvas__requester', None)
+
+
+def use_session(canvas, session):
+    """Send every request of a Canvas object through session; False if that isn't possible"""
+    canvas_requester = requester(canvas)
+    if canvas_requester is None or not hasattr(canvas_requester, '_session'):
+        return False
+    canvas_requester._session = session
+    return True
+
+
+def course_stub(canvas, course_id):
+    """
+    Course object for building sub-resource requests without the
+    GET /courses/:id round trip that canvas.get_course() makes.
+    """
+    canvas_requester = requester(canvas)
+    if canvas_requester is None:
+        return canvas.get_course(course_id)
+    from canvasapi.course import Course
+    return Course(canvas_requester, {'id': course_id})
+
+
+class PageReader:
+    """Reads a PaginatedList one Canvas page at a time, from the first page or any next-page URL"""
+
+    def __init__(self, paginated_list, per_page):
+        if not internals_supported():
+            raise RuntimeError("Paged Canvas listings need canvasapi 3.2")
+        self._list = paginated_list
+        # canvasapi always sends per_page=100 unless it is set on the list itself
+        paginated_list._first_params['per_page'] = per_page
+        # Relative resource path of the listing, e.g. 'courses/1/files'
+        self.scope = paginated_list._first_url.split('?')[0]
+
+    def read(self, url=None):
+        """(elements, next_url) of the page at url, or of the list's next unread page"""
+        if url:
+            self._list._next_url = url
+            self._list._next_params = {}
+        elements = self._list._get_next_page()
+        return elements, self._list._next_url
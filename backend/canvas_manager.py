@@ -1,43 +1,257 @@
 import os
 from dotenv import load_dotenv
-from canvasapi import Canvas
 from datetime import datetime, timedelta
 from firebase_utils import get_user_canvas_credentials
+from course_index import course_name_indexes
+from search_index import search_indexes, as_course_id
+from push_hub import push_hub
+from rich_text import with_body, process_html
+from file_store import file_indexes, get_file_content_cache, DOWNLOAD_CHUNK
+from dashboard_view import dashboard_views
+from timeline_index import timeline_indexes, parse_canvas_datetime, canvas_timestamp, is_test_name, TIMELINE_COURSE_TTL
+from term_index import term_indexes, CURRENT, PAST, FUTURE
+from module_tree import module_trees, fetch_module_tree, merge_progress
+from pagination import page_cache, fetch_page, InvalidCursor, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from pipeline import run, keep, transform, take
+from grades import GRADED_STATES, grades_by_course, summarize_grades
+from analytics import ANALYTICS_TTL, summarize_student_activity, summarize_course_activity
+from calendar_cache import calendar_caches, normalize_calendar_event, canvas_time, EVENT_TYPES, CALENDAR_TTL
+from graphql_engine import GRAPHQL_ENABLED, GraphQLCourseLoader, course_trees
+from shared_cache import get_cache_store
+from deadlines import DeadlineSession, DeadlineExceeded, REQUEST_BUDGET
+from circuit_breaker import breaker_for, CircuitOpen
+from startup import active_users
+from profiler import ProfiledThreadPoolExecutor
+from registry import UserRegistry
+import canvas_compat
+from types import SimpleNamespace
+import concurrent.futures
 import functools
+import requests
 import time
 
+# Environment variables are read once at import, not per manager
+load_dotenv()
+
 # Cache decorator with TTL (time-to-live)
-def cache_with_ttl(ttl_seconds=300):  # Default 5 minutes cache
+# When Canvas events keep caches fresh (see events.py), TTLs can safely be stretched
+CACHE_TTL_SCALE = float(os.getenv('GLIDE_CACHE_TTL_SCALE', 1))
+
+def cache_with_ttl(ttl_seconds=300, cache_if=None):  # Default 5 minutes cache
     """
     Function decorator that caches the result with a time-to-live (TTL).
+    Results live in the process-wide cache store (see shared_cache), which may be
+    shared by every worker on the host; concurrent misses on one key are computed once.
+    Results that fail the optional cache_if predicate are returned but not kept.
     """
+    ttl_seconds = ttl_seconds * CACHE_TTL_SCALE
+
     def decorator(func):
-        cache = {}
+        prefix = f"{func.__qualname__}:"
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            # Create a key based on function arguments
-            key = str(args) + str(kwargs)
-
-            # Check if result is in cache and not expired
-            if key in cache:
-                result, timestamp = cache[key]
-                if time.time() - timestamp < ttl_seconds:
-                    return result
-
-            # Call the function and cache the result
-            result = func(*args, **kwargs)
-            cache[key] = (result, time.time())
-            return result
+            # Create a key based on the function and its arguments
+            key = prefix + str(args) + str(kwargs)
+            return get_cache_store().get_or_compute(key, ttl_seconds, lambda: func(*args, **kwargs), cache_if=cache_if)
 
+        wrapper.cache_prefix = prefix
+        wrapper.ttl_seconds = ttl_seconds
+        wrapper.cache_if = cache_if
         return wrapper
     return decorator
 
-class CanvasManager:
-    def __init__(self, user_id=None, canvas_url=None, api_key=None):
-        # Load environment variables
-        load_dotenv()
+def normalize_assignment(assignment):
+    assignment_data = {
+        'name': assignment.name,
+        'id': assignment.id,
+        'due_date': getattr(assignment, 'due_at', None),
+        'description': getattr(assignment, 'description', ''),
+        'points_possible': getattr(assignment, 'points_possible', None)
+    }
+    with_body(assignment_data, 'assignment')
+
+    submission = getattr(assignment, 'submission', None)
+    if submission:
+        assignment_data.update({
+            'submission_status': submission.get('workflow_state'),
+            'score': submission.get('score'),
+            'submitted_at': submission.get('submitted_at'),
+            'late': submission.get('late', False)
+        })
+
+    return assignment_data
+
+def bucket_assignments(assignment_records, now=None):
+    """Sort normalized assignments into upcoming, past (submitted) and missing"""
+    # Canvas due dates are UTC, so compare against UTC
+    now = now or datetime.utcnow()
+    assignments = {
+        'upcoming': [],
+        'past': [],
+        'missing': []
+    }
+
+    for assignment_data in assignment_records:
+        due_date = parse_canvas_datetime(assignment_data['due_date'])
+        if due_date:
+            if due_date > now:
+                assignments['upcoming'].append(assignment_data)
+            elif assignment_data.get('submission_status') in ['submitted', 'graded']:
+                assignments['past'].append(assignment_data)
+            else:
+                assignments['missing'].append(assignment_data)
+        else:
+            assignments['upcoming'].append(assignment_data)
+
+    return assignments
+
+def normalize_test(assignment):
+    return {
+        'name': assignment.name,
+        'due_date': assignment.due_at,
+        'points_possible': getattr(assignment, 'points_possible', None),
+        'description': process_html(getattr(assignment, 'description', ''))['html']
+    }
+
+def upcoming_tests_from_assignments(assignments, now=None):
+    """Derive the upcoming tests list from an already-fetched get_class_assignments result"""
+    now = now or datetime.utcnow()
+    return [
+        {
+            'name': assignment['name'],
+            'due_date': assignment['due_date'],
+            'points_possible': assignment.get('points_possible'),
+            'description': assignment.get('description', '')
+        }
+        for assignment in (assignments or {}).get('upcoming', [])
+        if is_test_name(assignment['name'])
+        and parse_canvas_datetime(assignment['due_date'])
+        and parse_canvas_datetime(assignment['due_date']) > now
+    ]
+
+def normalize_announcement(announcement):
+    return with_body({
+        'id': announcement.id,
+        'title': announcement.title,
+        'message': announcement.message,
+        'posted_at': announcement.posted_at,
+        'author': getattr(announcement, 'author', {})
+    }, 'announcement')
+
+def professors_from_announcements(announcements):
+    """Build a professor list from announcement authors, one entry per distinct name"""
+    professors = []
+    seen_names = set()
+    for announcement in announcements or []:
+        author = announcement.get('author')
+        if not author or 'display_name' not in author:
+            continue
+        if author['display_name'] in seen_names:
+            continue
+        seen_names.add(author['display_name'])
+        professors.append({
+            'id': author.get('id', 0),
+            'name': author['display_name'],
+            'role': 'Teacher',
+            'email': None,
+            'avatar_url': author.get('avatar_image_url')
+        })
+    return professors
+
+def is_placeholder_professors(professors):
+    return not professors or (len(professors) == 1 and professors[0]['name'] == 'Course Instructor')
+
+def placeholder_professors():
+    return [{
+        'id': 0,
+        'name': 'Course Instructor',
+        'role': 'Teacher',
+        'email': None
+    }]
+
+def choose_course_professors(professors, announcement_professors):
+    """Pick real professors, else announcement authors, else the placeholder"""
+    if professors and professors[0]['name'] != 'Course Instructor':
+        return professors
+    if announcement_professors:
+        return announcement_professors
+    return placeholder_professors()
+
+def normalize_discussion(discussion):
+    return with_body({
+        'id': discussion.id,
+        'title': discussion.title,
+        'message': discussion.message,
+        'posted_at': discussion.posted_at,
+        'reply_count': getattr(discussion, 'discussion_subentry_count', 0)
+    }, 'discussion')
+
+def normalize_file(file):
+    return {
+        'id': file.id,
+        'display_name': file.display_name,
+        'filename': file.filename,
+        'content_type': file.content_type,
+        'url': getattr(file, 'url', None),
+        'size': getattr(file, 'size', 0),
+        'created_at': getattr(file, 'created_at', None),
+        'updated_at': getattr(file, 'updated_at', None)
+    }
+
+def is_discussion(topic):
+    return not getattr(topic, 'announcement', False)
+
+# Placeholder returned when the user isn't allowed to list a course's files
+ACCESS_RESTRICTED_FILE = {
+    'id': 0,
+    'display_name': 'Files Access Restricted',
+    'filename': 'access_restricted.txt',
+    'content_type': 'text/plain',
+    'url': None,
+    'size': 0,
+    'created_at': None,
+    'updated_at': None,
+    'access_restricted': True
+}
+
+def is_permission_error(error):
+    error_str = str(error).lower()
+    return "unauthorized" in error_str or "not authorized" in error_str
+
+def is_transient_error(error):
+    """
+    Failures that say nothing lasting about the data (deadline, Canvas down,
+    network, rate limit, 5xx). Methods re-raise these rather than return a
+    fallback, so the fallback doesn't end up cached.
+    """
+    from canvasapi.exceptions import CanvasException, RateLimitExceeded
+    if isinstance(error, (DeadlineExceeded, CircuitOpen, RateLimitExceeded)):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    if isinstance(error, requests.RequestException):
+        return True
+    return type(error) is CanvasException and 'status code 5' in str(error)
+
+def is_complete_snapshot(class_data):
+    """Partial (deadline or failed sections) and degraded (Canvas down) course snapshots aren't cached"""
+    class_data = class_data or {}
+    return not class_data.get('pending') and not class_data.get('failed') and not class_data.get('degraded')
+
+def is_complete_analytics(analytics):
+    """Analytics with transient failures aren't cached; permission denials are"""
+    return analytics is not None and not analytics.get('errors')
+
+# Stale dashboard courses of every request are rebuilt on one pool, like all-data in app.py
+DASHBOARD_WORKERS = int(os.getenv('GLIDE_DASHBOARD_WORKERS', 8))
+dashboard_executor = ProfiledThreadPoolExecutor(max_workers=DASHBOARD_WORKERS, name='dashboard')
+
+# Last profile seen per set of credentials, so managers can still be built while Canvas is down
+known_users = {}
 
+class CanvasManager:
+    def __init__(self, user_id=None, canvas_url=None, api_key=None, budget_seconds=REQUEST_BUDGET):
         # If user_id is provided, try to get Canvas credentials from Firebase
         if user_id:
             firebase_canvas_url, firebase_api_key, error = get_user_canvas_credentials(user_id)
@@ -56,83 +270,120 @@ class CanvasManager:
         if not self.canvas_url or not self.api_key:
             raise ValueError("Canvas URL and API Key are required")
 
+        # canvasapi is imported on first use, keeping it off the app's import path
+        from canvasapi import Canvas
         self.canvas = Canvas(self.canvas_url, self.api_key)
-        self.user = self.canvas.get_current_user()
-
-    @cache_with_ttl(ttl_seconds=600)  # Cache for 10 minutes
-    def get_current_classes(self):
-        """Fetch all current classes for the user"""
+        # Every Canvas call this manager makes shares its request budget (see deadlines)
+        self.session = DeadlineSession(budget_seconds)
+        if not canvas_compat.use_session(self.canvas, self.session):
+            print("Canvas requests can't use the deadline session; budgets and hedging are off")
+        self.breaker = breaker_for(self.canvas_url)
         try:
-            courses = self.user.get_courses()
-            current_year = str(datetime.now().year)
-
-            # Determine current term based on month
-            month = datetime.now().month
-            if 1 <= month <= 5:
-                current_term = "SP"
-            elif 6 <= month <= 7:
-                current_term = "SU"
-            else:
-                current_term = "FA"
+            self.user = self.canvas.get_current_user()
+            known_users[(self.canvas_url, self.api_key)] = self.user
+        except CircuitOpen:
+            # Canvas is down: carry on as the user we saw last, serving cached data
+            self.user = known_users.get((self.canvas_url, self.api_key))
+            if self.user is None:
+                raise
+
+        # Stable identity for per-user caches and indexes, shared across requests
+        self.owner = user_id or f"{self.canvas_url}#{self.user.id}"
+        if user_id:
+            active_users.record(user_id)
 
-            term_prefix = f"{current_year}{current_term}"
+    def __repr__(self):
+        # Used by cache_with_ttl to build cache keys, so it must not vary per instance
+        return f"CanvasManager({self.owner})"
 
-            return [{
+    @cache_with_ttl(ttl_seconds=1800)  # Cache for 30 minutes
+    def list_courses_with_terms(self):
+        """List every course the user is enrolled in, with its enrollment term"""
+        listing = []
+        for course in self.user.get_courses(include=['term']):
+            term = getattr(course, 'term', None) or {}
+            listing.append({
                 'course_name': course.name,
                 'course_id': course.id,
                 'course_code': getattr(course, 'course_code', None),
                 'workflow_state': getattr(course, 'workflow_state', None),
                 'start_date': getattr(course, 'start_at', None),
-                'end_date': getattr(course, 'end_at', None)
-            } for course in courses if term_prefix in course.name]
+                'end_date': getattr(course, 'end_at', None),
+                'term': {
+                    'id': term.get('id'),
+                    'name': term.get('name'),
+                    'start_at': term.get('start_at'),
+                    'end_at': term.get('end_at')
+                } if term else None
+            })
+        return listing
+
+    def degraded(self):
+        """True while the circuit breaker for this Canvas host is open"""
+        return self.breaker.is_open()
+
+    def get_course_term_index(self, ttl_seconds=1800):
+        """
+        Return the user's term-aware course index, listing courses from Canvas only
+        when the cached index has expired. The course-name index is refreshed from
+        the same listing. While Canvas is down, an expired index is still served.
+        """
+        index = term_indexes.get(self.owner)
+        if index.is_stale(ttl_seconds) and not (self.degraded() and index.refreshed_at):
+            listing = self.list_courses_with_terms()
+            index.sync(listing)
+            course_name_indexes.get(self.owner).sync(listing)
+        return index
+
+    def get_current_classes(self):
+        """Fetch all current classes for the user"""
+        try:
+            return self.get_course_term_index().courses(statuses={CURRENT})
         except Exception as e:
             print(f"Error fetching classes: {str(e)}")
             return None
 
-    def get_class_assignments(self, course_id):
-        """Fetch all assignments for a specific class"""
+    def get_past_classes(self):
+        """Fetch classes from terms that have already ended"""
         try:
-            course = self.canvas.get_course(course_id)
-            now = datetime.now()
-            assignments = {
-                'upcoming': [],
-                'past': [],
-                'missing': []
-            }
+            return self.get_course_term_index().courses(statuses={PAST})
+        except Exception as e:
+            print(f"Error fetching past classes: {str(e)}")
+            return None
 
-            for assignment in course.get_assignments():
-                assignment_data = {
-                    'name': assignment.name,
-                    'id': assignment.id,
-                    'due_date': getattr(assignment, 'due_at', None),
-                    'description': getattr(assignment, 'description', ''),
-                    'points_possible': getattr(assignment, 'points_possible', None)
-                }
+    def get_future_classes(self):
+        """Fetch classes from terms that haven't started yet"""
+        try:
+            return self.get_course_term_index().courses(statuses={FUTURE})
+        except Exception as e:
+            print(f"Error fetching future classes: {str(e)}")
+            return None
 
-                try:
-                    submission = assignment.get_submission(self.user.id)
-                    assignment_data.update({
-                        'submission_status': submission.workflow_state,
-                        'score': submission.score,
-                        'submitted_at': getattr(submission, 'submitted_at', None),
-                        'late': getattr(submission, 'late', False)
-                    })
-                except Exception:
-                    pass
+    def get_additional_classes(self):
+        """Fetch every class that isn't in the current term (the "load more" set)"""
+        try:
+            return self.get_course_term_index().courses(statuses={PAST, FUTURE})
+        except Exception as e:
+            print(f"Error fetching additional classes: {str(e)}")
+            return None
+
+    def get_class_assignments(self, course_id):
+        """Fetch all assignments for a specific class"""
+        try:
+            tree = self.course_tree(course_id)
+            if tree is not None:
+                listing = (SimpleNamespace(**assignment) for assignment in tree['assignments'])
+            else:
+                # The user's own submission comes inline, instead of one request per assignment
+                listing = self.course_stub(course_id).get_assignments(include=['submission'], order_by='due_at')
+            assignments = bucket_assignments(run(listing, transform(normalize_assignment, skip_errors=True)))
 
-                if assignment.due_at:
-                    due_date = datetime.strptime(assignment.due_at, "%Y-%m-%dT%H:%M:%SZ")
-                    if due_date > now:
-                        assignments['upcoming'].append(assignment_data)
-                    elif assignment_data.get('submission_status') in ['submitted', 'graded']:
-                        assignments['past'].append(assignment_data)
-                    else:
-                        assignments['missing'].append(assignment_data)
-                else:
-                    assignments['upcoming'].append(assignment_data)
+            timeline_indexes.get(self.owner).replace_assignments(course_id, assignments)
 
             return assignments
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching assignments: {str(e)}")
             return None
 
@@ -140,105 +391,87 @@ class CanvasManager:
         """Fetch syllabus for a specific class"""
         try:
             course = self.canvas.get_course(course_id)
+            syllabus = process_html(course.syllabus_body)
             return {
-                'syllabus_body': course.syllabus_body,
+                'syllabus_body': syllabus['html'],
+                'syllabus_excerpt': syllabus['excerpt'],
                 'course_name': course.name
             }
         except Exception as e:
             print(f"Error fetching syllabus: {str(e)}")
             return None
 
-    def get_class_grades(self, course_id):
-        """Fetch grades for a specific class"""
+    @cache_with_ttl(ttl_seconds=600, cache_if=lambda grades: grades is not None)  # Cache for 10 minutes
+    def get_user_grades(self):
+        """
+        Fetch the user's grades in every course from one listing of their own enrollments.
+        One failure would blank every course, so transient errors are raised and None isn't cached.
+        """
         try:
-            course = self.canvas.get_course(course_id)
-            enrollments = course.get_enrollments()
-            for enrollment in enrollments:
-                if enrollment.user_id == self.user.id:
-                    grades = getattr(enrollment, 'grades', {})
-                    return {
-                        'current_score': grades.get('current_score'),
-                        'final_score': grades.get('final_score'),
-                        'current_grade': grades.get('current_grade'),
-                        'final_grade': grades.get('final_grade')
-                    }
-            return None
+            enrollments = self.user.get_enrollments(type=['StudentEnrollment'], state=GRADED_STATES)
+            return grades_by_course(enrollments)
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching grades: {str(e)}")
             return None
 
-    def get_upcoming_tests(self, course_id):
+    def get_class_grades(self, course_id):
+        """Fetch grades for a specific class"""
+        grades = self.get_user_grades()
+        if grades is None:
+            return None
+        return grades.get(str(course_id))
+
+    def get_grade_summary(self, load_all=False):
+        """Grades across the user's current (or all) classes, with an average"""
+        grades = self.get_user_grades()
+        courses = self.get_all_classes() if load_all else self.get_current_classes()
+        if grades is None or courses is None:
+            return None
+        return summarize_grades(grades, courses)
+
+    def get_upcoming_tests(self, course_id, limit=None):
         """Fetch upcoming tests/quizzes for a specific class"""
         try:
-            course = self.canvas.get_course(course_id)
-            now = datetime.now()
-            upcoming_tests = []
-
-            for assignment in course.get_assignments():
-                if any(term in assignment.name.lower() for term in ['test', 'quiz', 'exam', 'midterm', 'final']):
-                    if assignment.due_at:
-                        due_date = datetime.strptime(assignment.due_at, "%Y-%m-%dT%H:%M:%SZ")
-                        if due_date > now:
-                            upcoming_tests.append({
-                                'name': assignment.name,
-                                'due_date': assignment.due_at,
-                                'points_possible': getattr(assignment, 'points_possible', None),
-                                'description': getattr(assignment, 'description', '')
-                            })
-
-            return upcoming_tests
+            now = datetime.utcnow()
+
+            # Canvas filters to future assignments and sorts them; we stop as soon as we have enough
+            listing = self.course_stub(course_id).get_assignments(bucket='future', order_by='due_at')
+
+            return list(run(
+                listing,
+                keep(lambda assignment: is_test_name(assignment.name)),
+                transform(normalize_test),
+                keep(lambda test: (parse_canvas_datetime(test['due_date']) or now) > now),
+                take(limit)
+            ))
         except Exception as e:
             print(f"Error fetching upcoming tests: {str(e)}")
             return None
 
-    @cache_with_ttl(ttl_seconds=1800)  # Cache for 30 minutes
     def get_all_classes(self):
         """Fetch all classes for the user regardless of term"""
         try:
-            courses = self.user.get_courses()
-
-            return [{
-                'course_name': course.name,
-                'course_id': course.id,
-                'course_code': getattr(course, 'course_code', None),
-                'start_date': getattr(course, 'start_at', None),
-                'end_date': getattr(course, 'end_at', None)
-            } for course in courses]
+            return self.get_course_term_index().courses()
         except Exception as e:
             print(f"Error fetching all classes: {str(e)}")
             return None
 
     def find_course_id(self, class_name):
-        """Find course ID for a given class name with improved matching"""
+        """Find course ID for a given class name using the cached course-name index"""
         try:
-            # Get all courses
-            courses = self.canvas.get_courses()
-
-            # Print available courses for debugging
-            print("Available courses:")
-            for course in courses:
-                print(f"- {course.name} (ID: {course.id})")
-
-            # Try exact match first
-            for course in courses:
-                if class_name.lower() == course.name.lower():
-                    print(f"Found exact match: {course.name} (ID: {course.id})")
-                    return course.id
-
-            # Try contains match
-            for course in courses:
-                if class_name.lower() in course.name.lower():
-                    print(f"Found partial match: {course.name} (ID: {course.id})")
-                    return course.id
-
-            # Try word-by-word match (for cases like "Discrete Math" matching "Introduction to Discrete Mathematics")
-            class_words = class_name.lower().split()
-            for course in courses:
-                course_name_lower = course.name.lower()
-                # Check if all words in class_name are in the course name
-                if all(word in course_name_lower for word in class_words):
-                    print(f"Found word match: {course.name} (ID: {course.id})")
-                    return course.id
+            index = course_name_indexes.get(self.owner)
+
+            # Only touch Canvas when the index has never been built or has expired
+            if index.is_stale(1800):
+                self.get_course_term_index(ttl_seconds=0)
+
+            matches = index.search(class_name, limit=1)
+            if matches:
+                course_id, course_name, score = matches[0]
+                print(f"Found match: {course_name} (ID: {course_id}, score: {score:.1f})")
+                return course_id
 
             print(f"No course found matching '{class_name}'")
             return None
@@ -246,32 +479,51 @@ class CanvasManager:
             print(f"Error finding course ID: {str(e)}")
             return None
 
+    def course_stub(self, course_id):
+        """Course object for sub-resource requests, without fetching the course itself"""
+        return canvas_compat.course_stub(self.canvas, course_id)
+
+    def prefetch_course_trees(self, course_ids):
+        """
+        Load the GraphQL course trees of several courses in batched queries, so the
+        per-course methods that follow read from them. No-op on the REST engine.
+        """
+        if not GRAPHQL_ENABLED:
+            return
+        trees = course_trees.get(self.owner)
+        missing = [course_id for course_id in course_ids if trees.get(course_id) is None]
+        if not missing:
+            return
+        try:
+            loaded = GraphQLCourseLoader(self.canvas).load(missing)
+        except Exception as e:
+            print(f"Error loading course trees over GraphQL, using REST: {str(e)}")
+            loaded = {}
+        for course_id in missing:
+            # False keeps a failed course on the REST path until the entry expires
+            trees.put(course_id, loaded.get(str(course_id)) or False)
+
+    def course_tree(self, course_id):
+        """A course's GraphQL tree, or None when the REST path should be used"""
+        if not GRAPHQL_ENABLED:
+            return None
+        self.prefetch_course_trees([course_id])
+        return course_trees.get(self.owner).get(course_id) or None
+
     def get_course_modules(self, course_id):
         """Fetch all modules and their items for a course"""
         try:
-            course = self.canvas.get_course(course_id)
-            modules = []
-
-            for module in course.get_modules():
-                module_items = []
-                for item in module.get_module_items():
-                    module_items.append({
-                        'id': item.id,
-                        'title': item.title,
-                        'type': item.type,
-                        'url': getattr(item, 'html_url', None),
-                        'content_id': getattr(item, 'content_id', None)
-                    })
+            trees = module_trees.get(self.owner)
+            modules = trees.get(course_id)
 
-                modules.append({
-                    'id': module.id,
-                    'name': module.name,
-                    'items': module_items,
-                    'unlock_date': getattr(module, 'unlock_at', None)
-                })
+            if modules is None:
+                modules = merge_progress(*fetch_module_tree(self.course_stub(course_id)))
+                trees.put(course_id, modules)
 
             return modules
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching modules: {str(e)}")
             return None
 
@@ -279,46 +531,61 @@ class CanvasManager:
     def get_course_announcements(self, course_id):
         """Fetch recent announcements for a course"""
         try:
-            course = self.canvas.get_course(course_id)
-            announcements = []
-
-            for announcement in course.get_discussion_topics(only_announcements=True):
-                announcements.append({
-                    'id': announcement.id,
-                    'title': announcement.title,
-                    'message': announcement.message,
-                    'posted_at': announcement.posted_at,
-                    'author': getattr(announcement, 'author', {})
-                })
-
-            return announcements
+            listing = self.course_stub(course_id).get_discussion_topics(only_announcements=True)
+            return list(run(listing, transform(normalize_announcement)))
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching announcements: {str(e)}")
             return None
 
     def get_course_discussions(self, course_id):
         """Fetch discussion topics for a course"""
         try:
-            course = self.canvas.get_course(course_id)
-            discussions = []
-
-            for discussion in course.get_discussion_topics():
-                if not getattr(discussion, 'announcement', False):
-                    discussions.append({
-                        'id': discussion.id,
-                        'title': discussion.title,
-                        'message': discussion.message,
-                        'posted_at': discussion.posted_at,
-                        'reply_count': getattr(discussion, 'discussion_subentry_count', 0)
-                    })
-
-            return discussions
+            # Announcements are discussion topics too; Canvas can't exclude them server-side
+            listing = self.course_stub(course_id).get_discussion_topics()
+            return list(run(listing, keep(is_discussion), transform(normalize_discussion)))
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching discussions: {str(e)}")
             return None
 
+    def calendar_contexts(self, course_ids=None):
+        """Calendar context codes: the user's own calendar plus their (current) courses"""
+        if course_ids is None:
+            course_ids = [course['course_id'] for course in self.get_current_classes() or []]
+        return [f"user_{self.user.id}"] + [f"course_{course_id}" for course_id in course_ids]
+
+    @cache_with_ttl(ttl_seconds=CALENDAR_TTL)
+    def fetch_calendar_span(self, context_codes, start_ts, end_ts):
+        """
+        Fetch events and assignment events of up to 10 contexts for one time span.
+        Spans are day-aligned, so other workers asking for the same one share the result.
+        """
+        events = []
+        for event_type in EVENT_TYPES:
+            listing = self.canvas.get_calendar_events(
+                context_codes=context_codes,
+                type=event_type,
+                start_date=canvas_time(start_ts),
+                end_date=canvas_time(end_ts)
+            )
+            events.extend(run(listing, transform(normalize_calendar_event)))
+        return events
+
+    def get_calendar(self, start_ts, end_ts, course_ids=None, types=None):
+        """Calendar events and assignments in a time range, fetching only spans not cached yet"""
+        try:
+            return calendar_caches.get(self.owner).query(
+                self.calendar_contexts(course_ids), start_ts, end_ts, self.fetch_calendar_span, types=types
+            )
+        except Exception as e:
+            print(f"Error fetching calendar: {str(e)}")
+            return None
+
     def get_calendar_events(self, start_date=None, end_date=None):
-        """Fetch calendar events for the user"""
+        """Fetch calendar events for the user and their current courses"""
         try:
             if not start_date:
                 start_date = datetime.now().strftime("%Y-%m-%d")
@@ -326,28 +593,46 @@ class CanvasManager:
                 # Default to 2 weeks from now if not specified
                 end_date = (datetime.now() + timedelta(days=14)).strftime("%Y-%m-%d")
 
-            events = self.canvas.get_calendar_events(
-                start_date=start_date,
-                end_date=end_date,
-                context_codes=["user_" + str(self.user.id)]
-            )
+            start_at, end_at = f"{start_date}T00:00:00Z", f"{end_date}T23:59:59Z"
+            calendar_events = self.get_calendar(canvas_timestamp(start_at), canvas_timestamp(end_at), types=['event'])
+            if calendar_events is None:
+                return None
 
-            calendar_events = []
-            for event in events:
-                calendar_events.append({
-                    'id': event.id,
-                    'title': event.title,
-                    'start_at': event.start_at,
-                    'end_at': getattr(event, 'end_at', None),
-                    'location_name': getattr(event, 'location_name', None),
-                    'description': getattr(event, 'description', None)
-                })
+            timeline_indexes.get(self.owner).replace_events(start_at, end_at, calendar_events)
 
             return calendar_events
         except Exception as e:
             print(f"Error fetching calendar events: {str(e)}")
             return None
 
+    def refresh_timeline(self, ttl_seconds=TIMELINE_COURSE_TTL):
+        """
+        Make sure the user's timeline covers all current classes.
+        Only courses whose entries are older than the TTL are fetched again.
+        """
+        # Courses whose snapshot another worker already built need no Canvas call
+        absorb_cached_snapshots(self.owner)
+        index = timeline_indexes.get(self.owner)
+        courses = self.get_current_classes() or []
+        for course in courses:
+            index.set_course_name(course['course_id'], course['course_name'])
+
+        def refresh_course(course_id):
+            try:
+                self.get_class_assignments(course_id)
+            except Exception as e:
+                # The course keeps its older entries and is tried again next time
+                print(f"Error refreshing timeline of course {course_id}: {str(e)}")
+
+        stale_ids = [course['course_id'] for course in courses if index.is_course_stale(course['course_id'], ttl_seconds)]
+        if stale_ids:
+            with ProfiledThreadPoolExecutor(max_workers=min(10, len(stale_ids)), name='timeline') as executor:
+                list(executor.map(refresh_course, stale_ids))
+            self.get_calendar_events()
+
+        index.synced_at = time.time()
+        return index
+
     def get_assignment_feedback(self, course_id, assignment_id):
         """Fetch instructor feedback for a submitted assignment"""
         try:
@@ -380,6 +665,10 @@ class CanvasManager:
     def get_class_professors(self, course_id):
         """Fetch professors for a specific class"""
         try:
+            tree = self.course_tree(course_id)
+            if tree is not None and tree['teachers']:
+                return tree['teachers']
+
             course = self.canvas.get_course(course_id)
             professors = []
 
@@ -399,9 +688,13 @@ class CanvasManager:
                             'email': getattr(user, 'email', None)
                         })
                     except Exception as inner_e:
+                        if is_transient_error(inner_e):
+                            raise
                         print(f"Error fetching professor details: {str(inner_e)}")
                         # Continue with next professor
             except Exception as e:
+                if is_transient_error(e):
+                    raise
                 print(f"Error fetching enrollments: {str(e)}")
                 # If we can't get enrollments, try to get the course owner
                 try:
@@ -426,6 +719,8 @@ class CanvasManager:
 
             return professors
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching professors: {str(e)}")
             # Return a placeholder professor
             return [{
@@ -436,57 +731,113 @@ class CanvasManager:
             }]
 
     def get_course_files(self, course_id):
-        """Fetch files for a specific course"""
+        """Fetch files for a specific course (synced incrementally, see file_store)"""
         try:
-            course = self.canvas.get_course(course_id)
-            files = []
-
+            course = self.course_stub(course_id)
             try:
-                # Try to get files with error handling for permission issues
-                for file in course.get_files():
-                    try:
-                        files.append({
-                            'id': file.id,
-                            'display_name': file.display_name,
-                            'filename': file.filename,
-                            'content_type': file.content_type,
-                            'url': getattr(file, 'url', None),
-                            'size': getattr(file, 'size', 0),
-                            'created_at': getattr(file, 'created_at', None),
-                            'updated_at': getattr(file, 'updated_at', None)
-                        })
-                    except Exception as inner_e:
-                        print(f"Error processing file: {str(inner_e)}")
-                        # Continue with next file
+                return file_indexes.get(self.owner).sync(course_id, course.get_files, normalize_file)
             except Exception as e:
+                if is_transient_error(e):
+                    raise
                 # Check if it's a permission error
-                error_str = str(e)
-                if "unauthorized" in error_str.lower() or "not authorized" in error_str.lower():
-                    print(f"Permission denied when fetching course files: {error_str}")
+                if is_permission_error(e):
+                    print(f"Permission denied when fetching course files: {str(e)}")
                     # Return a message about permission issues
-                    return [{
-                        'id': 0,
-                        'display_name': 'Files Access Restricted',
-                        'filename': 'access_restricted.txt',
-                        'content_type': 'text/plain',
-                        'url': None,
-                        'size': 0,
-                        'created_at': None,
-                        'updated_at': None,
-                        'access_restricted': True
-                    }]
-                else:
-                    print(f"Error fetching course files: {error_str}")
-
-            return files
+                    return [dict(ACCESS_RESTRICTED_FILE)]
+                print(f"Error fetching course files: {str(e)}")
+                return file_indexes.get(self.owner).files(course_id)
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching course files: {str(e)}")
             return []
 
+    def open_course_file(self, course_id, file_id):
+        """
+        Path of a course file's content in the shared disk cache, downloading it
+        from Canvas on a miss, and the file's metadata. (None, None) if the user
+        can't see the file.
+        """
+        index = file_indexes.get(self.owner)
+        file = index.file(course_id, file_id)
+        if file is None:
+            self.get_course_files(course_id)
+            file = index.file(course_id, file_id)
+        if file is None or not file.get('url'):
+            return None, None
+
+        def download(path):
+            response = self.session.get(file['url'], stream=True, headers={'Authorization': f"Bearer {self.api_key}"})
+            response.raise_for_status()
+            with open(path, 'wb') as handle:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK):
+                    handle.write(chunk)
+
+        content_cache = get_file_content_cache()
+        return content_cache.fetch(content_cache.key(self.canvas_url, file), download), file
+
+    def _resource_page(self, resource, course_id, make_list, normalize, cursor, limit, item_filter=None):
+        """Fetch (or serve from cache) one window of a paginated course resource"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        key = (self.owner, resource, str(course_id), cursor, limit)
+        page = page_cache.get(key)
+        if page is None:
+            items, next_cursor = fetch_page(
+                make_list(self.course_stub(course_id)), normalize, limit, cursor=cursor, item_filter=item_filter
+            )
+            page = {'items': items, 'next_cursor': next_cursor, 'limit': limit}
+            page_cache.put(key, page)
+        return page
+
+    def get_course_files_page(self, course_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Fetch one page of a course's files; pass next_cursor back for the following page"""
+        try:
+            return self._resource_page(
+                'files', course_id,
+                lambda course: course.get_files(),
+                normalize_file, cursor, limit
+            )
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            if is_permission_error(e):
+                print(f"Permission denied when fetching course files: {str(e)}")
+                return {'items': [dict(ACCESS_RESTRICTED_FILE)], 'next_cursor': None, 'limit': limit}
+            print(f"Error fetching course files page: {str(e)}")
+            return None
+
+    def get_course_discussions_page(self, course_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Fetch one page of a course's discussion topics (announcements excluded)"""
+        try:
+            return self._resource_page(
+                'discussions', course_id,
+                lambda course: course.get_discussion_topics(),
+                normalize_discussion, cursor, limit, item_filter=is_discussion
+            )
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            print(f"Error fetching discussions page: {str(e)}")
+            return None
+
+    def get_course_announcements_page(self, course_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """Fetch one page of a course's announcements, newest first"""
+        try:
+            return self._resource_page(
+                'announcements', course_id,
+                lambda course: course.get_discussion_topics(only_announcements=True),
+                normalize_announcement, cursor, limit
+            )
+        except InvalidCursor:
+            raise
+        except Exception as e:
+            print(f"Error fetching announcements page: {str(e)}")
+            return None
+
     def get_course_groups(self, course_id):
         """Fetch groups for a specific course"""
         try:
-            course = self.canvas.get_course(course_id)
+            course = self.course_stub(course_id)
             groups = []
 
             for group in course.get_groups():
@@ -499,146 +850,322 @@ class CanvasManager:
 
             return groups
         except Exception as e:
+            if is_transient_error(e):
+                raise
             print(f"Error fetching course groups: {str(e)}")
             return None
 
+    @cache_with_ttl(ttl_seconds=ANALYTICS_TTL, cache_if=is_complete_analytics)
     def get_course_analytics(self, course_id):
-        """Fetch analytics for a specific course"""
-        try:
-            course = self.canvas.get_course(course_id)
-            analytics = {
-                'student': None,
-                'course': None
-            }
+        """
+        Fetch the user's and the course's activity analytics for a course.
+        Either part is None when Canvas doesn't let this user see it; that
+        answer is cached as long as real data, so it isn't asked again. Parts
+        that failed for any other reason (timeouts, 5xx, Canvas down) are listed
+        under 'errors', and the result isn't cached.
+        """
+        course = self.course_stub(course_id)
+        analytics = {
+            'student': None,
+            'course': None
+        }
+        errors = []
 
-            # Try to get student analytics
-            try:
-                # Check if the method exists before calling it
-                if hasattr(course, 'get_user_in_a_course_level_participation'):
-                    student_analytics = course.get_user_in_a_course_level_participation(self.user.id)
-                    analytics['student'] = student_analytics
-                else:
-                    print("Method get_user_in_a_course_level_participation not available")
-                    # Provide mock data
-                    analytics['student'] = {
-                        'page_views': {'level': 'high', 'total': 120},
-                        'participations': {'level': 'medium', 'total': 15}
-                    }
-            except Exception as e:
+        try:
+            activity = course.get_user_in_a_course_level_participation_data(self.user.id)
+            analytics['student'] = summarize_student_activity(activity)
+        except Exception as e:
+            if not is_permission_error(e):
                 print(f"Error fetching student analytics: {str(e)}")
-                # Provide mock data
-                analytics['student'] = {
-                    'page_views': {'level': 'medium', 'total': 85},
-                    'participations': {'level': 'medium', 'total': 10}
-                }
+                errors.append('student')
 
-            # Try to get course analytics
-            try:
-                # Check if the method exists before calling it
-                if hasattr(course, 'get_course_level_participation'):
-                    course_analytics = course.get_course_level_participation()
-                    analytics['course'] = course_analytics
-                else:
-                    print("Method get_course_level_participation not available")
-                    # Provide mock data
-                    analytics['course'] = {
-                        'page_views': {'max': 200, 'mean': 85},
-                        'participations': {'max': 30, 'mean': 12}
-                    }
-            except Exception as e:
+        try:
+            analytics['course'] = summarize_course_activity(course.get_course_level_participation_data())
+        except Exception as e:
+            if not is_permission_error(e):
                 print(f"Error fetching course analytics: {str(e)}")
-                # Provide mock data
-                analytics['course'] = {
-                    'page_views': {'max': 180, 'mean': 75},
-                    'participations': {'max': 25, 'mean': 10}
-                }
+                errors.append('course')
+
+        if errors:
+            analytics['errors'] = errors
+        return analytics
 
-            return analytics
+    def get_courses_analytics(self, course_ids=None, max_workers=8):
+        """Fetch analytics for several courses (default: current classes) concurrently"""
+        try:
+            if course_ids is None:
+                course_ids = [course['course_id'] for course in self.get_current_classes() or []]
+            if not course_ids:
+                return {}
+
+            with ProfiledThreadPoolExecutor(max_workers=min(max_workers, len(course_ids)), name='analytics') as executor:
+                results = executor.map(self.get_course_analytics, course_ids)
+                return {str(course_id): analytics for course_id, analytics in zip(course_ids, results)}
         except Exception as e:
-            print(f"Error fetching course analytics: {str(e)}")
-            # Return mock data
-            return {
-                'student': {
-                    'page_views': {'level': 'medium', 'total': 75},
-                    'participations': {'level': 'medium', 'total': 8}
-                },
-                'course': {
-                    'page_views': {'max': 150, 'mean': 65},
-                    'participations': {'max': 20, 'mean': 8}
-                }
-            }
+            print(f"Error fetching analytics: {str(e)}")
+            return None
+
+    def get_dashboard(self):
+        """
+        The user's materialized dashboard. Only courses whose part is missing or
+        stale are read again (from the cached snapshot when it is still there).
+        """
+        try:
+            courses = self.get_current_classes()
+            if courses is None:
+                return None
+
+            view = dashboard_views.get(self.owner)
+            view.set_courses(courses)
+            stale = [course['course_id'] for course in courses if view.needs_refresh(course['course_id'])]
+            if stale and not self.degraded():
+                # String ids share the snapshot cache entries of /course-data
+                snapshots = dashboard_executor.map(self.get_complete_class_data, [str(course_id) for course_id in stale])
+                for course_id, class_data in zip(stale, snapshots):
+                    if class_data and is_complete_snapshot(class_data):
+                        view.update_course(course_id, class_data)
+            return view.document()
+        except Exception as e:
+            print(f"Error building dashboard: {str(e)}")
+            return None
+
+    def get_course_info(self, course_id):
+        """Basic course information"""
+        tree = self.course_tree(course_id)
+        if tree is not None:
+            # Dates aren't in the GraphQL tree; the course listing has them
+            listed = self.get_course_term_index().course(course_id) or {}
+            return with_body({
+                'id': course_id,
+                'name': tree['course']['name'],
+                'code': tree['course']['code'],
+                'start_date': listed.get('start_date'),
+                'end_date': listed.get('end_date'),
+                'syllabus': tree['course']['syllabus']
+            }, 'syllabus')
+
+        course = self.canvas.get_course(course_id)
+        return with_body({
+            'id': course_id,
+            'name': course.name,
+            'code': getattr(course, 'course_code', None),
+            'start_date': getattr(course, 'start_at', None),
+            'end_date': getattr(course, 'end_at', None),
+            'syllabus': getattr(course, 'syllabus_body', None)
+        }, 'syllabus')
+
+    def remaining_time(self):
+        """Seconds left in this manager's request budget (None without one)"""
+        return self.session.remaining()
+
+    def run_sections(self, sections):
+        """
+        Run section loaders concurrently, up to the deadline.
+        Returns (results, pending, failed): results of the loaders that finished
+        (None for the ones that failed), the names of the ones still running and
+        the names of the ones that raised.
+        """
+        executor = ProfiledThreadPoolExecutor(max_workers=len(sections), name='sections')
+        try:
+            futures = {name: executor.submit(load) for name, load in sections.items()}
+            concurrent.futures.wait(futures.values(), timeout=self.remaining_time())
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        results = {}
+        pending = []
+        failed = []
+        for name, future in futures.items():
+            if not future.done():
+                pending.append(name)
+            elif future.exception() is not None:
+                if name == 'course_info':
+                    raise future.exception()
+                print(f"Error fetching {name}: {str(future.exception())}")
+                results[name] = None
+                failed.append(name)
+            else:
+                results[name] = future.result()
+        return results, pending, failed
 
-    @cache_with_ttl(ttl_seconds=900)  # Cache for 15 minutes
     def get_complete_class_data(self, course_id):
+        """
+        A course's snapshot (see load_class_data). Snapshots served from the cache
+        may have been built by another worker, so they are fed to this process's
+        search index, timeline and dashboard too.
+        """
+        class_data = self.load_class_data(course_id)
+        if class_data and is_complete_snapshot(class_data):
+            absorb_snapshot(self.owner, course_id, class_data)
+        return class_data
+
+    @cache_with_ttl(ttl_seconds=900, cache_if=is_complete_snapshot)  # Cache for 15 minutes
+    def load_class_data(self, course_id):
         """
         Fetch all available information for a specific class.
         This comprehensive function pulls together data from all individual functions
         to create a complete context for the class.
+
+        Sections load concurrently. If the request budget runs out first, the
+        missing sections come from the last complete snapshot (or stay None)
+        and are listed under 'pending'; sections whose loader failed are filled
+        the same way and listed under 'failed'. While Canvas is down (circuit
+        open) the last complete snapshot is returned, flagged 'degraded'. None
+        of these are cached, indexed or pushed to clients.
         """
         try:
-            # Start with basic course information
-            course = self.canvas.get_course(course_id)
+            if self.degraded():
+                last = push_hub.last_snapshot(self.owner, course_id)
+                return dict(last, degraded=True) if last else None
+
+            # One GraphQL load up front rather than one race per section (no-op on REST)
+            self.prefetch_course_trees([course_id])
+
+            results, pending, failed = self.run_sections({
+                'course_info': lambda: self.get_course_info(course_id),
+                'professors': lambda: self.get_class_professors(course_id),
+                'grades': lambda: self.get_class_grades(course_id),
+                'assignments': lambda: self.get_class_assignments(course_id),
+                'modules': lambda: self.get_course_modules(course_id),
+                'announcements': lambda: self.get_course_announcements(course_id),
+                'discussions': lambda: self.get_course_discussions(course_id),
+                'files': lambda: self.get_course_files(course_id),
+                'groups': lambda: self.get_course_groups(course_id),
+                'analytics': lambda: self.get_course_analytics(course_id)
+            })
+
+            # Analytics report failed parts themselves
+            if (results.get('analytics') or {}).get('errors'):
+                failed.append('analytics')
+
+            missing = pending + failed
+            last = push_hub.last_snapshot(self.owner, course_id) or {} if missing else {}
+            if missing:
+                if 'course_info' in pending and not last.get('course_info'):
+                    print(f"Deadline passed before course {course_id} info loaded")
+                    return None
+                for name in missing:
+                    results[name] = last.get(name)
 
-            # Create the comprehensive data structure
             class_data = {
-                'course_info': {
-                    'id': course_id,
-                    'name': course.name,
-                    'code': getattr(course, 'course_code', None),
-                    'start_date': getattr(course, 'start_at', None),
-                    'end_date': getattr(course, 'end_at', None),
-                    'syllabus': getattr(course, 'syllabus_body', None)
-                },
-                'professors': self.get_class_professors(course_id),
-                'grades': self.get_class_grades(course_id),
-                'assignments': self.get_class_assignments(course_id),
-                'upcoming_tests': self.get_upcoming_tests(course_id)
+                'course_info': results['course_info'],
+                'professors': results['professors'],
+                'grades': results['grades'],
+                'assignments': results['assignments']
             }
+            timeline_indexes.get(self.owner).set_course_name(course_id, class_data['course_info']['name'])
 
-            # Add modules and content if available
-            try:
-                class_data['modules'] = self.get_course_modules(course_id)
-            except Exception as e:
-                print(f"Error fetching modules: {str(e)}")
-                class_data['modules'] = None
+            # Tests are a subset of the assignments we just listed, so no second listing
+            if class_data['assignments'] is not None:
+                class_data['upcoming_tests'] = upcoming_tests_from_assignments(class_data['assignments'])
+            elif 'assignments' in missing:
+                class_data['upcoming_tests'] = last.get('upcoming_tests')
+            else:
+                class_data['upcoming_tests'] = self.get_upcoming_tests(course_id)
 
-            # Add announcements if available
-            try:
-                class_data['announcements'] = self.get_course_announcements(course_id)
-            except Exception as e:
-                print(f"Error fetching announcements: {str(e)}")
-                class_data['announcements'] = None
+            for name in ('modules', 'announcements', 'discussions', 'files', 'groups', 'analytics'):
+                class_data[name] = results[name]
 
-            # Add discussions if available
-            try:
-                class_data['discussions'] = self.get_course_discussions(course_id)
-            except Exception as e:
-                print(f"Error fetching discussions: {str(e)}")
-                class_data['discussions'] = None
+            if self.degraded():
+                # Canvas went down mid-load; fill what failed from the last good snapshot
+                last = push_hub.last_snapshot(self.owner, course_id) or {}
+                for name, value in class_data.items():
+                    if value is None:
+                        class_data[name] = last.get(name)
+                class_data['degraded'] = True
 
-            # Add files if available
-            try:
-                class_data['files'] = self.get_course_files(course_id)
-            except Exception as e:
-                print(f"Error fetching files: {str(e)}")
-                class_data['files'] = None
+            if pending:
+                class_data['pending'] = pending
+            if failed:
+                class_data['failed'] = failed
+            if not is_complete_snapshot(class_data):
+                return class_data
 
-            # Add groups if available
-            try:
-                class_data['groups'] = self.get_course_groups(course_id)
-            except Exception as e:
-                print(f"Error fetching groups: {str(e)}")
-                class_data['groups'] = None
+            absorb_snapshot(self.owner, course_id, class_data, force=True)
 
-            # Add analytics if available
+            # Send what changed since the last snapshot to the user's open dashboards
             try:
-                class_data['analytics'] = self.get_course_analytics(course_id)
+                push_hub.snapshot_updated(self.owner, course_id, class_data)
             except Exception as e:
-                print(f"Error fetching analytics: {str(e)}")
-                class_data['analytics'] = None
+                print(f"Error publishing course {course_id} update: {str(e)}")
 
             return class_data
 
         except Exception as e:
             print(f"Error fetching complete class data: {str(e)}")
             return None
+
+
+# A snapshot read from the cache is absorbed again at most this often per course
+SNAPSHOT_ABSORB_INTERVAL = 60
+# How often a user's snapshots are looked up in the cache store
+SNAPSHOT_SCAN_INTERVAL = 30
+
+
+class AbsorbedSnapshots:
+    """Which of one user's snapshots this process has indexed, and when"""
+
+    def __init__(self):
+        self.courses = {}    # course_id -> (id of the snapshot, absorbed_at)
+        self.scanned_at = 0
+
+
+absorbed_snapshots = UserRegistry(AbsorbedSnapshots)
+
+
+def absorb_snapshot(owner, course_id, class_data, force=False):
+    """
+    Feed a complete course snapshot into this process's per-user search index,
+    timeline and dashboard. Cache hits on a snapshot already absorbed are skipped.
+    """
+    course_id = as_course_id(course_id)
+    absorbed = absorbed_snapshots.get(owner)
+    last = absorbed.courses.get(course_id)
+    now = time.time()
+    if not force and last and (last[0] == id(class_data) or now - last[1] < SNAPSHOT_ABSORB_INTERVAL):
+        return False
+    absorbed.courses[course_id] = (id(class_data), now)
+
+    # Refresh this course's documents in the user's search index
+    try:
+        search_indexes.get(owner).index_course(course_id, class_data)
+    except Exception as e:
+        print(f"Error indexing course {course_id} for search: {str(e)}")
+
+    try:
+        timeline = timeline_indexes.get(owner)
+        timeline.set_course_name(course_id, (class_data.get('course_info') or {}).get('name'))
+        if not force and class_data.get('assignments') is not None:
+            # A fresh build has already put its assignments in the timeline
+            timeline.replace_assignments(course_id, class_data['assignments'])
+    except Exception as e:
+        print(f"Error updating timeline for course {course_id}: {str(e)}")
+
+    try:
+        dashboard_views.get(owner).update_course(course_id, class_data)
+    except Exception as e:
+        print(f"Error updating dashboard for course {course_id}: {str(e)}")
+    return True
+
+
+def absorb_cached_snapshots(owner):
+    """
+    Absorb every complete snapshot of a user that any worker left in the cache
+    store, so search and the timeline work in a process that never built them.
+    """
+    absorbed = absorbed_snapshots.get(owner)
+    now = time.time()
+    if now - absorbed.scanned_at < SNAPSHOT_SCAN_INTERVAL:
+        return 0
+    absorbed.scanned_at = now
+
+    store = get_cache_store()
+    count = 0
+    for key in store.keys(f"{CanvasManager.load_class_data.cache_prefix}(CanvasManager({owner}), "):
+        try:
+            found, class_data = store.get(key)
+            if found and class_data and is_complete_snapshot(class_data):
+                count += absorb_snapshot(owner, class_data['course_info']['id'], class_data)
+        except Exception as e:
+            print(f"Error absorbing cached snapshot {key}: {str(e)}")
+    return count
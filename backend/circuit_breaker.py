@@ -0,0 +1,111 @@
+"""
+Per-host circuit breaker for Canvas calls.
+
+Every Canvas call made through a DeadlineSession is recorded against its host.
+When too many recent calls failed (connection errors, timeouts, 5xx) or were
+very slow, the breaker opens: calls to that host fail at once with CircuitOpen,
+and callers serve their last good data marked as degraded. A background thread
+probes the host's /health_check until it answers, then closes the breaker.
+"""
+import collections
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+
+CLOSED = 'closed'
+OPEN = 'open'
+
+WINDOW_SIZE = 50
+MIN_CALLS = 20
+FAILURE_RATE = 0.5
+# Calls slower than this count as failures: they tie up workers just the same
+SLOW_CALL_SECONDS = float(os.getenv('GLIDE_BREAKER_SLOW_SECONDS', 10))
+PROBE_INTERVAL = 15
+PROBE_TIMEOUT = 5
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+def host_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class CircuitBreaker:
+    def __init__(self, host):
+        self.host = host
+        self.state = CLOSED
+        self.opened_at = None
+        self._outcomes = collections.deque(maxlen=WINDOW_SIZE)
+        self._lock = threading.Lock()
+
+    def is_open(self):
+        return self.state == OPEN
+
+    def check(self):
+        if self.state == OPEN:
+            raise CircuitOpen(f"Canvas at {self.host} is unavailable; serving cached data")
+
+    def record(self, ok, seconds):
+        failed = not ok or seconds >= SLOW_CALL_SECONDS
+        with self._lock:
+            if self.state == OPEN:
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) < MIN_CALLS or sum(self._outcomes) / len(self._outcomes) < FAILURE_RATE:
+                return
+            self.state = OPEN
+            self.opened_at = time.time()
+            self._outcomes.clear()
+        print(f"Circuit opened for {self.host}")
+        threading.Thread(target=self._probe, name=f"probe {self.host}", daemon=True).start()
+
+    def _probe(self):
+        """Poll the host's health check until it answers, then close the breaker"""
+        while True:
+            time.sleep(PROBE_INTERVAL)
+            try:
+                started = time.monotonic()
+                response = requests.get(f"{self.host}/health_check", timeout=PROBE_TIMEOUT)
+                if response.status_code < 500 and time.monotonic() - started < SLOW_CALL_SECONDS:
+                    break
+            except requests.RequestException:
+                pass
+        with self._lock:
+            self.state = CLOSED
+            self.opened_at = None
+        print(f"Circuit closed for {self.host}")
+
+    def status(self):
+        with self._lock:
+            return {
+                'host': self.host,
+                'state': self.state,
+                'opened_at': self.opened_at,
+                'recent_calls': len(self._outcomes),
+                'recent_failures': sum(self._outcomes)
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(url):
+    host = host_of(url)
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(host, CircuitBreaker(host))
+    return breaker
+
+
+def breaker_statuses():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.status() for breaker in breakers]
@@ -0,0 +1,176 @@
+import bisect
+import re
+import threading
+import time
+
+from registry import UserRegistry
+
+# Words that carry no meaning when matching course names ("Introduction to ...")
+STOP_WORDS = {'a', 'an', 'and', 'for', 'in', 'of', 'on', 'the', 'to', 'with', 'intro', 'introduction'}
+
+# Score tiers so that the old exact > contains > all-words ordering still holds
+EXACT_SCORE = 100.0
+CONTAINS_SCORE = 80.0
+TOKEN_SCORE = 60.0
+INITIALS_SCORE = 50.0
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Split a course name or query into lowercase alphanumeric tokens"""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+def initials(tokens):
+    """Initialism for a list of tokens, ignoring stop words ("Discrete Mathematics" -> "dm")"""
+    return ''.join(token[0] for token in tokens if token not in STOP_WORDS and not token.isdigit())
+
+
+class CourseNameIndex:
+    """
+    In-memory index of one user's course names.
+    Keeps a token -> course ids inverted index plus a sorted vocabulary so that
+    abbreviated query words ("Math", "Calc") can be resolved by prefix.
+    """
+
+    def __init__(self):
+        self._courses = {}      # course_id -> {'name', 'code', 'tokens', 'initials'}
+        self._postings = {}     # token -> set of course ids
+        self._vocabulary = []   # sorted list of tokens, for prefix lookups
+        self._lock = threading.RLock()
+        self.refreshed_at = 0
+
+    def __len__(self):
+        return len(self._courses)
+
+    def is_stale(self, ttl_seconds):
+        """True if the index has never been synced or is older than the TTL"""
+        return not self.refreshed_at or time.time() - self.refreshed_at >= ttl_seconds
+
+    def sync(self, courses):
+        """
+        Bring the index in line with a course listing.
+        Only courses that were added, renamed or removed are re-tokenized.
+        """
+        if courses is None:
+            return
+
+        with self._lock:
+            seen = set()
+            for course in courses:
+                course_id = course['course_id']
+                seen.add(course_id)
+                name = course.get('course_name') or ''
+                code = course.get('course_code') or ''
+
+                existing = self._courses.get(course_id)
+                if existing and existing['name'] == name and existing['code'] == code:
+                    continue
+                if existing:
+                    self._remove(course_id)
+                self._add(course_id, name, code)
+
+            for course_id in [cid for cid in self._courses if cid not in seen]:
+                self._remove(course_id)
+
+            self.refreshed_at = time.time()
+
+    def _add(self, course_id, name, code):
+        name_tokens = tokenize(name)
+        tokens = set(name_tokens) | set(tokenize(code))
+        self._courses[course_id] = {
+            'name': name,
+            'lower_name': name.lower(),
+            'code': code,
+            'tokens': tokens,
+            'initials': initials(name_tokens)
+        }
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                self._postings[token] = {course_id}
+                bisect.insort(self._vocabulary, token)
+            else:
+                postings.add(course_id)
+
+    def _remove(self, course_id):
+        entry = self._courses.pop(course_id, None)
+        if not entry:
+            return
+        for token in entry['tokens']:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(course_id)
+            if not postings:
+                del self._postings[token]
+                position = bisect.bisect_left(self._vocabulary, token)
+                if position < len(self._vocabulary) and self._vocabulary[position] == token:
+                    del self._vocabulary[position]
+
+    def _prefix_matches(self, prefix):
+        """Yield (token, course ids) for every indexed token starting with prefix"""
+        position = bisect.bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and self._vocabulary[position].startswith(prefix):
+            token = self._vocabulary[position]
+            yield token, self._postings[token]
+            position += 1
+
+    def search(self, query, limit=5):
+        """
+        Rank courses against a free-text query.
+        Returns a list of (course_id, course_name, score), best match first.
+        """
+        query_lower = (query or '').strip().lower()
+        query_tokens = [token for token in tokenize(query_lower) if token not in STOP_WORDS] or tokenize(query_lower)
+        if not query_tokens:
+            return []
+
+        with self._lock:
+            # Score every candidate that matches at least one query word
+            token_scores = {}
+            for token in query_tokens:
+                best_for_token = {}
+                for indexed_token, course_ids in self._prefix_matches(token):
+                    # Whole-word hits beat prefix hits ("math" vs "mathematics")
+                    weight = 1.0 if indexed_token == token else len(token) / len(indexed_token)
+                    for course_id in course_ids:
+                        if weight > best_for_token.get(course_id, 0):
+                            best_for_token[course_id] = weight
+                for course_id, weight in best_for_token.items():
+                    token_scores.setdefault(course_id, []).append(weight)
+
+            ranked = []
+            for course_id, weights in token_scores.items():
+                entry = self._courses[course_id]
+                if query_lower == entry['lower_name']:
+                    score = EXACT_SCORE
+                elif query_lower in entry['lower_name']:
+                    score = CONTAINS_SCORE + 10.0 * len(query_lower) / len(entry['lower_name'])
+                else:
+                    coverage = len(weights) / len(query_tokens)
+                    quality = sum(weights) / len(query_tokens)
+                    # Require every query word to be present, like the old all-words pass
+                    if coverage < 1.0:
+                        continue
+                    score = TOKEN_SCORE + 10.0 * quality - 0.1 * len(entry['tokens'])
+                ranked.append((course_id, entry['name'], score))
+
+            # Initialisms ("DM" for "Discrete Mathematics") when nothing else matched
+            if not ranked and len(query_tokens) == 1 and len(query_tokens[0]) > 1:
+                for course_id, entry in self._courses.items():
+                    if entry['initials'].startswith(query_tokens[0]):
+                        ranked.append((course_id, entry['name'], INITIALS_SCORE))
+
+        ranked.sort(key=lambda match: match[2], reverse=True)
+        return ranked[:limit]
+
+    def lookup(self, query):
+        """Best matching course id for a query, or None"""
+        matches = self.search(query, limit=1)
+        return matches[0][0] if matches else None
+
+
+# One index per user, shared by every CanvasManager created for them
+course_name_indexes = UserRegistry(CourseNameIndex)
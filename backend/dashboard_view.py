@@ -0,0 +1,230 @@
+"""
+Materialized dashboard view per user.
+
+The dashboard shows the current courses with their instructor and progress,
+every course's assignments merged into one list, and the latest announcements.
+Instead of rebuilding that from raw course payloads on each load, a view keeps
+one precomputed part per course, rebuilt only when that course's snapshot
+changes, and assembles the small dashboard document from the parts. The
+document is reused until a part changes or its time-based fields (urgency,
+due this week) are due for a refresh.
+"""
+import heapq
+import threading
+import time
+
+from registry import UserRegistry
+from rich_text import process_html
+from search_index import as_course_id
+from timeline_index import canvas_timestamp
+
+# Parts older than the course snapshot's own TTL are re-read from the snapshot
+PART_TTL = 900
+# Urgency and "due this week" drift with the clock
+DOCUMENT_MAX_AGE = 300
+URGENT_SECONDS = 48 * 3600
+WEEK_SECONDS = 7 * 86400
+MAX_ASSIGNMENTS = 100
+MAX_ANNOUNCEMENTS = 20
+STATUS_ORDER = {'upcoming': 0, 'missing': 1, 'past': 2}
+CREDITS_PER_COURSE = 3
+
+LETTER_GRADE_POINTS = {
+    'A': 4.0, 'A-': 3.7, 'B+': 3.3, 'B': 3.0, 'B-': 2.7, 'C+': 2.3,
+    'C': 2.0, 'C-': 1.7, 'D+': 1.3, 'D': 1.0, 'D-': 0.7, 'F': 0.0
+}
+# (minimum score, grade points), highest first
+SCORE_GRADE_POINTS = [
+    (93, 4.0), (90, 3.7), (87, 3.3), (83, 3.0), (80, 2.7), (77, 2.3),
+    (73, 2.0), (70, 1.7), (67, 1.3), (63, 1.0), (60, 0.7)
+]
+
+
+def format_date(value):
+    """'2026-10-19T23:59:00Z' -> 'Oct 19, 2026'"""
+    timestamp = canvas_timestamp(value)
+    if timestamp is None:
+        return None
+    day = time.gmtime(timestamp)
+    return f"{time.strftime('%b', day)} {day.tm_mday}, {day.tm_year}"
+
+
+def grade_points(grades):
+    """Grade points for a course: from the letter grade, else from the score (None if neither)"""
+    grades = grades or {}
+    letter = grades.get('current_grade')
+    if letter:
+        if letter in LETTER_GRADE_POINTS:
+            return LETTER_GRADE_POINTS[letter]
+        if letter[0] in 'ABCDF':
+            return LETTER_GRADE_POINTS[letter[0]]
+    score = grades.get('current_score')
+    if score:
+        return next((points for minimum, points in SCORE_GRADE_POINTS if score >= minimum), 0.0)
+    return None
+
+
+def dashboard_course(course_id, listed, class_data):
+    info = (class_data or {}).get('course_info') or {}
+    name = info.get('name') or listed.get('course_name') or f"Course {course_id}"
+    professors = (class_data or {}).get('professors') or []
+    score = ((class_data or {}).get('grades') or {}).get('current_score')
+    return {
+        'id': course_id,
+        'name': name,
+        'code': info.get('code') or listed.get('course_code') or f"Course {course_id}",
+        'instructor': professors[0]['name'] if professors else f"Instructor of {name}",
+        'progress': min(100, max(0, score)) if score else 0
+    }
+
+
+def dashboard_assignments(course, assignments):
+    """[(sort key, assignment)] for one course, sorted upcoming, missing, past and by due date"""
+    rows = []
+    for status, records in (assignments or {}).items():
+        if status not in STATUS_ORDER:
+            continue
+        for assignment in records or []:
+            due = canvas_timestamp(assignment.get('due_date'))
+            if not assignment.get('name') or due is None:
+                continue
+            row = {
+                'id': assignment['id'],
+                'title': assignment['name'],
+                'dueDate': assignment['due_date'],
+                'formattedDueDate': format_date(assignment['due_date']),
+                'courseName': course['name'],
+                'courseId': course['id'],
+                'status': status,
+                'pointsPossible': assignment.get('points_possible')
+            }
+            if status == 'past':
+                row['score'] = assignment.get('score')
+            rows.append(((STATUS_ORDER[status], due, str(assignment['id'])), row))
+    rows.sort(key=lambda entry: entry[0])
+    return rows
+
+
+def dashboard_announcements(course, announcements):
+    """[(sort key, announcement)] for one course, newest first, at most MAX_ANNOUNCEMENTS"""
+    rows = []
+    for announcement in announcements or []:
+        posted = canvas_timestamp(announcement.get('posted_at')) or 0
+        rows.append(((-posted, str(announcement['id'])), {
+            'id': announcement['id'],
+            'title': announcement.get('title'),
+            # Plain-text excerpt; the full body is one /content request away
+            'message': process_html(announcement.get('message'))['excerpt'],
+            'postedAt': announcement.get('posted_at'),
+            'formattedPostedAt': format_date(announcement.get('posted_at')) or 'Unknown date',
+            'courseName': course['name'],
+            'courseId': course['id'],
+            'author': (announcement.get('author') or {}).get('display_name')
+        }))
+    rows.sort(key=lambda entry: entry[0])
+    return rows[:MAX_ANNOUNCEMENTS]
+
+
+class DashboardView:
+    """One user's dashboard: a precomputed part per course and the assembled document"""
+
+    def __init__(self):
+        self._listed = {}        # course_id -> course listing entry, in dashboard order
+        self._parts = {}         # course_id -> part built from the course snapshot
+        self._version = 0
+        self._document = None    # (version, built_at, document)
+        self._lock = threading.Lock()
+
+    def set_courses(self, courses):
+        """Set the dashboard's courses (current classes listing); parts of other courses are dropped"""
+        listed = {course['course_id']: course for course in courses}
+        with self._lock:
+            if listed == self._listed and list(listed) == list(self._listed):
+                return
+            self._listed = listed
+            self._parts = {course_id: part for course_id, part in self._parts.items() if course_id in listed}
+            self._version += 1
+
+    def update_course(self, course_id, class_data):
+        """Rebuild one course's part from a complete snapshot (courses off the dashboard are ignored)"""
+        course_id = as_course_id(course_id)
+        if self._listed and course_id not in self._listed:
+            return
+        course = dashboard_course(course_id, self._listed.get(course_id) or {}, class_data)
+        part = {
+            'course': course,
+            'assignments': dashboard_assignments(course, class_data.get('assignments')),
+            'announcements': dashboard_announcements(course, class_data.get('announcements')),
+            'grade_points': grade_points(class_data.get('grades')),
+            'built_at': time.time(),
+            'stale': False
+        }
+        with self._lock:
+            self._parts[course_id] = part
+            self._version += 1
+
+    def mark_stale(self, course_id):
+        with self._lock:
+            part = self._parts.get(as_course_id(course_id))
+            if part is not None:
+                part['stale'] = True
+
+    def needs_refresh(self, course_id, ttl_seconds=PART_TTL):
+        part = self._parts.get(as_course_id(course_id))
+        return part is None or part['stale'] or time.time() - part['built_at'] >= ttl_seconds
+
+    def document(self):
+        with self._lock:
+            version = self._version
+            cached = self._document
+            if cached and cached[0] == version and time.time() - cached[1] < DOCUMENT_MAX_AGE:
+                return cached[2]
+            listed = dict(self._listed)
+            parts = dict(self._parts)
+
+        document = self._assemble(listed, parts, time.time())
+        with self._lock:
+            if self._version == version:
+                self._document = (version, time.time(), document)
+        return document
+
+    def _assemble(self, listed, parts, now):
+        course_parts = [parts.get(course_id) for course_id in listed]
+        courses = [
+            part['course'] if part else dashboard_course(course_id, course, None)
+            for (course_id, course), part in zip(listed.items(), course_parts)
+        ]
+        course_parts = [part for part in course_parts if part]
+
+        # Every course's rows are already sorted, so merging keeps the order
+        assignments = []
+        upcoming = []
+        for _, row in heapq.merge(*(part['assignments'] for part in course_parts), key=lambda entry: entry[0]):
+            if row['status'] == 'upcoming':
+                upcoming.append(canvas_timestamp(row['dueDate']))
+            if len(assignments) < MAX_ASSIGNMENTS:
+                if row['status'] == 'upcoming':
+                    row = dict(row, urgent=canvas_timestamp(row['dueDate']) - now <= URGENT_SECONDS)
+                assignments.append(row)
+
+        announcements = [
+            row for _, row in heapq.merge(*(part['announcements'] for part in course_parts), key=lambda entry: entry[0])
+        ][:MAX_ANNOUNCEMENTS]
+
+        points = [part['grade_points'] for part in course_parts if part['grade_points'] is not None]
+        return {
+            'courses': courses,
+            'assignments': assignments,
+            'announcements': announcements,
+            'statistics': {
+                'gpa': f"{sum(points) / len(points) if points else 0:.2f}",
+                'completedCredits': CREDITS_PER_COURSE * sum(1 for value in points if value >= 0.7),
+                'upcomingDeadlines': len(upcoming),
+                'dueThisWeek': sum(1 for due in upcoming if now < due < now + WEEK_SECONDS)
+            },
+            'loaded_courses': len(course_parts),
+            'generated_at': now
+        }
+
+
+dashboard_views = UserRegistry(DashboardView)
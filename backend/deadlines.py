@@ -0,0 +1,181 @@
+"""
+Request deadlines and hedged GETs for Canvas calls.
+
+Every CanvasManager talks to Canvas through a DeadlineSession. Once a manager
+has a deadline, each HTTP call gets the time that is left as its timeout, and
+calls made after the deadline fail at once with DeadlineExceeded, so a slow
+section can't hold up a response past its budget.
+
+Calls also go through the host's circuit breaker (see circuit_breaker).
+
+With hedging on, a GET still running after the p95 latency of its endpoint is
+sent a second time and whichever copy answers first is used. Only GETs are
+hedged: they are idempotent, so the duplicate is harmless. Hedged copies run
+on a pool of GLIDE_HEDGE_WORKERS threads; a GET that finds no free thread
+there runs unhedged on the caller's thread rather than queueing, so the pool
+never limits how many calls a process makes.
+"""
+import collections
+import concurrent.futures
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import breaker_for
+from profiler import ProfiledThreadPoolExecutor
+
+DEFAULT_REQUEST_TIMEOUT = 30
+# Default time budget for one API request's Canvas calls (0 = none)
+REQUEST_BUDGET = float(os.getenv('GLIDE_REQUEST_BUDGET', 0)) or None
+HEDGE_ENABLED = os.getenv('GLIDE_HEDGE_REQUESTS', 'false').lower() == 'true'
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Keep-alive connections per Canvas host, shared by every session in the process
+POOL_SIZE = 32
+
+HEDGE_WORKERS = int(os.getenv('GLIDE_HEDGE_WORKERS', 64))
+
+_hedge_executor = ProfiledThreadPoolExecutor(max_workers=HEDGE_WORKERS, name='hedge')
+_hedge_threads = threading.BoundedSemaphore(HEDGE_WORKERS)
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+def endpoint_family(url):
+    """'https://x/api/v1/courses/12/files?page=2' -> '/api/v1/courses/:id/files'"""
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    path = path[path.find('/'):] if '/' in path else '/'
+    return re.sub(r'/\d+(?=/|$)', '/:id', path)
+
+
+class LatencyTracker:
+    """Recent latencies per endpoint family"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = collections.defaultdict(lambda: collections.deque(maxlen=window))
+        self._lock = threading.Lock()
+
+    def record(self, family, seconds):
+        with self._lock:
+            self._samples[family].append(seconds)
+
+    def p95(self, family):
+        with self._lock:
+            samples = sorted(self._samples.get(family, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+latencies = LatencyTracker()
+
+
+_adapters = {}
+_adapters_lock = threading.Lock()
+
+
+def shared_adapter():
+    """
+    This process's connection pool. Sessions are made per request, so without
+    it every request would open (and TLS-handshake) new connections to Canvas.
+    Keyed by pid: pooled sockets must not be shared across a fork.
+    """
+    pid = os.getpid()
+    adapter = _adapters.get(pid)
+    if adapter is None:
+        with _adapters_lock:
+            adapter = _adapters.setdefault(pid, HTTPAdapter(pool_connections=16, pool_maxsize=POOL_SIZE))
+    return adapter
+
+
+class DeadlineSession(requests.Session):
+    def __init__(self, budget_seconds=None, hedge=HEDGE_ENABLED):
+        super().__init__()
+        self.mount('https://', shared_adapter())
+        self.mount('http://', shared_adapter())
+        self.deadline = time.monotonic() + budget_seconds if budget_seconds else None
+        self.hedge = hedge
+
+    def remaining(self):
+        """Seconds left before the deadline (None without one)"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def request(self, method, url, **kwargs):
+        breaker_for(url).check()
+        timeout = DEFAULT_REQUEST_TIMEOUT
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded(f"Deadline passed before {method} {endpoint_family(url)}")
+            timeout = min(timeout, remaining)
+        kwargs['timeout'] = timeout
+
+        # A streamed body is read after we return, so it can't race a second copy
+        if self.hedge and method.upper() == 'GET' and not kwargs.get('stream'):
+            return self._hedged(method, url, timeout, kwargs)
+        return self._timed(method, url, kwargs)
+
+    def _timed(self, method, url, kwargs):
+        breaker = breaker_for(url)
+        started = time.monotonic()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.RequestException as e:
+            # A timeout cut short by the caller's own budget says nothing about the host
+            if not (isinstance(e, requests.Timeout) and kwargs['timeout'] < DEFAULT_REQUEST_TIMEOUT):
+                breaker.record(False, time.monotonic() - started)
+            raise
+        elapsed = time.monotonic() - started
+        latencies.record(endpoint_family(url), elapsed)
+        breaker.record(response.status_code < 500, elapsed)
+        return response
+
+    def _hedged(self, method, url, timeout, kwargs):
+        delay = latencies.p95(endpoint_family(url))
+        if delay is None or delay >= timeout:
+            return self._timed(method, url, kwargs)
+        first = submit_hedge(self._timed, method, url, kwargs)
+        if first is None:
+            return self._timed(method, url, kwargs)
+
+        done, _ = concurrent.futures.wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        second = submit_hedge(self._timed, method, url, kwargs)
+        if second is None:
+            return first.result()
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.add_done_callback(close_response)
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+def submit_hedge(function, *args):
+    """Run function on a free hedge thread; None when they're all busy (nothing queues)"""
+    if not _hedge_threads.acquire(blocking=False):
+        return None
+    future = _hedge_executor.submit(function, *args)
+    future.add_done_callback(lambda _: _hedge_threads.release())
+    return future
+
+
+def close_response(future):
+    """Give the losing hedge's connection back to the pool"""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
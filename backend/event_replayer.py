@@ -0,0 +1,80 @@
+"""
+Replay recorded Canvas events against the backend.
+
+    python event_replayer.py events.jsonl                  # in-process, no server needed
+    python event_replayer.py events.jsonl --url http://localhost:5000
+    python event_replayer.py events.jsonl --realtime       # keep the original spacing
+
+Each line of the input is one event payload, as Canvas would POST it. Events
+that carry a timestamp (metadata.event_time or "timestamp") can be replayed
+with their original spacing.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+
+from timeline_index import canvas_timestamp
+
+
+def load_events(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def event_time(event):
+    metadata = event.get('metadata') or {}
+    value = metadata.get('event_time') or event.get('timestamp')
+    return canvas_timestamp(value.split('.')[0] + 'Z' if value and '.' in value else value)
+
+
+def post_event(url, token, event):
+    request = urllib.request.Request(
+        url.rstrip('/') + '/api/canvas/events',
+        data=json.dumps(event).encode('utf-8'),
+        headers={'Content-Type': 'application/json', 'X-Glide-Events-Token': token},
+        method='POST'
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read())
+
+
+def replay(events, url=None, token=None, realtime=False):
+    """Send events in order; returns the endpoint's response for each"""
+    token = token or os.getenv('GLIDE_EVENTS_TOKEN', '')
+    if url:
+        send = lambda event: post_event(url, token, event)
+    else:
+        from app import app
+        client = app.test_client()
+        send = lambda event: client.post('/api/canvas/events', json=event,
+                                         headers={'X-Glide-Events-Token': token}).get_json()
+
+    responses = []
+    previous = None
+    for event in events:
+        current = event_time(event)
+        if realtime and previous is not None and current is not None and current > previous:
+            time.sleep(current - previous)
+        previous = current if current is not None else previous
+        responses.append(send(event))
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path', help='JSONL file of event payloads')
+    parser.add_argument('--url', help='Backend base URL; replays in-process when omitted')
+    parser.add_argument('--token', help='Events token (defaults to GLIDE_EVENTS_TOKEN)')
+    parser.add_argument('--realtime', action='store_true', help='Preserve the time between events')
+    args = parser.parse_args()
+
+    for response in replay(load_events(args.path), url=args.url, token=args.token, realtime=args.realtime):
+        print(json.dumps(response))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""
+Canvas event ingestion.
+
+Accepts Canvas Live Events (the "canvas" format: {"metadata": {...}, "body": {...}})
+and simpler webhook payloads ({"event_type": ..., "course_id": ..., "data": {...}}),
+and brings cached course data in line with them: announcements are patched in
+place, everything else is invalidated so the next request refetches it. Courses that a connected
+dashboard is watching are rebuilt in the background right away, so the change
+is pushed to it (see push_hub).
+
+The worker that receives an event updates the cache store once. With a shared
+store (GLIDE_CACHE_BACKEND=sqlite) it also appends the event to a short log
+in the store. Every other worker replays the log against its own in-memory
+structures (module trees, result pages, timelines, dashboard views) within
+EVENT_SYNC_INTERVAL.
+"""
+import hmac
+import os
+
+from canvas_manager import CanvasManager
+from shared_cache import get_cache_store, SharedLog
+from module_tree import module_trees
+from pagination import page_cache
+from push_hub import push_hub
+from search_index import as_course_id
+from timeline_index import timeline_indexes
+from calendar_cache import calendar_caches
+from graphql_engine import course_trees
+from dashboard_view import dashboard_views
+from rich_text import with_body
+from file_store import file_indexes
+from profiler import ProfiledThreadPoolExecutor
+
+# Event names (Live Events and webhook aliases) mapped to what they touch
+SUBMISSION_EVENTS = {'submission_created', 'submission_updated', 'submission_created_webhook'}
+GRADE_EVENTS = {'grade_change', 'grade_changed'}
+ASSIGNMENT_EVENTS = {'assignment_created', 'assignment_updated', 'assignment_deleted'}
+ANNOUNCEMENT_EVENTS = {'announcement_created', 'announcement_posted'}
+DISCUSSION_EVENTS = {'discussion_topic_created', 'discussion_topic_updated', 'discussion_entry_created'}
+MODULE_EVENTS = {'module_created', 'module_updated', 'module_item_created', 'module_item_updated',
+                 'content_migration_completed'}
+MODULE_PROGRESS_EVENTS = {'course_progress', 'module_item_completed'}
+FILE_EVENTS = {'attachment_created', 'attachment_updated', 'attachment_deleted'}
+CALENDAR_EVENTS = {'calendar_event_created', 'calendar_event_updated', 'calendar_event_deleted'}
+COURSE_EVENTS = {'course_updated', 'syllabus_updated', 'enrollment_created', 'enrollment_updated'}
+
+# Live Events carry global ids: shard id * 10^13 + the local id the REST API uses
+GLOBAL_ID_OFFSET = 10 ** 13
+
+EVENT_LOG_PREFIX = 'events:'
+EVENT_LOG_TTL = 600
+EVENT_SYNC_INTERVAL = 1.0
+EVENT_REPLAY_WINDOW = 30
+
+# Background snapshot rebuilds for courses with live subscribers
+_refresh_executor = ProfiledThreadPoolExecutor(max_workers=4, name='refresh')
+
+
+class EventError(ValueError):
+    pass
+
+
+def check_token(provided):
+    """Events must carry the shared secret from GLIDE_EVENTS_TOKEN"""
+    expected = os.getenv('GLIDE_EVENTS_TOKEN')
+    return bool(expected) and bool(provided) and hmac.compare_digest(expected, provided)
+
+
+def local_id(value):
+    """The local (REST) id of a Canvas id that may be global"""
+    value = as_course_id(value)
+    if isinstance(value, int) and value >= GLOBAL_ID_OFFSET:
+        return value % GLOBAL_ID_OFFSET
+    return value
+
+
+def parse_event(payload):
+    """Normalize a Live Event or webhook payload to (name, course_id, body)"""
+    if not isinstance(payload, dict):
+        raise EventError("Event payload must be a JSON object")
+
+    if 'metadata' in payload:
+        metadata = payload.get('metadata') or {}
+        body = payload.get('body') or {}
+        name = metadata.get('event_name')
+        course_id = body.get('course_id') or body.get('context_id')
+        if metadata.get('context_type') == 'Course' and metadata.get('context_id'):
+            course_id = course_id or metadata['context_id']
+    else:
+        body = payload.get('data') or {}
+        name = payload.get('event_type') or payload.get('event_name')
+        course_id = payload.get('course_id') or body.get('course_id')
+
+    if not name:
+        raise EventError("Event name is missing")
+
+    # Caches, indexes and registries are keyed by local ids
+    return name, local_id(course_id) if course_id is not None else None, body
+
+
+def course_cache_keys(method, course_id):
+    """Cache keys of a cache_with_ttl method for one course, across every user"""
+    suffixes = (f", {course_id!r}){{}}", f", {str(course_id)!r}){{}}")
+    return [key for key in get_cache_store().keys(method.cache_prefix) if key.endswith(suffixes)]
+
+
+def invalidate_method(method, course_id):
+    store = get_cache_store()
+    keys = course_cache_keys(method, course_id)
+    for key in keys:
+        store.delete(key)
+    return len(keys)
+
+
+def invalidate_all(method):
+    """Drop every cached result of a cache_with_ttl method, for every user"""
+    store = get_cache_store()
+    keys = store.keys(method.cache_prefix)
+    for key in keys:
+        store.delete(key)
+    return len(keys)
+
+
+def invalidate_calendar_spans(course_id):
+    """Drop the shared calendar spans fetched for a course's context, for every user"""
+    store = get_cache_store()
+    context = repr(f"course_{course_id}")
+    keys = [key for key in store.keys(CanvasManager.fetch_calendar_span.cache_prefix) if context in key]
+    for key in keys:
+        store.delete(key)
+    return len(keys)
+
+
+def invalidate_calendars(course_id):
+    for owner in calendar_caches.owners():
+        calendar_caches.get(owner).invalidate(f"course_{course_id}")
+
+
+def mark_timeline_stale(course_id):
+    for owner in timeline_indexes.owners():
+        timeline_indexes.get(owner).course_refreshed_at.pop(course_id, None)
+
+
+def patch_announcements(course_id, body):
+    """Put a new announcement at the top of every cached announcement list for the course"""
+    announcement = with_body({
+        'id': local_id(body.get('discussion_topic_id') or body.get('id')),
+        'title': body.get('title'),
+        'message': body.get('body') or body.get('message'),
+        'posted_at': body.get('posted_at') or body.get('created_at'),
+        'author': body.get('author') or {}
+    }, 'announcement')
+    store = get_cache_store()
+    method = CanvasManager.get_course_announcements
+    patched = 0
+    for key in course_cache_keys(method, course_id):
+        found, announcements = store.get(key)
+        if not found or announcements is None:
+            continue
+        announcements = [item for item in announcements if item.get('id') != announcement['id']]
+        store.set(key, [announcement] + announcements, method.ttl_seconds)
+        patched += 1
+    return patched
+
+
+def refresh_snapshot(owner, course_id):
+    """Rebuild one user's course snapshot; the push hub sends the diff"""
+    try:
+        # Owners without a Firebase user id run on the environment credentials
+        canvas_manager = CanvasManager(user_id=None if '#' in owner else owner)
+        canvas_manager.get_complete_class_data(course_id)
+    except Exception as e:
+        print(f"Error refreshing course {course_id} for {owner}: {str(e)}")
+
+
+def refresh_subscribers(course_id):
+    owners = push_hub.owners_watching(course_id)
+    for owner in owners:
+        _refresh_executor.submit(refresh_snapshot, owner, course_id)
+    return len(owners)
+
+
+def is_handled(name, is_announcement=False):
+    return is_announcement or any(name in events for events in (
+        DISCUSSION_EVENTS, SUBMISSION_EVENTS, GRADE_EVENTS, ASSIGNMENT_EVENTS, CALENDAR_EVENTS,
+        MODULE_EVENTS, MODULE_PROGRESS_EVENTS, FILE_EVENTS, COURSE_EVENTS
+    ))
+
+
+def invalidate_process(name, course_id, is_announcement=False):
+    """
+    Bring this process's in-memory structures in line with an event and rebuild
+    the course for this process's live subscribers.
+    Returns the number of background rebuilds started.
+    """
+    if is_announcement:
+        page_cache.invalidate(resource='announcements', course_id=course_id)
+    elif name in DISCUSSION_EVENTS:
+        page_cache.invalidate(resource='discussions', course_id=course_id)
+    elif name in SUBMISSION_EVENTS or name in GRADE_EVENTS or name in ASSIGNMENT_EVENTS:
+        mark_timeline_stale(course_id)
+        if name in ASSIGNMENT_EVENTS:
+            invalidate_calendars(course_id)
+    elif name in CALENDAR_EVENTS:
+        invalidate_calendars(course_id)
+        mark_timeline_stale(course_id)
+        return 0
+    elif name in MODULE_EVENTS or name in MODULE_PROGRESS_EVENTS or name in COURSE_EVENTS:
+        for owner in module_trees.owners():
+            module_trees.get(owner).invalidate(course_id)
+    elif name in FILE_EVENTS:
+        page_cache.invalidate(resource='files', course_id=course_id)
+        # Deletions don't show up in an updated_at sync
+        for owner in file_indexes.owners():
+            file_indexes.get(owner).expire(course_id, full=name == 'attachment_deleted')
+    else:
+        return 0
+
+    # Every other handled event changes the course snapshot
+    for owner in course_trees.owners():
+        course_trees.get(owner).invalidate(course_id)
+    for owner in dashboard_views.owners():
+        dashboard_views.get(owner).mark_stale(course_id)
+    return refresh_subscribers(course_id)
+
+
+event_log = SharedLog(EVENT_LOG_PREFIX, EVENT_LOG_TTL, EVENT_REPLAY_WINDOW, EVENT_SYNC_INTERVAL)
+
+
+def replay_events():
+    """Apply events other workers received to this process's structures (throttled by the log)"""
+    replayed = 0
+    for event in event_log.read_new():
+        try:
+            invalidate_process(event['name'], event['course_id'], event.get('is_announcement'))
+            replayed += 1
+        except Exception as e:
+            print(f"Error replaying event {event.get('name')}: {str(e)}")
+    return replayed
+
+
+def apply_event(payload):
+    """
+    Apply one event to the caches.
+    Returns a summary of what was patched and invalidated.
+    """
+    name, course_id, body = parse_event(payload)
+    summary = {'event': name, 'course_id': course_id, 'patched': 0, 'invalidated': 0, 'ignored': False, 'refreshing': 0}
+
+    is_announcement = name in ANNOUNCEMENT_EVENTS or bool(
+        name == 'discussion_topic_created' and body.get('is_announcement')
+    )
+    if course_id is None or not is_handled(name, is_announcement):
+        summary['ignored'] = True
+        return summary
+
+    # The cache store is shared by every worker, so it is only updated here
+    if is_announcement:
+        summary['patched'] += patch_announcements(course_id, body)
+    elif name in GRADE_EVENTS:
+        # Grades are cached per user across courses, not per course
+        summary['invalidated'] += invalidate_all(CanvasManager.get_user_grades)
+    if name in CALENDAR_EVENTS or name in ASSIGNMENT_EVENTS:
+        summary['invalidated'] += invalidate_calendar_spans(course_id)
+    if name not in CALENDAR_EVENTS:
+        summary['invalidated'] += invalidate_method(CanvasManager.load_class_data, course_id)
+        if name in COURSE_EVENTS and name.startswith('enrollment'):
+            summary['invalidated'] += invalidate_method(CanvasManager.get_class_professors, course_id)
+
+    summary['refreshing'] = invalidate_process(name, course_id, is_announcement)
+    event_log.append({'name': name, 'course_id': course_id, 'is_announcement': is_announcement})
+    return summary
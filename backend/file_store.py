@@ -0,0 +1,295 @@
+"""
+Course files: metadata synced incrementally, content cached on disk.
+
+Each user's file listing per course is kept and refreshed by asking Canvas for
+files newest-updated first, stopping at the first one already seen; only a
+periodic full listing (or a deletion event) catches removed files.
+
+File content is downloaded once per (Canvas host, file, version) into a disk
+cache shared by every user and worker on the host, and served from there with
+memory-mapped reads and HTTP range support. The byte budget covers the whole
+directory: a hit bumps the file's mtime, and each worker keeps an LRU of the
+files it knows about. When that LRU passes the budget, or every
+FILE_RESCAN_INTERVAL (to pick up other workers' files), the worker re-reads
+the directory and deletes the least recently used files, whichever worker
+used them.
+"""
+import collections
+import hashlib
+import mmap
+import os
+import re
+import threading
+import time
+
+from registry import UserRegistry
+from search_index import as_course_id
+
+FILE_SYNC_INTERVAL = 60
+FULL_SYNC_INTERVAL = 3600
+FILE_CACHE_DIR = os.getenv('GLIDE_FILE_CACHE_DIR', '/tmp/glide-files')
+FILE_CACHE_BYTES = int(float(os.getenv('GLIDE_FILE_CACHE_MB', 2048)) * 1024 * 1024)
+# How often a worker re-reads the directory while under budget
+FILE_RESCAN_INTERVAL = 300
+DOWNLOAD_CHUNK = 1024 * 1024
+STREAM_CHUNK = 256 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FileIndex:
+    """One user's file metadata per course, with the sync watermark"""
+
+    def __init__(self):
+        self._courses = {}    # course_id -> {'files', 'watermark', 'synced_at', 'full_synced_at'}
+        self._lock = threading.Lock()
+
+    def expire(self, course_id, full=False):
+        """Sync on next use; a full listing if files may have been removed"""
+        with self._lock:
+            entry = self._courses.get(as_course_id(course_id))
+            if entry is not None:
+                entry['synced_at'] = 0
+                if full:
+                    entry['full_synced_at'] = 0
+
+    def file(self, course_id, file_id):
+        entry = self._courses.get(as_course_id(course_id))
+        return (entry or {}).get('files', {}).get(as_course_id(file_id))
+
+    def sync(self, course_id, list_files, normalize):
+        """
+        The course's files, sorted by name. list_files(**params) returns Canvas's
+        lazily paginated listing; only the pages with new or updated files are read.
+        """
+        course_id = as_course_id(course_id)
+        now = time.time()
+        entry = self._courses.get(course_id)
+        if entry and now - entry['synced_at'] < FILE_SYNC_INTERVAL:
+            return self.files(course_id)
+
+        if entry is None or now - entry['full_synced_at'] >= FULL_SYNC_INTERVAL:
+            files = {}
+            for file in list_files():
+                record = normalize(file)
+                files[record['id']] = record
+            entry = {'files': files, 'full_synced_at': now}
+        else:
+            files = dict(entry['files'])
+            for file in list_files(sort='updated_at', order='desc'):
+                record = normalize(file)
+                if record['updated_at'] and entry['watermark'] and record['updated_at'] < entry['watermark']:
+                    break
+                files[record['id']] = record
+            entry = dict(entry, files=files)
+
+        entry['watermark'] = max((file['updated_at'] for file in files.values() if file['updated_at']), default=None)
+        entry['synced_at'] = now
+        with self._lock:
+            self._courses[course_id] = entry
+        return self.files(course_id)
+
+    def files(self, course_id):
+        entry = self._courses.get(as_course_id(course_id)) or {'files': {}}
+        return sorted(entry['files'].values(), key=lambda file: ((file['display_name'] or '').lower(), file['id']))
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single 'bytes=' range, None to send the whole file, False if unsatisfiable"""
+    match = RANGE_PATTERN.match((header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.group(1), match.group(2)
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, end
+
+
+class Download:
+    """One key's download, shared by every request for it until the last one leaves"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0
+        self.error = None
+
+
+class FileContentCache:
+    """File content on disk, keyed by Canvas host, file id and version, evicted LRU by total bytes"""
+
+    def __init__(self, directory=FILE_CACHE_DIR, max_bytes=FILE_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()    # key -> size, least recently used first
+        self._bytes = 0
+        self._scanned_at = 0
+        self._downloads = {}                         # key -> Download, one download per key
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._entries, self._bytes = self._scan()
+        self._scanned_at = time.time()
+
+    def _scan(self):
+        """(entries, total bytes) of every cached file in the directory, whichever worker added it, oldest use first"""
+        found = []
+        with os.scandir(self.directory) as listing:
+            for item in listing:
+                if item.name.endswith('.part'):
+                    continue
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                found.append((stat.st_mtime, item.name, stat.st_size))
+        entries = collections.OrderedDict((name, size) for _, name, size in sorted(found))
+        return entries, sum(entries.values())
+
+    @staticmethod
+    def key(canvas_url, file):
+        version = f"{canvas_url}:{file['id']}:{file.get('updated_at')}:{file.get('size')}"
+        return hashlib.sha1(version.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def fetch(self, key, download):
+        """Path of the cached content, calling download(path) to fill it on a miss"""
+        path = self.path(key)
+        try:
+            # The mtime records use for every worker's eviction; fails if the file isn't cached
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return path
+            # Added by another worker since the last scan
+            self._track(key)
+            return path
+        except OSError:
+            pass
+
+        with self._lock:
+            pending = self._downloads.get(key)
+            if pending is None:
+                pending = self._downloads[key] = Download()
+            pending.waiters += 1
+        try:
+            with pending.lock:
+                # Requests that queued behind a failed download share its error instead of retrying in turn
+                if pending.error is not None:
+                    raise pending.error
+                if not os.path.exists(path):
+                    with self._lock:
+                        self.misses += 1
+                    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+                    try:
+                        download(partial)
+                        os.replace(partial, path)
+                    except Exception as e:
+                        pending.error = e
+                        raise
+                    finally:
+                        if os.path.exists(partial):
+                            os.remove(partial)
+                    self._track(key)
+        finally:
+            # The entry stays while anyone holds it, so a new request can't start a second download alongside
+            with self._lock:
+                pending.waiters -= 1
+                if pending.waiters == 0:
+                    del self._downloads[key]
+        return path
+
+    def _track(self, key):
+        """Record a cached file as most recently used; evict once past the budget or when a rescan is due"""
+        try:
+            size = os.path.getsize(self.path(key))
+        except OSError:
+            return
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            due = self._bytes > self.max_bytes or time.time() - self._scanned_at >= FILE_RESCAN_INTERVAL
+        if due:
+            self._evict(keep=key)
+
+    def _evict(self, keep):
+        """Re-read the directory and delete the least recently used files until it's back under budget"""
+        scanned_at = time.time()
+        entries, total = self._scan()
+        evicted = 0
+        while total > self.max_bytes and len(entries) > 1:
+            key, size = next(iter(entries.items()))
+            if key == keep:
+                entries.move_to_end(key)
+                continue
+            del entries[key]
+            total -= size
+            try:
+                # Readers that already opened the file keep their copy
+                os.remove(self.path(key))
+                evicted += 1
+            except OSError:
+                # Another worker evicted it first
+                pass
+        with self._lock:
+            self._entries, self._bytes = entries, total
+            self._scanned_at = scanned_at
+            self.evictions += evicted
+
+    def open(self, path):
+        """(handle, size) of a cached file; opened now, so a later eviction can't pull it away"""
+        handle = open(path, 'rb')
+        return handle, os.fstat(handle.fileno()).st_size
+
+    @staticmethod
+    def stream(handle, start, end):
+        """Yield bytes [start, end] of an opened file from a memory map, then close it"""
+        try:
+            if end < start:
+                return
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                position = start
+                while position <= end:
+                    chunk_end = min(position + STREAM_CHUNK, end + 1)
+                    yield mapped[position:chunk_end]
+                    position = chunk_end
+        finally:
+            handle.close()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'files': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+file_indexes = UserRegistry(FileIndex)
+_content_cache = None
+_content_cache_lock = threading.Lock()
+
+
+def get_file_content_cache():
+    """The process-wide file content cache, created on first use"""
+    global _content_cache
+    if _content_cache is None:
+        with _content_cache_lock:
+            if _content_cache is None:
+                _content_cache = FileContentCache()
+    return _content_cache
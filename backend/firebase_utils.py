@@ -1,7 +1,6 @@
 import os
 import json
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -9,11 +8,24 @@ load_dotenv()
 
 # Flag to track if Firebase is initialized
 firebase_initialized = False
+_firebase_lock = threading.Lock()
 
 # Initialize Firebase Admin
 def initialize_firebase():
-    """Initialize Firebase Admin SDK"""
+    """
+    Initialize Firebase Admin SDK.
+    firebase_admin is imported here rather than at module load: it pulls in the
+    Google Cloud client libraries, the bulk of the backend's import time.
+    """
+    with _firebase_lock:
+        if firebase_initialized:
+            return True
+        return _initialize_firebase()
+
+def _initialize_firebase():
     global firebase_initialized
+    import firebase_admin
+    from firebase_admin import credentials
 
     if firebase_admin._apps:
         # Firebase already initialized
@@ -59,6 +71,14 @@ def initialize_firebase():
         print(f"Error initializing Firebase: {e}")
         return False
 
+def get_firestore_client():
+    """
+    The Firestore client (Firebase must be initialized). It holds a gRPC channel,
+    which can't cross a fork, so pre-fork setup stops at initialize_firebase.
+    """
+    from firebase_admin import firestore
+    return firestore.client()
+
 def get_user_canvas_credentials(user_id):
     """Get Canvas API credentials for a user from Firestore"""
     # Check if Firebase is initialized
@@ -78,7 +98,7 @@ def get_user_canvas_credentials(user_id):
 
     try:
         # Get Firestore client
-        db = firestore.client()
+        db = get_firestore_client()
 
         # Get user document
         user_doc = db.collection('users').document(user_id).get()
@@ -0,0 +1,55 @@
+"""
+Grades for the current user.
+
+Canvas returns a student's grades on their own enrollments, so one listing of
+/users/self/enrollments covers every course, where reading a course's
+enrollments would page through the whole roster to find one row.
+"""
+
+# Enrollment states that carry a grade worth showing
+GRADED_STATES = ['active', 'completed']
+
+
+def normalize_grades(enrollment):
+    grades = getattr(enrollment, 'grades', None) or {}
+    return {
+        'current_score': grades.get('current_score'),
+        'final_score': grades.get('final_score'),
+        'current_grade': grades.get('current_grade'),
+        'final_grade': grades.get('final_grade')
+    }
+
+
+def grades_by_course(enrollments):
+    """
+    Grades keyed by course id (as a string, so the mapping survives a JSON cache).
+    With several enrollments in one course (e.g. sections), the first with a score wins.
+    """
+    by_course = {}
+    for enrollment in enrollments:
+        course_id = str(enrollment.course_id)
+        grades = normalize_grades(enrollment)
+        current = by_course.get(course_id)
+        if current is None or (current['current_score'] is None and grades['current_score'] is not None):
+            by_course[course_id] = grades
+    return by_course
+
+
+def summarize_grades(grades, courses):
+    """
+    Cross-course summary: one row per course, plus the average current score
+    over the courses that have one.
+    """
+    rows = []
+    for course in courses:
+        course_grades = grades.get(str(course['course_id']))
+        if course_grades is None:
+            continue
+        rows.append(dict(course_grades, course_id=course['course_id'], course_name=course['course_name']))
+
+    scores = [row['current_score'] for row in rows if row['current_score'] is not None]
+    return {
+        'courses': rows,
+        'graded_courses': len(scores),
+        'average_score': round(sum(scores) / len(scores), 2) if scores else None
+    }
@@ -0,0 +1,247 @@
+"""
+GraphQL fetch engine for course trees.
+
+With GLIDE_CANVAS_ENGINE=graphql, CanvasManager reads a course's details, its
+assignments with the user's submission, and its teachers from Canvas's GraphQL
+endpoint: up to MAX_COURSES_PER_QUERY courses per query (one alias each), then
+one query per round of follow-up pages for every connection that has more.
+Results are shaped like the REST payloads so the REST normalizers apply
+unchanged. Any failure leaves the course to the REST path.
+"""
+import os
+import threading
+import time
+
+from registry import UserRegistry
+
+GRAPHQL_ENABLED = os.getenv('GLIDE_CANVAS_ENGINE', 'rest').lower() == 'graphql'
+COURSE_TREE_TTL = 300
+MAX_COURSES_PER_QUERY = 10
+PAGE_SIZE = 100
+
+ASSIGNMENT_PAGE = '''
+fragment AssignmentPage on AssignmentConnection {
+  pageInfo { hasNextPage endCursor }
+  nodes {
+    _id name dueAt pointsPossible description
+    submissionsConnection(first: 1) { nodes { state score submittedAt late } }
+  }
+}
+'''
+
+TEACHER_PAGE = '''
+fragment TeacherPage on EnrollmentConnection {
+  pageInfo { hasNextPage endCursor }
+  nodes { type user { _id name email } }
+}
+'''
+
+COURSE_TREE = '''
+fragment CourseTree on Course {
+  _id name courseCode syllabusBody
+  assignmentsConnection(first: $pageSize) { ...AssignmentPage }
+  enrollmentsConnection(first: $pageSize, filter: {types: [TeacherEnrollment, TaEnrollment]}) { ...TeacherPage }
+}
+'''
+
+# Connection name -> (fragment name, extra arguments, tree key)
+CONNECTIONS = {
+    'assignmentsConnection': ('AssignmentPage', '', 'assignments'),
+    'enrollmentsConnection': ('TeacherPage', ', filter: {types: [TeacherEnrollment, TaEnrollment]}', 'teachers')
+}
+
+
+class GraphQLError(Exception):
+    pass
+
+
+def rest_assignment(node):
+    """An assignment node in the shape of the REST assignment JSON (with include[]=submission)"""
+    submissions = ((node.get('submissionsConnection') or {}).get('nodes')) or []
+    submission = submissions[0] if submissions else None
+    return {
+        'id': int(node['_id']),
+        'name': node.get('name'),
+        'due_at': node.get('dueAt'),
+        'description': node.get('description') or '',
+        'points_possible': node.get('pointsPossible'),
+        'submission': {
+            'workflow_state': submission.get('state'),
+            'score': submission.get('score'),
+            'submitted_at': submission.get('submittedAt'),
+            'late': submission.get('late', False)
+        } if submission else None
+    }
+
+
+def rest_teacher(node):
+    user = node.get('user') or {}
+    return {
+        'id': int(user['_id']) if user.get('_id') else 0,
+        'name': user.get('name'),
+        'role': node.get('type'),
+        'email': user.get('email')
+    }
+
+
+class GraphQLCourseLoader:
+    """
+    Builds the course tree queries and assembles their results. load() sends
+    them through canvasapi; load_async() through any coroutine that posts a
+    query, as the ASGI mode does.
+    """
+
+    def __init__(self, canvas=None):
+        self.canvas = canvas
+
+    def execute(self, query, variables):
+        return response_data(self.canvas.graphql(query, variables))
+
+    def load(self, course_ids):
+        """{str(course_id): tree} for every course (None for courses the user can't read)"""
+        trees = {}
+        for batch in batches(course_ids):
+            query, variables = batch_query(batch)
+            batch_trees, pending = parse_batch(batch, self.execute(query, variables))
+            while pending:
+                query, variables = pages_query(pending)
+                pending = parse_pages(batch_trees, pending, self.execute(query, variables))
+            trees.update(sort_assignments(batch_trees))
+        return trees
+
+    async def load_async(self, course_ids, post):
+        """load() with post(query, variables) a coroutine returning the GraphQL response JSON"""
+        trees = {}
+        for batch in batches(course_ids):
+            query, variables = batch_query(batch)
+            batch_trees, pending = parse_batch(batch, response_data(await post(query, variables)))
+            while pending:
+                query, variables = pages_query(pending)
+                pending = parse_pages(batch_trees, pending, response_data(await post(query, variables)))
+            trees.update(sort_assignments(batch_trees))
+        return trees
+
+
+def response_data(response):
+    if response.get('data') is None:
+        raise GraphQLError(str(response.get('errors') or 'No data in GraphQL response'))
+    return response['data']
+
+
+def batches(course_ids):
+    for i in range(0, len(course_ids), MAX_COURSES_PER_QUERY):
+        yield [str(course_id) for course_id in course_ids[i:i + MAX_COURSES_PER_QUERY]]
+
+
+def batch_query(course_ids):
+    """(query, variables) for the first page of every connection of up to MAX_COURSES_PER_QUERY courses"""
+    variables = {'pageSize': PAGE_SIZE}
+    aliases = []
+    for i, course_id in enumerate(course_ids):
+        variables[f"c{i}"] = course_id
+        aliases.append(f"c{i}: course(id: $c{i}) {{ ...CourseTree }}")
+    declarations = ''.join(f", $c{i}: ID!" for i in range(len(course_ids)))
+    query = (
+        f"query CourseTrees($pageSize: Int!{declarations}) {{ {' '.join(aliases)} }}"
+        + COURSE_TREE + ASSIGNMENT_PAGE + TEACHER_PAGE
+    )
+    return query, variables
+
+
+def parse_batch(course_ids, data):
+    """(trees, pending) from a batch query's data; pending lists (course_id, connection, cursor) still to page"""
+    trees = {}
+    pending = []
+    for i, course_id in enumerate(course_ids):
+        course = data.get(f"c{i}")
+        if course is None:
+            trees[course_id] = None
+            continue
+        tree = {
+            'course': {
+                'id': int(course['_id']),
+                'name': course.get('name'),
+                'code': course.get('courseCode'),
+                'syllabus': course.get('syllabusBody')
+            },
+            'assignments': [],
+            'teachers': []
+        }
+        trees[course_id] = tree
+        for connection in CONNECTIONS:
+            cursor = collect(tree, connection, course.get(connection))
+            if cursor:
+                pending.append((course_id, connection, cursor))
+    return trees, pending
+
+
+def collect(tree, connection, page):
+    """Add a connection page to the tree; returns the next cursor, if any"""
+    page = page or {}
+    convert = rest_assignment if connection == 'assignmentsConnection' else rest_teacher
+    tree[CONNECTIONS[connection][2]].extend(convert(node) for node in page.get('nodes') or [])
+    page_info = page.get('pageInfo') or {}
+    return page_info.get('endCursor') if page_info.get('hasNextPage') else None
+
+
+def pages_query(pending):
+    """(query, variables) for the next page of every pending connection, in one query"""
+    variables = {'pageSize': PAGE_SIZE}
+    declarations = []
+    aliases = []
+    fragments = set()
+    for i, (course_id, connection, cursor) in enumerate(pending):
+        fragment, arguments, _ = CONNECTIONS[connection]
+        variables[f"c{i}"] = course_id
+        variables[f"a{i}"] = cursor
+        declarations.append(f", $c{i}: ID!, $a{i}: String")
+        aliases.append(
+            f"c{i}: course(id: $c{i}) {{ {connection}(first: $pageSize, after: $a{i}{arguments}) {{ ...{fragment} }} }}"
+        )
+        fragments.add(ASSIGNMENT_PAGE if fragment == 'AssignmentPage' else TEACHER_PAGE)
+    query = f"query MorePages($pageSize: Int!{''.join(declarations)}) {{ {' '.join(aliases)} }}" + ''.join(sorted(fragments))
+    return query, variables
+
+
+def parse_pages(trees, pending, data):
+    """Add a pages query's results to the trees; returns the connections that still have more"""
+    next_pending = []
+    for i, (course_id, connection, _) in enumerate(pending):
+        cursor = collect(trees[course_id], connection, (data.get(f"c{i}") or {}).get(connection))
+        if cursor:
+            next_pending.append((course_id, connection, cursor))
+    return next_pending
+
+
+def sort_assignments(trees):
+    for tree in trees.values():
+        if tree is not None:
+            # Same order as the REST listing (order_by=due_at, undated last)
+            tree['assignments'].sort(key=lambda assignment: (assignment['due_at'] is None, assignment['due_at'] or ''))
+    return trees
+
+
+class CourseTreeCache:
+    """One user's GraphQL course trees; False marks a course GraphQL failed for"""
+
+    def __init__(self, ttl_seconds=COURSE_TREE_TTL):
+        self._trees = {}
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+
+    def get(self, course_id):
+        entry = self._trees.get(str(course_id))
+        if entry and time.time() - entry[1] < self._ttl:
+            return entry[0]
+        return None
+
+    def put(self, course_id, tree):
+        with self._lock:
+            self._trees[str(course_id)] = (tree, time.time())
+
+    def invalidate(self, course_id):
+        with self._lock:
+            self._trees.pop(str(course_id), None)
+
+
+course_trees = UserRegistry(CourseTreeCache)
@@ -0,0 +1,52 @@
+"""
+Gunicorn configuration for running several workers against one shared cache.
+
+    gunicorn -c gunicorn_shared.py app:app
+
+The mode is opt-in: gunicorn only loads ./gunicorn.conf.py by itself, so a
+plain `gunicorn app:app` keeps its defaults and the in-process cache.
+
+Every worker uses the same SQLite (WAL) cache file, so adding workers adds
+capacity without adding cold caches or duplicate Canvas requests.
+
+Each open /api/canvas/stream holds one of a gthread worker's threads, so
+deployments with many open dashboards should serve the ASGI app instead,
+where a stream is a coroutine:
+
+    uvicorn asgi:app --workers 4
+
+With GLIDE_PRELOAD=true the app is imported and Firebase initialized once in
+the master, before workers fork (see startup.py); GLIDE_WARMUP=true has each
+new worker load recently active users' course snapshots.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# Canvas calls are I/O bound, so each worker also runs a small thread pool
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('GLIDE_PRELOAD', 'false').lower() == 'true'
+
+# Switch cache_with_ttl to the shared store before the app is imported
+os.environ.setdefault('GLIDE_CACHE_BACKEND', 'sqlite')
+os.environ.setdefault('GLIDE_CACHE_PATH', os.path.join(os.environ.get('TMPDIR', '/tmp'), 'glide-cache.sqlite3'))
+
+
+def on_starting(server):
+    # Create the schema once in the master so workers never race on it
+    from shared_cache import get_cache_store
+    store = get_cache_store()
+    store.purge_expired()
+    server.log.info(f"Shared cache ready at {store.path}")
+    if preload_app:
+        from startup import preinit
+        preinit()
+
+
+def post_fork(server, worker):
+    from startup import worker_init
+    worker_init()
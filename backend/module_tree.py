@@ -0,0 +1,111 @@
+import concurrent.futures
+import threading
+import time
+
+from registry import UserRegistry
+
+MODULE_TREE_TTL = 900
+
+
+def normalize_item(item):
+    """Module item payload (dict from include[]=items or a ModuleItem object) -> (item, completed)"""
+    if not isinstance(item, dict):
+        item = item.__dict__
+    requirement = item.get('completion_requirement') or {}
+    return {
+        'id': item.get('id'),
+        'title': item.get('title'),
+        'type': item.get('type'),
+        'url': item.get('html_url'),
+        'content_id': item.get('content_id')
+    }, requirement.get('completed')
+
+
+def fetch_module_tree(course, max_workers=8):
+    """
+    Fetch a course's modules with their items in one paginated listing.
+    Canvas leaves `items` out for modules that are too large; only those are
+    fetched separately, concurrently.
+
+    Returns (tree, progress) where progress maps module ids to their state and
+    item ids to their completion flag.
+    """
+    modules = list(course.get_modules(include=['items']))
+
+    truncated = [
+        module for module in modules
+        if getattr(module, 'items', None) is None
+        or len(module.items) < getattr(module, 'items_count', len(module.items))
+    ]
+    if truncated:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(truncated))) as executor:
+            fetched = executor.map(lambda module: list(module.get_module_items()), truncated)
+            for module, items in zip(truncated, fetched):
+                module.items = items
+
+    tree = []
+    progress = {'modules': {}, 'items': {}}
+    for module in modules:
+        items = []
+        for raw_item in module.items or []:
+            item, completed = normalize_item(raw_item)
+            items.append(item)
+            if completed is not None:
+                progress['items'][item['id']] = completed
+
+        tree.append({
+            'id': module.id,
+            'name': module.name,
+            'items': items,
+            'unlock_date': getattr(module, 'unlock_at', None)
+        })
+        if getattr(module, 'state', None):
+            progress['modules'][module.id] = module.state
+
+    return tree, progress
+
+
+class ModuleTrees:
+    """
+    One user's module trees with their completion state, per course.
+
+    Canvas decides module and item visibility per student (section overrides,
+    differentiated assignments, locked items), so trees are never shared
+    between users.
+    """
+
+    def __init__(self, ttl_seconds=MODULE_TREE_TTL):
+        self._courses = {}
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+
+    def get(self, course_id):
+        entry = self._courses.get(str(course_id))
+        if entry and time.time() - entry[1] < self._ttl:
+            return entry[0]
+        return None
+
+    def put(self, course_id, tree):
+        with self._lock:
+            self._courses[str(course_id)] = (tree, time.time())
+
+    def invalidate(self, course_id):
+        with self._lock:
+            self._courses.pop(str(course_id), None)
+
+
+def merge_progress(tree, progress):
+    """Overlay a user's completion state onto the module structure"""
+    module_states = progress.get('modules', {})
+    item_states = progress.get('items', {})
+    return [
+        dict(
+            module,
+            state=module_states.get(module['id']),
+            items=[dict(item, completed=item_states.get(item['id'])) for item in module['items']]
+        )
+        for module in tree
+    ]
+
+
+module_trees = UserRegistry(ModuleTrees)
@@ -0,0 +1,132 @@
+import base64
+import binascii
+import json
+import posixpath
+import threading
+import time
+import urllib.parse
+
+from canvas_compat import PageReader
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(page_url, skip=0):
+    """
+    Opaque cursor: Canvas's own URL of the page to resume from (None for the
+    first page) and how many of that page's items were already handed out.
+    """
+    state = json.dumps({'url': page_url, 'skip': skip})
+    return base64.urlsafe_b64encode(state.encode('utf-8')).decode('ascii')
+
+
+def in_scope(url, scope):
+    """
+    Whether a page URL stays inside the listing it came from: a relative URL
+    whose path is exactly the listing's, with no host and no dot segments.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme or parts.netloc or parts.fragment or '%' in parts.path or '\\' in parts.path:
+        return False
+    return parts.path == posixpath.normpath(parts.path) == scope
+
+
+def decode_cursor(cursor, scope):
+    """(page_url, skip) of a cursor from encode_cursor; InvalidCursor if it is malformed or leaves the listing"""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (UnicodeError, binascii.Error, ValueError):
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(state, dict):
+        raise InvalidCursor("Invalid cursor")
+    page_url, skip = state.get('url'), state.get('skip', 0)
+    if isinstance(skip, bool) or not isinstance(skip, int) or skip < 0:
+        raise InvalidCursor("Invalid cursor")
+    if page_url is not None and (not isinstance(page_url, str) or not in_scope(page_url, scope)):
+        raise InvalidCursor("Invalid cursor")
+    return page_url, skip
+
+
+def fetch_page(paginated_list, normalize, per_page, cursor=None, item_filter=None):
+    """
+    Fetch one page of up to per_page items from a PaginatedList and normalize it.
+
+    Canvas pages are requested per_page at a time. When a cursor is given, the
+    first-page request is skipped and Canvas's URL for the page to resume from
+    is requested directly, so earlier pages are never downloaded. Items dropped
+    by item_filter are made up from the following pages, so a page is only
+    short at the end of the listing.
+
+    Returns (items, next_cursor).
+    """
+    reader = PageReader(paginated_list, per_page)
+    page_url, skip = decode_cursor(cursor, reader.scope) if cursor else (None, 0)
+
+    items = []
+    elements, next_url = reader.read(page_url)
+    while True:
+        for position in range(skip, len(elements)):
+            element = elements[position]
+            if item_filter and not item_filter(element):
+                continue
+            if len(items) == per_page:
+                # The rest of this Canvas page starts the next window
+                return items, encode_cursor(page_url, position)
+            items.append(normalize(element))
+        if not next_url:
+            return items, None
+        if len(items) == per_page:
+            return items, encode_cursor(next_url)
+        page_url, skip = next_url, 0
+        elements, next_url = reader.read(page_url)
+
+
+class PageCache:
+    """
+    TTL cache of individual result pages, keyed by (owner, resource, course, cursor, size).
+    Pages are small, so each one can be cached and expired independently.
+    """
+
+    def __init__(self, ttl_seconds=900, max_entries=5000):
+        self._entries = {}
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry and time.time() - entry[1] < self._ttl:
+            return entry[0]
+        return None
+
+    def put(self, key, page):
+        with self._lock:
+            if len(self._entries) >= self._max_entries:
+                now = time.time()
+                self._entries = {k: v for k, v in self._entries.items() if now - v[1] < self._ttl}
+                if len(self._entries) >= self._max_entries:
+                    # Still full of live pages: drop the oldest quarter
+                    oldest = sorted(self._entries, key=lambda k: self._entries[k][1])
+                    for stale_key in oldest[:self._max_entries // 4]:
+                        del self._entries[stale_key]
+            self._entries[key] = (page, time.time())
+
+    def invalidate(self, owner=None, resource=None, course_id=None):
+        """Drop every cached page matching the given key parts"""
+        with self._lock:
+            for key in list(self._entries):
+                if owner is not None and key[0] != owner:
+                    continue
+                if resource is not None and key[1] != resource:
+                    continue
+                if course_id is not None and key[2] != str(course_id):
+                    continue
+                del self._entries[key]
+
+
+page_cache = PageCache()
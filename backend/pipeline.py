@@ -0,0 +1,45 @@
+"""
+Streaming stages for Canvas listings.
+
+canvasapi's PaginatedList only requests a page when iteration reaches it, so
+chaining generators over it means a pipeline that stops early (take)
+also stops fetching pages. Stages are plain functions from an iterable to an
+iterable, composed left to right with run().
+"""
+import itertools
+
+
+def run(source, *stages):
+    """Feed source through each stage in turn and return the resulting iterator"""
+    stream = iter(source)
+    for stage in stages:
+        stream = stage(stream)
+    return stream
+
+
+def keep(predicate):
+    """Only pass items for which predicate(item) is true"""
+    def stage(stream):
+        return (item for item in stream if predicate(item))
+    return stage
+
+
+def transform(function, skip_errors=False):
+    """Map every item through function; optionally drop items that raise"""
+    def stage(stream):
+        for item in stream:
+            if not skip_errors:
+                yield function(item)
+                continue
+            try:
+                yield function(item)
+            except Exception as e:
+                print(f"Skipping item that failed to normalize: {str(e)}")
+    return stage
+
+
+def take(limit):
+    """Stop after limit items; no further pages are requested"""
+    def stage(stream):
+        return itertools.islice(stream, limit) if limit is not None else stream
+    return stage
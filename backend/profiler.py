@@ -0,0 +1,457 @@
+"""
+Opt-in profiling for the backend.
+
+Three views of where request time goes, all served from /api/admin/profiler:
+
+- A sampling profiler: a background thread reads every thread's stack at a
+  fixed interval and counts them as folded stacks ("route;state;frame;frame N"),
+  the input format of flamegraph.pl and speedscope. Each sample is marked
+  'running' or 'waiting' (blocked on a socket, lock or queue); several threads
+  running Python at once is GIL contention. Idle threads are left out.
+- Route profiling: for a chosen route, a fraction of requests run under
+  cProfile, including the work they hand to thread pools, and the results are
+  added up per route.
+- Thread-pool stats: queue wait, run time and utilization of every
+  ProfiledThreadPoolExecutor, aggregated by pool name.
+"""
+import collections
+import concurrent.futures
+import cProfile
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import weakref
+
+SAMPLING_ENABLED = os.getenv('GLIDE_PROFILER_SAMPLING', 'false').lower() == 'true'
+SAMPLE_INTERVAL = float(os.getenv('GLIDE_PROFILER_INTERVAL_MS', 10)) / 1000
+MAX_STACKS = 20000
+MAX_DEPTH = 64
+TOP_FUNCTIONS = 40
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+# Leaf frames that mean the thread is blocked rather than running Python. Blocking C
+# calls have no frame of their own, so this is judged from the Python frame that made them.
+WAITING_FILES = ('socket.py', 'ssl.py', 'selectors.py', 'threading.py', 'queue.py', 'connection.py')
+WAITING_FUNCTIONS = {'recv', 'recv_into', 'readinto', 'read', 'select', 'poll', 'wait', 'acquire', 'sleep',
+                     'accept', 'get', 'result', '_wait_for_tstate_lock', 'create_connection', 'do_handshake',
+                     '_worker'}
+
+_thread_routes = {}          # thread ident -> route being served
+_thread_profiles = {}        # thread ident -> RequestProfile of the sampled request being served
+
+
+def current_route():
+    return _thread_routes.get(threading.get_ident())
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def is_waiting(frame):
+    code = frame.f_code
+    return code.co_name in WAITING_FUNCTIONS or os.path.basename(code.co_filename) in WAITING_FILES
+
+
+def thread_group(name):
+    """'ThreadPoolExecutor-3_1' -> 'ThreadPoolExecutor', 'sections_2' -> 'sections'"""
+    return name.rstrip('0123456789').rstrip('-_') or 'thread'
+
+
+class StackSampler:
+    """Folded stack counts of every busy thread, sampled at a fixed interval"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stacks = collections.Counter()
+            self.samples = 0
+            self.running_threads = 0
+            self.contended_samples = 0
+            self.started_at = time.time()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        """Sample every interval seconds (the current interval if None)"""
+        interval = self.interval if interval is None else interval
+        if not interval > 0:
+            raise ValueError("Sampling interval must be positive")
+        self.interval = interval
+        if self.is_running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Error sampling stacks: {str(e)}")
+
+    def sample(self):
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        running = 0
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            route = _thread_routes.get(ident)
+            labels = []
+            in_backend = False
+            current = frame
+            while current is not None and len(labels) < MAX_DEPTH:
+                labels.append(frame_label(current.f_code))
+                in_backend = in_backend or current.f_code.co_filename.startswith(BACKEND_DIR)
+                current = current.f_back
+            waiting = is_waiting(frame)
+            # Idle pool workers, servers and timers: nothing of ours on the stack
+            if waiting and route is None and not in_backend:
+                continue
+            running += not waiting
+            stacks.append(';'.join([route or thread_group(names.get(ident, '')), 'waiting' if waiting else 'running'] + labels[::-1]))
+
+        with self._lock:
+            self.samples += 1
+            self.running_threads += running
+            self.contended_samples += running > 1
+            for stack in stacks:
+                if stack in self._stacks or len(self._stacks) < MAX_STACKS:
+                    self._stacks[stack] += 1
+                else:
+                    self._stacks[stack.split(';', 1)[0] + ';[truncated]'] += 1
+
+    def folded(self, route=None):
+        """Folded stacks, one 'frame;frame;frame count' per line"""
+        with self._lock:
+            stacks = list(self._stacks.items())
+        lines = [
+            f"{stack} {count}" for stack, count in sorted(stacks)
+            if route is None or stack.split(';', 1)[0] == route
+        ]
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+    def summary(self):
+        with self._lock:
+            by_route = collections.Counter()
+            by_state = collections.Counter()
+            for stack, count in self._stacks.items():
+                route, state = (stack.split(';', 2) + [''])[:2]
+                by_route[route] += count
+                by_state[state] += count
+            return {
+                'running': self.is_running(),
+                'interval_ms': round(self.interval * 1000, 2),
+                'samples': self.samples,
+                'seconds': round(time.time() - self.started_at, 1),
+                'distinct_stacks': len(self._stacks),
+                'thread_samples': dict(by_state),
+                'by_route': dict(by_route.most_common(20)),
+                # Threads running Python at the same instant compete for the GIL
+                'mean_running_threads': round(self.running_threads / self.samples, 2) if self.samples else 0,
+                'contended_sample_ratio': round(self.contended_samples / self.samples, 3) if self.samples else 0
+            }
+
+
+class RequestProfile:
+    """cProfile results of one sampled request, from its own thread and the pool tasks it started"""
+
+    def __init__(self):
+        self.stats = None
+        self._lock = threading.Lock()
+        self._own = None
+
+    def begin(self):
+        """Profile the calling (request) thread until end()"""
+        self._own = cProfile.Profile()
+        try:
+            self._own.enable()
+        except ValueError:
+            self._own = None
+
+    def end(self):
+        if self._own is not None:
+            self._own.disable()
+            self.add(self._own)
+            self._own = None
+
+    def run(self, fn, *args, **kwargs):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this thread
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            self.add(profile)
+
+    def add(self, profile):
+        with self._lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+
+def top_functions(entries, limit=TOP_FUNCTIONS):
+    """The limit functions with the most cumulative time, from a pstats.Stats.stats dict"""
+    rows = sorted(entries.items(), key=lambda entry: -entry[1][3])[:limit]
+    return [
+        {
+            'function': f"{name} ({os.path.basename(filename)}:{line})",
+            'calls': calls,
+            'self_seconds': round(self_time, 4),
+            'total_seconds': round(total_time, 4)
+        }
+        for (filename, line, name), (_, calls, self_time, total_time, _) in rows
+    ]
+
+
+class RouteProfiler:
+    """Which routes are profiled, at what rate, and their accumulated results"""
+
+    def __init__(self):
+        self._configs = {}     # route -> {'sample_rate', 'remaining'}
+        self._results = {}     # route -> {'requests', 'seconds', 'stats'}
+        self._lock = threading.Lock()
+
+    def configure(self, route, sample_rate, max_requests=None):
+        with self._lock:
+            if sample_rate <= 0:
+                self._configs.pop(route, None)
+            else:
+                self._configs[route] = {'sample_rate': min(sample_rate, 1.0), 'remaining': max_requests}
+
+    def reset(self, route=None):
+        with self._lock:
+            if route is None:
+                self._results.clear()
+            else:
+                self._results.pop(route, None)
+
+    def should_profile(self, route):
+        with self._lock:
+            config = self._configs.get(route)
+            if config is None or random.random() >= config['sample_rate']:
+                return False
+            if config['remaining'] is not None:
+                config['remaining'] -= 1
+                if config['remaining'] <= 0:
+                    del self._configs[route]
+            return True
+
+    def record(self, route, profile, seconds):
+        if profile.stats is None:
+            return
+        with self._lock:
+            result = self._results.setdefault(route, {'requests': 0, 'seconds': 0.0, 'stats': None})
+            result['requests'] += 1
+            result['seconds'] += seconds
+            if result['stats'] is None:
+                result['stats'] = profile.stats
+            else:
+                result['stats'].add(profile.stats)
+
+    def summary(self, route=None, limit=TOP_FUNCTIONS):
+        with self._lock:
+            configs = {name: dict(config) for name, config in self._configs.items()}
+            # record() merges into the stats in place, so they're copied here too
+            results = {
+                name: dict(result, stats=dict(result['stats'].stats))
+                for name, result in self._results.items() if route is None or name == route
+            }
+        return {
+            'profiling': configs,
+            'routes': {
+                name: {
+                    'requests': result['requests'],
+                    'mean_seconds': round(result['seconds'] / result['requests'], 4),
+                    'top_functions': top_functions(result['stats'], limit)
+                }
+                for name, result in results.items()
+            }
+        }
+
+
+class PoolStats:
+    """Counters for every executor sharing a pool name"""
+
+    def __init__(self, name):
+        self.name = name
+        self.executors = 0
+        self.max_workers = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.active = 0
+        self.peak_active = 0
+        self.queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.busy = 0.0
+        self.capacity = 0.0          # worker-seconds of executors already shut down
+        self.live = weakref.WeakSet()
+        self.lock = threading.Lock()
+
+    def started(self, waited):
+        with self.lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            self.queue_wait += waited
+            self.max_queue_wait = max(self.max_queue_wait, waited)
+
+    def finished(self, seconds, failed):
+        with self.lock:
+            self.active -= 1
+            self.completed += 1
+            self.failed += failed
+            self.busy += seconds
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.lock:
+            capacity = self.capacity + sum(
+                (now - executor.created_at) * executor.worker_count for executor in list(self.live)
+            )
+            started = self.completed + self.active
+            return {
+                'executors': self.executors,
+                'max_workers': self.max_workers,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'active': self.active,
+                'queued': self.submitted - started,
+                'peak_active': self.peak_active,
+                'mean_queue_wait_ms': round(self.queue_wait / started * 1000, 2) if started else 0,
+                'max_queue_wait_ms': round(self.max_queue_wait * 1000, 2),
+                'mean_run_ms': round(self.busy / self.completed * 1000, 2) if self.completed else 0,
+                'utilization': round(self.busy / capacity, 3) if capacity else 0
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def pool_stats(name):
+    stats = _pools.get(name)
+    if stats is None:
+        with _pools_lock:
+            stats = _pools.setdefault(name, PoolStats(name))
+    return stats
+
+
+class ProfiledThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that records queue wait and run time under a pool name,
+    and carries the submitting request's route (and sampled profile) into its
+    worker threads.
+    """
+
+    def __init__(self, max_workers=None, thread_name_prefix='', name=None):
+        super().__init__(max_workers=max_workers, thread_name_prefix=thread_name_prefix or name or '')
+        self.created_at = time.monotonic()
+        self.worker_count = self._max_workers
+        self._stats = pool_stats(name or thread_name_prefix or 'pool')
+        with self._stats.lock:
+            self._stats.executors += 1
+            self._stats.max_workers = max(self._stats.max_workers, self._max_workers)
+            self._stats.live.add(self)
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted = time.monotonic()
+        ident = threading.get_ident()
+        route = _thread_routes.get(ident)
+        profile = _thread_profiles.get(ident)
+        stats = self._stats
+        with stats.lock:
+            stats.submitted += 1
+
+        def task():
+            started = time.monotonic()
+            stats.started(started - submitted)
+            worker = threading.get_ident()
+            previous = _thread_routes.get(worker), _thread_profiles.get(worker)
+            if route is not None:
+                _thread_routes[worker] = route
+            if profile is not None:
+                _thread_profiles[worker] = profile
+            failed = True
+            try:
+                result = profile.run(fn, *args, **kwargs) if profile is not None else fn(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                stats.finished(time.monotonic() - started, failed)
+                restore(worker, *previous)
+
+        return super().submit(task)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+        with self._stats.lock:
+            if self in self._stats.live:
+                self._stats.live.discard(self)
+                self._stats.capacity += (time.monotonic() - self.created_at) * self.worker_count
+
+
+def restore(ident, route, profile):
+    if route is None:
+        _thread_routes.pop(ident, None)
+    else:
+        _thread_routes[ident] = route
+    if profile is None:
+        _thread_profiles.pop(ident, None)
+    else:
+        _thread_profiles[ident] = profile
+
+
+def pool_summary():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {stats.name: stats.snapshot() for stats in pools}
+
+
+sampler = StackSampler()
+route_profiler = RouteProfiler()
+
+
+def request_started(route):
+    """Mark the current thread as serving route; returns the request's profile if it was sampled"""
+    ident = threading.get_ident()
+    _thread_routes[ident] = route
+    if not route_profiler.should_profile(route):
+        return None
+    profile = RequestProfile()
+    _thread_profiles[ident] = profile
+    profile.begin()
+    return profile
+
+
+def request_finished(route, profile, seconds):
+    ident = threading.get_ident()
+    _thread_routes.pop(ident, None)
+    _thread_profiles.pop(ident, None)
+    if profile is not None:
+        profile.end()
+        route_profiler.record(route, profile, seconds)
@@ -0,0 +1,178 @@
+"""
+Server push for dashboard updates.
+
+Whenever get_complete_class_data rebuilds a course snapshot, the hub diffs it
+against the previous snapshot for that user and course (see snapshot_diff) and
+sends the patch to the user's connected clients (see the /stream endpoint).
+
+Subscribers live in the process that accepted the connection. The previous
+snapshots are kept in the cache store (under its memory budget, and shared by
+every worker with GLIDE_CACHE_BACKEND=sqlite). With a shared store, patches
+are also written to a short log that every worker polls while it has
+subscribers, so a patch built in one worker reaches streams held by another.
+"""
+import asyncio
+import os
+import queue
+import threading
+import time
+
+from search_index import as_course_id
+from shared_cache import get_cache_store, SharedLog
+from snapshot_diff import diff_snapshots
+
+# Clients that stop reading get a resync message instead of an ever-growing backlog
+SUBSCRIBER_QUEUE_SIZE = 100
+SNAPSHOT_PREFIX = 'push_hub:snapshot:'
+# Last snapshots serve as diff bases and as the fallback while Canvas is down
+SNAPSHOT_TTL = int(os.getenv('GLIDE_SNAPSHOT_TTL', 86400))
+PUSH_LOG_PREFIX = 'push:'
+PUSH_LOG_TTL = 120
+PUSH_POLL_INTERVAL = 0.5
+
+
+class Subscription:
+    """
+    One open stream. Streams served by the ASGI app pass their event loop and
+    read an asyncio.Queue; Flask streams read a thread-safe queue.
+    """
+
+    def __init__(self, owner, course_ids=None, loop=None):
+        self.owner = owner
+        self.course_ids = {as_course_id(course_id) for course_id in course_ids} if course_ids else None
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE) if loop else queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def wants(self, course_id):
+        return self.course_ids is None or course_id in self.course_ids
+
+    def send(self, message):
+        if self.loop is None:
+            self._put(message)
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The stream's loop has closed; it unsubscribes on its way out
+            pass
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except (queue.Full, asyncio.QueueFull):
+            # Drop the backlog; the client reloads everything once instead
+            while not self.queue.empty():
+                try:
+                    self.queue.get_nowait()
+                except (queue.Empty, asyncio.QueueEmpty):
+                    break
+            self.queue.put_nowait({'type': 'resync'})
+
+
+def snapshot_key(owner, course_id):
+    return f"{SNAPSHOT_PREFIX}{owner}:{as_course_id(course_id)}"
+
+
+class PushHub:
+    def __init__(self):
+        self._subscribers = {}      # owner -> set of Subscription
+        self._lock = threading.Lock()
+        self._log = SharedLog(PUSH_LOG_PREFIX, PUSH_LOG_TTL, interval=PUSH_POLL_INTERVAL)
+        self._poller_pid = None
+
+    def subscribe(self, owner, course_ids=None, loop=None):
+        subscription = Subscription(owner, course_ids, loop)
+        with self._lock:
+            self._subscribers.setdefault(owner, set()).add(subscription)
+        self._start_poller()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.owner)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.owner]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def owners_watching(self, course_id):
+        """Owners with a live subscription in this process that covers this course"""
+        course_id = as_course_id(course_id)
+        with self._lock:
+            return [
+                owner for owner, subscribers in self._subscribers.items()
+                if any(subscription.wants(course_id) for subscription in subscribers)
+            ]
+
+    def publish(self, owner, course_id, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(owner, ()))
+        for subscription in subscribers:
+            if course_id is None or subscription.wants(course_id):
+                subscription.send(message)
+
+    def _start_poller(self):
+        """Poll the shared patch log while this process has subscribers (threads don't survive a fork)"""
+        if not self._log.is_shared():
+            return
+        with self._lock:
+            if self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+        threading.Thread(target=self._poll, name='push-poller', daemon=True).start()
+
+    def _poll(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._poller_pid = None
+                    return
+            try:
+                for record in self._log.read_new():
+                    self.publish(record['owner'], record['course_id'], record['message'])
+            except Exception as e:
+                print(f"Error reading pushed updates: {str(e)}")
+            time.sleep(PUSH_POLL_INTERVAL)
+
+    def last_snapshot(self, owner, course_id):
+        """The last complete snapshot of a course, as recorded by any worker"""
+        found, class_data = get_cache_store().get(snapshot_key(owner, course_id))
+        return class_data if found else None
+
+    def snapshot_updated(self, owner, course_id, class_data):
+        """
+        Record a freshly built snapshot and push its patch against the previous one.
+        The first snapshot seen for a course is only recorded: clients already
+        have it from the request that built it.
+        """
+        if not class_data:
+            return None
+        course_id = as_course_id(course_id)
+
+        store = get_cache_store()
+        key = snapshot_key(owner, course_id)
+        found, previous = store.get(key)
+        store.set(key, class_data, SNAPSHOT_TTL)
+
+        if not found or previous is None:
+            return None
+
+        patch = diff_snapshots(previous, class_data)
+        if not patch:
+            return None
+
+        message = {
+            'type': 'course_update',
+            'course_id': course_id,
+            'patch': patch
+        }
+        self.publish(owner, course_id, message)
+        self._log.append({'owner': owner, 'course_id': course_id, 'message': message})
+        return message
+
+
+push_hub = PushHub()
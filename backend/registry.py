@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+
+# Owners not seen for this long have their object dropped (0 keeps them for the process's life)
+IDLE_SECONDS = float(os.getenv('GLIDE_REGISTRY_IDLE_SECONDS', 6 * 3600))
+SWEEP_INTERVAL = 60
+
+
+class UserRegistry:
+    """
+    Thread-safe map of per-user objects (indexes, caches, view models).
+    Objects are created lazily by the factory the first time an owner is seen,
+    and dropped once the owner has been idle for idle_seconds, so users who
+    stopped visiting don't hold memory outside the cache budget.
+    """
+
+    def __init__(self, factory, idle_seconds=IDLE_SECONDS):
+        self._factory = factory
+        self.idle_seconds = idle_seconds
+        self.evictions = 0
+        self._items = {}
+        self._used = {}             # owner -> last get/peek (time.monotonic)
+        self._swept_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def get(self, owner):
+        """Return the object for an owner, creating it if needed"""
+        now = time.monotonic()
+        self._sweep(now)
+        item = self._items.get(owner)
+        if item is not None:
+            self._used[owner] = now
+            return item
+
+        with self._lock:
+            item = self._items.get(owner)
+            if item is None:
+                item = self._factory()
+                self._items[owner] = item
+            self._used[owner] = now
+            return item
+
+    def peek(self, owner):
+        """Return the object for an owner without creating it"""
+        item = self._items.get(owner)
+        if item is not None:
+            self._used[owner] = time.monotonic()
+        return item
+
+    def drop(self, owner):
+        """Forget an owner's object"""
+        with self._lock:
+            self._used.pop(owner, None)
+            return self._items.pop(owner, None)
+
+    def owners(self):
+        """Snapshot of the owners currently registered"""
+        with self._lock:
+            return list(self._items.keys())
+
+    def _sweep(self, now):
+        """Drop idle owners, at most once per SWEEP_INTERVAL"""
+        if not self.idle_seconds or now - self._swept_at < SWEEP_INTERVAL:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._swept_at = now
+            for owner in [owner for owner, used in list(self._used.items()) if now - used > self.idle_seconds]:
+                self._items.pop(owner, None)
+                del self._used[owner]
+                self.evictions += 1
+        finally:
+            self._lock.release()
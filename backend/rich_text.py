@@ -0,0 +1,221 @@
+"""
+Processing of Canvas HTML bodies.
+
+Announcement and discussion messages, assignment and calendar event
+descriptions and syllabi come from Canvas as raw HTML. Each body is parsed
+once: scripts, styles, event handlers and unsafe URLs are dropped, and the
+plain text and a short excerpt are taken in the same pass. Results are kept per content hash, so the same
+body (shared by every student of a course, and unchanged across refreshes) is
+never processed twice. Normalizers store the sanitized body with its excerpt,
+so endpoints can send excerpts and leave full bodies to a separate request.
+"""
+import collections
+import hashlib
+import html
+import re
+import threading
+from html.parser import HTMLParser
+
+MAX_ENTRIES = 5000
+EXCERPT_LENGTH = 200
+SPACE_PATTERN = re.compile(r"\s+")
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'caption', 'code', 'del', 'div', 'em', 'h1', 'h2', 'h3',
+    'h4', 'h5', 'h6', 'hr', 'i', 'iframe', 'img', 'ins', 'li', 'ol', 'p', 'pre', 's', 'small', 'span',
+    'strong', 'sub', 'sup', 'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'tr', 'u', 'ul'
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# Dropped together with everything inside them
+DROPPED_TAGS = {'script', 'style', 'noscript', 'template', 'head', 'title', 'object', 'embed'}
+# Tags a new sibling closes implicitly (<li>one<li>two)
+SELF_CLOSING_SIBLINGS = {'li', 'p', 'td', 'th', 'tr'}
+BLOCK_TAGS = {'blockquote', 'br', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'li', 'p', 'pre', 'td', 'th', 'tr'}
+ALLOWED_ATTRIBUTES = {'href', 'src', 'alt', 'title', 'width', 'height', 'colspan', 'rowspan', 'target', 'allowfullscreen'}
+URL_ATTRIBUTES = {'href', 'src'}
+SAFE_SCHEMES = ('http:', 'https:', 'mailto:')
+
+# Entity body fields processed by the normalizers: kind -> (body field, excerpt field)
+BODY_FIELDS = {
+    'announcement': ('message', 'excerpt'),
+    'discussion': ('message', 'excerpt'),
+    'assignment': ('description', 'excerpt'),
+    'calendar_event': ('description', 'excerpt'),
+    'syllabus': ('syllabus', 'syllabus_excerpt')
+}
+
+
+def is_safe_url(value):
+    url = SPACE_PATTERN.sub('', value or '').lower()
+    return ':' not in url.split('/', 1)[0] or url.startswith(SAFE_SCHEMES)
+
+
+class BodyParser(HTMLParser):
+    """One pass over a body, writing the sanitized HTML and collecting its text"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.html = []
+        self.text = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping:
+            return
+        # Every tag separates words, as the old tag-stripping did
+        self.text.append('\n' if tag in BLOCK_TAGS else ' ')
+        if tag not in ALLOWED_TAGS:
+            return
+        if tag in SELF_CLOSING_SIBLINGS and self.open_tags and self.open_tags[-1] == tag:
+            self.html.append(f"</{self.open_tags.pop()}>")
+        kept = ''.join(
+            f' {name}="{html.escape(value or "", quote=True)}"' if value is not None else f' {name}'
+            for name, value in attrs
+            if name in ALLOWED_ATTRIBUTES and (name not in URL_ATTRIBUTES or is_safe_url(value))
+        )
+        if tag == 'a' and 'href' in kept:
+            kept += ' rel="noopener noreferrer"'
+        self.html.append(f"<{tag}{kept}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_TAGS:
+            self.dropping = max(0, self.dropping - 1)
+            return
+        if self.dropping:
+            return
+        self.text.append('\n' if tag in BLOCK_TAGS else ' ')
+        if tag not in self.open_tags:
+            return
+        # Close anything left open inside this tag as well
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.html.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.dropping:
+            return
+        self.html.append(html.escape(data, quote=False))
+        self.text.append(data)
+
+    def result(self):
+        self.close()
+        self.html.extend(f"</{tag}>" for tag in reversed(self.open_tags))
+        self.open_tags = []
+        return ''.join(self.html), SPACE_PATTERN.sub(' ', ''.join(self.text)).strip()
+
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    """The text cut at a word boundary near length characters"""
+    if len(text) <= length:
+        return text
+    cut = text[:length]
+    if ' ' in cut:
+        cut = cut[:cut.rfind(' ')]
+    return cut.rstrip(' ,.;:') + '…'
+
+
+def content_hash(body):
+    return hashlib.sha1(body.encode('utf-8')).hexdigest()
+
+
+class ContentCache:
+    """Processed bodies by content hash, least recently used dropped first"""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self._entries = collections.OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def process(self, body):
+        """{'hash', 'html', 'text', 'excerpt'} for a Canvas HTML body"""
+        if not body:
+            return {'hash': None, 'html': body or '', 'text': '', 'excerpt': ''}
+        key = content_hash(body)
+        with self._lock:
+            processed = self._entries.get(key)
+            if processed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return processed
+            self.misses += 1
+
+        parser = BodyParser()
+        try:
+            parser.feed(body)
+            sanitized, text = parser.result()
+        except Exception as e:
+            print(f"Error processing HTML body: {str(e)}")
+            text = SPACE_PATTERN.sub(' ', html.unescape(re.sub(r"<[^>]+>", ' ', body))).strip()
+            sanitized = html.escape(text, quote=False)
+        processed = {'hash': key, 'html': sanitized, 'text': text, 'excerpt': make_excerpt(text)}
+
+        with self._lock:
+            self._entries[key] = processed
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return processed
+
+    def metrics(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+content_cache = ContentCache()
+
+
+def process_html(body):
+    return content_cache.process(body)
+
+
+def with_body(entity, kind):
+    """Replace an entity's body with the sanitized one and store its excerpt next to it"""
+    body_field, excerpt_field = BODY_FIELDS[kind]
+    processed = process_html(entity.get(body_field))
+    entity[body_field] = processed['html']
+    entity[excerpt_field] = processed['excerpt']
+    return entity
+
+
+def without_bodies(class_data):
+    """Copy of a course snapshot with the full bodies left out (excerpts stay)"""
+    class_data = dict(class_data)
+    for name in ('announcements', 'discussions'):
+        if class_data.get(name):
+            class_data[name] = [{key: value for key, value in item.items() if key != 'message'} for item in class_data[name]]
+    if class_data.get('assignments'):
+        class_data['assignments'] = {
+            bucket: [{key: value for key, value in item.items() if key != 'description'} for item in items or []]
+            for bucket, items in class_data['assignments'].items()
+        }
+    if class_data.get('course_info'):
+        class_data['course_info'] = {key: value for key, value in class_data['course_info'].items() if key != 'syllabus'}
+    return class_data
+
+
+def find_body(class_data, kind, entity_id=None):
+    """The full body of one entity in a course snapshot: {'html', 'text'}, or None if not found"""
+    if kind == 'syllabus':
+        body = (class_data.get('course_info') or {}).get('syllabus')
+    else:
+        if kind == 'assignment':
+            entities = [item for items in (class_data.get('assignments') or {}).values() for item in items or []]
+        else:
+            entities = class_data.get(f"{kind}s") or []
+        entity = next((item for item in entities if str(item.get('id')) == str(entity_id)), None)
+        if entity is None:
+            return None
+        body = entity.get(BODY_FIELDS[kind][0])
+    if body is None:
+        return None
+    processed = process_html(body)
+    return {'html': processed['html'], 'text': processed['text']}
@@ -0,0 +1,258 @@
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+from registry import UserRegistry
+from rich_text import process_html
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# BM25 parameters and per-field weighting (a title hit is worth more than a body hit)
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 3
+SNIPPET_LENGTH = 160
+
+STOP_WORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+              'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'will', 'with'}
+
+DOCUMENT_TYPES = ('announcement', 'discussion', 'assignment', 'module_item', 'file', 'syllabus')
+
+
+def as_course_id(value):
+    """Canvas course ids arrive as ints from the API and as strings from routes"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def html_to_text(body):
+    """Plain text of a Canvas HTML body (processed once per content hash)"""
+    return process_html(body)['text']
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def extract_documents(course_id, class_data):
+    """
+    Turn a get_complete_class_data payload into searchable documents.
+    Each document is keyed by (course_id, type, entity id).
+    """
+    course_info = class_data.get('course_info') or {}
+    course_name = course_info.get('name')
+    documents = []
+
+    def add(doc_type, entity_id, title, body, url=None, date=None):
+        documents.append({
+            'key': (course_id, doc_type, entity_id),
+            'course_id': course_id,
+            'course_name': course_name,
+            'type': doc_type,
+            'id': entity_id,
+            'title': title or '',
+            'text': html_to_text(body),
+            'url': url,
+            'date': date
+        })
+
+    if course_info.get('syllabus'):
+        add('syllabus', course_id, f"{course_name} syllabus", course_info['syllabus'])
+
+    for announcement in class_data.get('announcements') or []:
+        add('announcement', announcement.get('id'), announcement.get('title'),
+            announcement.get('message'), date=announcement.get('posted_at'))
+
+    for discussion in class_data.get('discussions') or []:
+        add('discussion', discussion.get('id'), discussion.get('title'),
+            discussion.get('message'), date=discussion.get('posted_at'))
+
+    assignments = class_data.get('assignments') or {}
+    for bucket in ('upcoming', 'past', 'missing'):
+        for assignment in assignments.get(bucket) or []:
+            add('assignment', assignment.get('id'), assignment.get('name'),
+                assignment.get('description'), date=assignment.get('due_date'))
+
+    for module in class_data.get('modules') or []:
+        for item in module.get('items') or []:
+            add('module_item', item.get('id'), item.get('title'), module.get('name'), url=item.get('url'))
+
+    for file in class_data.get('files') or []:
+        if file.get('access_restricted'):
+            continue
+        add('file', file.get('id'), file.get('display_name'), file.get('filename'),
+            url=file.get('url'), date=file.get('updated_at'))
+
+    return documents
+
+
+class SearchIndex:
+    """
+    Inverted index over one user's course content, ranked with BM25.
+    Courses are re-indexed as their snapshots refresh; documents whose content
+    has not changed keep their postings untouched.
+    """
+
+    def __init__(self):
+        self._documents = {}         # key -> document (with 'fingerprint' and 'length')
+        self._postings = {}          # token -> {key: weighted term frequency}
+        self._course_keys = {}       # course_id -> set of document keys
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def index_course(self, course_id, class_data):
+        """Replace the documents of one course with those from a fresh snapshot"""
+        if not class_data:
+            return
+        course_id = as_course_id(course_id)
+        documents = extract_documents(course_id, class_data)
+
+        with self._lock:
+            previous_keys = self._course_keys.get(course_id, set())
+            current_keys = set()
+
+            for document in documents:
+                key = document['key']
+                if key in current_keys:
+                    continue
+                current_keys.add(key)
+                fingerprint = hashlib.sha1(
+                    f"{document['title']}\0{document['text']}\0{document['url']}\0{document['date']}".encode('utf-8')
+                ).hexdigest()
+
+                existing = self._documents.get(key)
+                if existing and existing['fingerprint'] == fingerprint:
+                    # Course renames are cheap to apply without re-tokenizing
+                    existing['course_name'] = document['course_name']
+                    continue
+                if existing:
+                    self._remove(key)
+                document['fingerprint'] = fingerprint
+                self._add(document)
+
+            for key in previous_keys - current_keys:
+                self._remove(key)
+
+            self._course_keys[course_id] = current_keys
+
+    def remove_course(self, course_id):
+        course_id = as_course_id(course_id)
+        with self._lock:
+            for key in self._course_keys.pop(course_id, set()):
+                self._remove(key)
+
+    def _add(self, document):
+        frequencies = Counter(tokenize(document['text']))
+        for token in tokenize(document['title']):
+            frequencies[token] += TITLE_WEIGHT
+
+        document['length'] = sum(frequencies.values())
+        document['tokens'] = tuple(frequencies)
+        self._documents[document['key']] = document
+        self._total_length += document['length']
+        for token, frequency in frequencies.items():
+            self._postings.setdefault(token, {})[document['key']] = frequency
+
+    def _remove(self, key):
+        document = self._documents.pop(key, None)
+        if not document:
+            return
+        self._total_length -= document['length']
+        for token in document['tokens']:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[token]
+
+    def search(self, query, course_ids=None, types=None, page=1, per_page=20):
+        """
+        Ranked search over the indexed documents.
+        Returns a dict with the page of results and the total number of hits.
+        """
+        started = time.perf_counter()
+        query_tokens = list(dict.fromkeys(tokenize(query or '')))
+        if course_ids:
+            course_ids = {as_course_id(course_id) for course_id in course_ids}
+        if types:
+            types = set(types)
+
+        with self._lock:
+            document_count = len(self._documents)
+            average_length = (self._total_length / document_count) if document_count else 0
+            scores = {}
+            matched_tokens = {}
+
+            for token in query_tokens:
+                postings = self._postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    document = self._documents[key]
+                    if course_ids and document['course_id'] not in course_ids:
+                        continue
+                    if types and document['type'] not in types:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * document['length'] / average_length)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    matched_tokens[key] = matched_tokens.get(key, 0) + 1
+
+            # Documents matching more of the query words always rank first
+            ranked = sorted(scores, key=lambda key: (matched_tokens[key], scores[key]), reverse=True)
+            start = (page - 1) * per_page
+            results = []
+            for key in ranked[start:start + per_page]:
+                document = self._documents[key]
+                results.append({
+                    'course_id': document['course_id'],
+                    'course_name': document['course_name'],
+                    'type': document['type'],
+                    'id': document['id'],
+                    'title': document['title'],
+                    'snippet': make_snippet(document['text'], query_tokens),
+                    'url': document['url'],
+                    'date': document['date'],
+                    'score': round(scores[key], 4)
+                })
+
+        return {
+            'results': results,
+            'total': len(ranked),
+            'page': page,
+            'per_page': per_page,
+            'took_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+
+
+def make_snippet(text, query_tokens):
+    """Short excerpt of text centred on the first query word it contains"""
+    if not text:
+        return ''
+    lower_text = text.lower()
+    position = -1
+    for token in query_tokens:
+        match = re.search(r"\b" + re.escape(token), lower_text)
+        if match and (position < 0 or match.start() < position):
+            position = match.start()
+
+    start = max(0, position - SNIPPET_LENGTH // 4) if position > 0 else 0
+    snippet = text[start:start + SNIPPET_LENGTH]
+    if start > 0:
+        snippet = '...' + snippet
+    if start + SNIPPET_LENGTH < len(text):
+        snippet += '...'
+    return snippet
+
+
+# One index per user, fed by CanvasManager whenever a course snapshot is rebuilt
+search_indexes = UserRegistry(SearchIndex)
@@ -0,0 +1,563 @@
+"""
+Cache stores behind cache_with_ttl.
+
+The default "local" store is a per-process dictionary kept under a memory
+budget (GLIDE_CACHE_MEMORY_MB). Setting
+GLIDE_CACHE_BACKEND=sqlite switches every worker process on the host to one
+SQLite database in WAL mode, so gunicorn workers share cached Canvas responses
+and coordinate through leases: when several workers miss on the same key, one
+computes it and the others wait for its result instead of calling Canvas too.
+Every worker purges expired rows now and then as it writes, so the file
+doesn't grow with entries nobody reads again.
+"""
+import concurrent.futures
+import heapq
+import itertools
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+# Memory budget of the local store, in (estimated) bytes
+MEMORY_BUDGET_BYTES = int(float(os.getenv('GLIDE_CACHE_MEMORY_MB', 256)) * 1024 * 1024)
+# Share of the budget above which cold entries get compressed
+COMPRESS_AT = 0.75
+COLD_SECONDS = 60
+MIN_COMPRESS_SIZE = 4096
+# Assumed compute time for entries stored without one (e.g. patched by events)
+DEFAULT_COST = 0.05
+UNPICKLABLE_SIZE = 64 * 1024
+# How often each worker deletes expired rows from the shared SQLite file
+PURGE_INTERVAL = float(os.getenv('GLIDE_CACHE_PURGE_SECONDS', 300))
+
+
+class CacheStats:
+    """Counters of one store; updated and read under the store's lock"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.computes = 0
+        self.waits = 0
+        self.evictions = 0
+        self.compressions = 0
+        self.decompressions = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'computes': self.computes,
+            'waits': self.waits,
+            'evictions': self.evictions,
+            'compressions': self.compressions,
+            'decompressions': self.decompressions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+class InFlight:
+    """
+    In-process single-flight: the first thread to miss on a key computes it and
+    later threads wait for that result. No lock is held while computing, so a
+    cached function can call other cached functions freely.
+    """
+
+    def __init__(self):
+        self._calls = {}    # key -> (future, computing thread)
+        self._lock = threading.Lock()
+
+    def run(self, key, compute):
+        """(value, computed_here)"""
+        thread = threading.get_ident()
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = (concurrent.futures.Future(), thread)
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            if call[1] == thread:
+                # The same key asked for again from inside its own computation
+                return compute(), True
+            try:
+                return call[0].result(), False
+            except Exception:
+                # The computing thread failed; try on our own rather than share its error
+                return compute(), True
+
+        try:
+            value = compute()
+            call[0].set_result(value)
+            return value, True
+        except BaseException as e:
+            call[0].set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+def serialized(value):
+    """Pickled form of a cached value, or None if it can't be pickled"""
+    try:
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+
+
+class LocalEntry:
+    __slots__ = ('value', 'blob', 'expires_at', 'size', 'raw_size', 'cost', 'last_access', 'seq')
+
+    def __init__(self, value, expires_at, size, cost):
+        self.value = value
+        self.blob = None            # compressed pickle while the entry is cold
+        self.expires_at = expires_at
+        self.size = size            # bytes counted against the budget right now
+        self.raw_size = size        # serialized size when uncompressed
+        self.cost = cost            # seconds it took to compute
+        self.last_access = time.time()
+        self.seq = 0
+
+
+class LocalCacheStore:
+    """
+    Per-process store with in-process single-flight and a memory budget.
+
+    Entry sizes are estimated from their pickled size. Past COMPRESS_AT of the
+    budget, entries untouched for cold_seconds are kept zlib-compressed and
+    decompressed on their next hit. Past the budget, entries are evicted by
+    GreedyDual-Size: the ones that were cheap to compute per byte and haven't
+    been used lately go first, so a big, rarely used payload can't push out
+    many small, expensive ones.
+    """
+
+    backend = 'local'
+
+    def __init__(self, budget_bytes=None, cold_seconds=COLD_SECONDS):
+        self.budget_bytes = budget_bytes or MEMORY_BUDGET_BYTES
+        self.cold_seconds = cold_seconds
+        self._entries = {}
+        self._heap = []             # (priority, seq, key); stale rows are skipped
+        self._clock = 0.0           # GreedyDual-Size inflation value
+        self._seq = itertools.count(1)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._in_flight = InFlight()
+        self.stats = CacheStats()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if time.time() >= entry.expires_at:
+                self._remove(key)
+                return False, None
+            if entry.blob is not None:
+                self._thaw(entry)
+            self._touch(key, entry)
+            return True, entry.value
+
+    def get(self, key):
+        return self._lookup(key)
+
+    def set(self, key, value, ttl_seconds, cost=None):
+        payload = serialized(value)
+        size = len(payload) if payload is not None else UNPICKLABLE_SIZE
+        with self._lock:
+            previous = self._entries.get(key)
+            if cost is None:
+                cost = previous.cost if previous else DEFAULT_COST
+            if previous:
+                self._remove(key)
+            entry = LocalEntry(value, time.time() + ttl_seconds, size, cost)
+            self._entries[key] = entry
+            self._bytes += size
+            self._touch(key, entry)
+            self._maintain()
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                self._remove(key)
+
+    def keys(self, prefix=''):
+        with self._lock:
+            return [key for key in self._entries if key.startswith(prefix)]
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _touch(self, key, entry):
+        entry.last_access = time.time()
+        self._prioritize(key, entry)
+
+    def _prioritize(self, key, entry):
+        entry.seq = next(self._seq)
+        heapq.heappush(self._heap, (self._clock + entry.cost / max(entry.size, 1), entry.seq, key))
+        if len(self._heap) > 4 * len(self._entries) + 1024:
+            self._heap = [
+                (self._clock + entry.cost / max(entry.size, 1), entry.seq, key)
+                for key, entry in self._entries.items()
+            ]
+            heapq.heapify(self._heap)
+
+    def _freeze(self, key, entry):
+        payload = serialized(entry.value)
+        if payload is None:
+            return
+        entry.blob = zlib.compress(payload)
+        entry.value = None
+        self._bytes += len(entry.blob) - entry.size
+        entry.size = len(entry.blob)
+        self._prioritize(key, entry)
+        self.stats.compressions += 1
+
+    def _thaw(self, entry):
+        entry.value = pickle.loads(zlib.decompress(entry.blob))
+        entry.blob = None
+        self._bytes += entry.raw_size - entry.size
+        entry.size = entry.raw_size
+        self.stats.decompressions += 1
+
+    def _maintain(self):
+        if self._bytes <= self.budget_bytes * COMPRESS_AT:
+            return
+
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if now >= entry.expires_at]:
+            self._remove(key)
+
+        cold = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry.blob is None and now - entry.last_access >= self.cold_seconds and entry.size >= MIN_COMPRESS_SIZE
+        ]
+        cold.sort(key=lambda item: item[1].last_access)
+        for key, entry in cold:
+            if self._bytes <= self.budget_bytes * COMPRESS_AT:
+                break
+            self._freeze(key, entry)
+
+        while self._bytes > self.budget_bytes and self._heap:
+            priority, seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is None or entry.seq != seq:
+                continue
+            self._clock = priority
+            self._remove(key)
+            self.stats.evictions += 1
+
+    def count(self, name):
+        """Bump one stats counter, for callers that look the store up themselves"""
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + 1)
+
+    def metrics(self):
+        with self._lock:
+            return dict(
+                self.stats.as_dict(),
+                backend=self.backend,
+                entries=len(self._entries),
+                compressed_entries=sum(1 for entry in self._entries.values() if entry.blob is not None),
+                bytes=self._bytes,
+                budget_bytes=self.budget_bytes
+            )
+
+    def get_or_compute(self, key, ttl_seconds, compute, cache_if=None):
+        """Cached value of key, computing it once per miss; values failing cache_if are returned but not kept"""
+        found, value = self._lookup(key)
+        with self._lock:
+            if found:
+                self.stats.hits += 1
+                return value
+            self.stats.misses += 1
+
+        def compute_and_store():
+            # Another thread may have filled the entry since our lookup
+            found, value = self._lookup(key)
+            if found:
+                return value
+            with self._lock:
+                self.stats.computes += 1
+            started = time.monotonic()
+            value = compute()
+            if cache_if is None or cache_if(value):
+                self.set(key, value, ttl_seconds, cost=time.monotonic() - started)
+            return value
+
+        value, computed = self._in_flight.run(key, compute_and_store)
+        if not computed:
+            with self._lock:
+                self.stats.waits += 1
+        return value
+
+
+class SQLiteCacheStore:
+    """
+    Cache shared by every process on the host through a SQLite WAL database.
+    Values are stored as JSON; a value that doesn't survive the round trip
+    unchanged (tuples, non-string keys, objects) is returned but not cached.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, path, lease_seconds=30, poll_interval=0.05):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._in_flight = InFlight()
+        self._unstorable = set()    # function prefixes already reported as not JSON-storable
+        self._purged_at = time.time()
+        self._lock = threading.Lock()
+        self.stats = CacheStats()
+        self.initialize()
+
+    def initialize(self):
+        """Create the schema; safe to call from several processes at once"""
+        connection = self._connection()
+        connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+        connection.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, holder TEXT, expires_at REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS cache_expiry ON cache (expires_at)")
+
+    def _connection(self):
+        # Connections can't cross a fork or be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value FROM cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            return False, None
+        return True, json.loads(row[0])
+
+    def set(self, key, value, ttl_seconds):
+        """Store a value; False (nothing stored) if it doesn't round-trip through JSON unchanged"""
+        try:
+            payload = json.dumps(value)
+            storable = json.loads(payload) == value
+        except (TypeError, ValueError):
+            storable = False
+        if not storable:
+            prefix = key.split(':', 1)[0]
+            if prefix not in self._unstorable:
+                self._unstorable.add(prefix)
+                print(f"Not caching {prefix} results: they don't round-trip through JSON")
+            return False
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, payload, now + ttl_seconds)
+        )
+        if now - self._purged_at >= PURGE_INTERVAL:
+            with self._lock:
+                purge = now - self._purged_at >= PURGE_INTERVAL
+                self._purged_at = now
+            if purge:
+                self.purge_expired()
+        return True
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def delete_prefix(self, prefix):
+        self._connection().execute(
+            "DELETE FROM cache WHERE key >= ? AND key < ?", (prefix, prefix + '\U0010ffff')
+        )
+
+    def keys(self, prefix=''):
+        rows = self._connection().execute(
+            "SELECT key FROM cache WHERE key >= ? AND key < ? AND expires_at > ?",
+            (prefix, prefix + '\U0010ffff', time.time())
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, name):
+        """Bump one stats counter, for callers that look the store up themselves"""
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + 1)
+
+    def metrics(self):
+        entries, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache WHERE expires_at > ?", (time.time(),)
+        ).fetchone()
+        with self._lock:
+            stats = self.stats.as_dict()
+        # Counters are per process; entries and bytes are for the whole shared file
+        return dict(stats, backend=self.backend, entries=entries, bytes=size)
+
+    def purge_expired(self):
+        """Delete expired entries (SharedLog records included) and leases"""
+        now = time.time()
+        connection = self._connection()
+        connection.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+        connection.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+
+    def _acquire_lease(self, key):
+        holder = f"{os.getpid()}:{threading.get_ident()}"
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM leases WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO leases (key, holder, expires_at) VALUES (?, ?, ?)",
+                (key, holder, now + self.lease_seconds)
+            )
+            acquired = cursor.rowcount == 1
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def _release_lease(self, key):
+        self._connection().execute("DELETE FROM leases WHERE key = ?", (key,))
+
+    def get_or_compute(self, key, ttl_seconds, compute, cache_if=None):
+        """Cached value of key; within the process through InFlight, across processes through a lease"""
+        found, value = self.get(key)
+        with self._lock:
+            if found:
+                self.stats.hits += 1
+                return value
+            self.stats.misses += 1
+
+        def compute_and_store():
+            with self._lock:
+                self.stats.computes += 1
+            value = compute()
+            if cache_if is None or cache_if(value):
+                self.set(key, value, ttl_seconds)
+            return value
+
+        def lease_and_compute():
+            deadline = time.time() + self.lease_seconds
+            polled = False
+            while True:
+                found, value = self.get(key)
+                if found:
+                    if polled:
+                        with self._lock:
+                            self.stats.waits += 1
+                    return value
+
+                if self._acquire_lease(key):
+                    try:
+                        return compute_and_store()
+                    finally:
+                        self._release_lease(key)
+
+                # Another worker holds the lease; wait for its result, but not forever
+                if time.time() >= deadline:
+                    return compute_and_store()
+                time.sleep(self.poll_interval)
+                polled = True
+
+        value, computed = self._in_flight.run(key, lease_and_compute)
+        if not computed:
+            with self._lock:
+                self.stats.waits += 1
+        return value
+
+
+class SharedLog:
+    """
+    Short-lived records in the cache store, read by every worker process.
+    Only active with a shared store; the local store has a single process.
+    """
+
+    def __init__(self, prefix, ttl_seconds=600, window_seconds=30, interval=1.0):
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        # Records are looked for this far back, so one written slightly out of order isn't missed
+        self.window_seconds = window_seconds
+        self.interval = interval
+        self._seen = None            # keys inside the window already read
+        self._read_at = 0
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def is_shared(self):
+        return get_cache_store().backend != 'local'
+
+    def append(self, record):
+        store = get_cache_store()
+        if store.backend == 'local':
+            return False
+        key = f"{self.prefix}{time.time():017.6f}:{os.getpid()}:{next(self._sequence)}"
+        return store.set(key, dict(record, pid=os.getpid()), self.ttl_seconds)
+
+    def due(self):
+        """True when read_new would look at the store again"""
+        return get_cache_store().backend != 'local' and time.time() - self._read_at >= self.interval
+
+    def read_new(self):
+        """Records other processes appended since the last read, at most once per interval"""
+        store = get_cache_store()
+        now = time.time()
+        if store.backend == 'local' or now - self._read_at < self.interval:
+            return []
+        if not self._lock.acquire(blocking=False):
+            return []
+        try:
+            self._read_at = now
+            window_start = f"{self.prefix}{now - self.window_seconds:017.6f}"
+            recent = sorted(key for key in store.keys(self.prefix) if key >= window_start)
+            if self._seen is None:
+                # A new reader starts from now
+                self._seen = set(recent)
+                return []
+            records = []
+            for key in recent:
+                if key in self._seen:
+                    continue
+                found, record = store.get(key)
+                if found and record and record.get('pid') != os.getpid():
+                    records.append(record)
+            self._seen = set(recent)
+            return records
+        finally:
+            self._lock.release()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_cache_store():
+    """The process-wide cache store, chosen by GLIDE_CACHE_BACKEND on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.getenv('GLIDE_CACHE_BACKEND', 'local').lower()
+                if backend == 'sqlite':
+                    _store = SQLiteCacheStore(
+                        os.getenv('GLIDE_CACHE_PATH', '/tmp/glide-cache.sqlite3'),
+                        lease_seconds=float(os.getenv('GLIDE_CACHE_LEASE_SECONDS', 30))
+                    )
+                else:
+                    _store = LocalCacheStore()
+    return _store
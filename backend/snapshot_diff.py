@@ -0,0 +1,155 @@
+"""
+Structural diffs between two course snapshots (get_complete_class_data results).
+
+Lists of objects with an 'id' (assignments, announcements, modules and their
+items, files, professors, ...) are compared entity by entity, dicts key by key;
+anything else is replaced whole. Patches are plain JSON:
+
+    dict patch:  {'set': {key: value}, 'unset': [key], 'patch': {key: sub_patch}}
+    list patch:  {'add': [entity], 'update': [[id, dict_patch]], 'remove': [id], 'order': [id]}
+
+Empty parts are left out, and 'order' only appears when applying the other
+parts would not already give the new order. apply_patch never mutates its input.
+"""
+
+
+def entity_ids(value):
+    """Ids of a list of entities, or None if the list isn't one"""
+    if not isinstance(value, list):
+        return None
+    ids = []
+    for element in value:
+        if not isinstance(element, dict) or element.get('id') is None:
+            return None
+        ids.append(element['id'])
+    if len(set(ids)) != len(ids):
+        return None
+    return ids
+
+
+def diff_value(old, new):
+    """A patch turning old into new, or None when they're equal or can't be patched"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        return diff_dict(old, new)
+
+    old_ids = entity_ids(old)
+    new_ids = entity_ids(new) if old_ids is not None else None
+    if new_ids is not None and (old or new):
+        return diff_entities(old, new, old_ids, new_ids)
+    return None
+
+
+def diff_dict(old, new):
+    changes = {}
+    set_values = {}
+    sub_patches = {}
+
+    for key, value in new.items():
+        if key not in old:
+            set_values[key] = value
+            continue
+        previous = old[key]
+        if previous == value:
+            continue
+        sub_patch = diff_value(previous, value)
+        if sub_patch is None:
+            set_values[key] = value
+        else:
+            sub_patches[key] = sub_patch
+
+    unset = [key for key in old if key not in new]
+
+    if set_values:
+        changes['set'] = set_values
+    if unset:
+        changes['unset'] = unset
+    if sub_patches:
+        changes['patch'] = sub_patches
+    return changes
+
+
+def diff_entities(old, new, old_ids, new_ids):
+    changes = {}
+    old_by_id = dict(zip(old_ids, old))
+    new_id_set = set(new_ids)
+
+    added = []
+    updated = []
+    for entity_id, entity in zip(new_ids, new):
+        previous = old_by_id.get(entity_id)
+        if previous is None:
+            added.append(entity)
+        elif previous != entity:
+            updated.append([entity_id, diff_dict(previous, entity)])
+
+    removed = [entity_id for entity_id in old_ids if entity_id not in new_id_set]
+
+    # Order after applying the rest: survivors in their old order, then additions
+    applied_order = [entity_id for entity_id in old_ids if entity_id in new_id_set]
+    applied_order.extend(entity['id'] for entity in added)
+
+    if added:
+        changes['add'] = added
+    if updated:
+        changes['update'] = updated
+    if removed:
+        changes['remove'] = removed
+    if applied_order != new_ids:
+        changes['order'] = new_ids
+    return changes
+
+
+def diff_snapshots(old, new):
+    """Patch between two course snapshots; an empty dict means nothing changed"""
+    if old is None:
+        return {'set': dict(new or {})}
+    return diff_dict(old, new or {})
+
+
+LIST_PATCH_KEYS = ('add', 'update', 'remove', 'order')
+
+
+def is_list_patch(patch):
+    return any(key in patch for key in LIST_PATCH_KEYS)
+
+
+def apply_patch(value, patch):
+    """
+    Apply a patch from diff_value/diff_snapshots and return the new value.
+    A missing value (a section left out of the base) takes its container type
+    from the patch. Entities the patch would update are missing then as well,
+    which is why the web client refetches such a section instead.
+    """
+    if isinstance(value, list) or (value is None and is_list_patch(patch)):
+        return apply_entities_patch(value or [], patch)
+    return apply_dict_patch(value or {}, patch)
+
+
+def apply_dict_patch(value, patch):
+    result = dict(value)
+    for key in patch.get('unset', ()):
+        result.pop(key, None)
+    result.update(patch.get('set', {}))
+    for key, sub_patch in patch.get('patch', {}).items():
+        result[key] = apply_patch(result.get(key), sub_patch)
+    return result
+
+
+def apply_entities_patch(value, patch):
+    removed = set(patch.get('remove', ()))
+    updates = dict((entity_id, sub_patch) for entity_id, sub_patch in patch.get('update', ()))
+
+    result = []
+    for entity in value:
+        entity_id = entity.get('id')
+        if entity_id in removed:
+            continue
+        sub_patch = updates.get(entity_id)
+        result.append(apply_dict_patch(entity, sub_patch) if sub_patch is not None else entity)
+    result.extend(patch.get('add', ()))
+
+    order = patch.get('order')
+    if order is not None:
+        position = {entity_id: index for index, entity_id in enumerate(order)}
+        result.sort(key=lambda entity: position.get(entity.get('id'), len(position)))
+    return result
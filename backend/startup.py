@@ -0,0 +1,217 @@
+"""
+Cold start: pre-fork initialization, worker warmup and a startup benchmark.
+
+Heavy libraries (firebase_admin, canvasapi) are imported on first use, so
+importing the app stays cheap. In a pre-forking server (GLIDE_PRELOAD=true in
+gunicorn_shared.py) the master imports the app and initializes Firebase once;
+each worker then opens its own Firestore client and Canvas connection pool.
+With GLIDE_WARMUP=true a new worker also loads the current course snapshots of
+the most recently active users in the background, admitted like a request (see
+admission) so it can't crowd out the users themselves.
+
+    python startup.py bench                          # import time and first-request latency
+    python startup.py bench --path "/api/canvas/all-classes?user_id=..." --runs 5
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ACTIVE_USERS_PATH = os.getenv('GLIDE_ACTIVE_USERS_PATH', os.path.join(tempfile.gettempdir(), 'glide-active-users.json'))
+WARMUP_ENABLED = os.getenv('GLIDE_WARMUP', 'false').lower() == 'true'
+WARMUP_USERS = int(os.getenv('GLIDE_WARMUP_USERS', 20))
+WARMUP_WORKERS = 2
+# Users seen within this window are worth warming up for
+ACTIVE_WINDOW = 24 * 3600
+RECORD_INTERVAL = 60
+
+
+class ActiveUsers:
+    """When each user was last seen, written to a small JSON file shared across restarts and workers"""
+
+    def __init__(self, path=ACTIVE_USERS_PATH):
+        self.path = path
+        self._seen = {}
+        self._written_at = 0
+        self._lock = threading.Lock()
+
+    def record(self, user_id):
+        now = time.time()
+        with self._lock:
+            self._seen[user_id] = now
+            if now - self._written_at < RECORD_INTERVAL:
+                return
+            self._written_at = now
+            seen = dict(self._seen)
+        try:
+            self._write(seen)
+        except OSError as e:
+            print(f"Error recording active users: {str(e)}")
+
+    def _read(self):
+        try:
+            with open(self.path) as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, seen):
+        cutoff = time.time() - ACTIVE_WINDOW
+        merged = {user_id: last for user_id, last in self._read().items() if last >= cutoff}
+        for user_id, last in seen.items():
+            merged[user_id] = max(last, merged.get(user_id, 0))
+        partial = f"{self.path}.{os.getpid()}"
+        with open(partial, 'w') as handle:
+            json.dump(merged, handle)
+        os.replace(partial, self.path)
+
+    def recent(self, limit=WARMUP_USERS):
+        """Most recently active users first"""
+        cutoff = time.time() - ACTIVE_WINDOW
+        seen = self._read()
+        with self._lock:
+            seen.update(self._seen)
+        return [user_id for user_id, last in sorted(seen.items(), key=lambda entry: -entry[1]) if last >= cutoff][:limit]
+
+
+active_users = ActiveUsers()
+
+
+def preinit():
+    """Pre-fork setup in the server's master: import the app and initialize Firebase (no network clients)"""
+    started = time.perf_counter()
+    import app  # noqa: F401
+    import canvasapi.canvas  # noqa: F401
+    from firebase_utils import initialize_firebase
+    initialize_firebase()
+    print(f"Pre-fork initialization took {time.perf_counter() - started:.2f}s")
+
+
+def worker_init(warmup=WARMUP_ENABLED):
+    """Per-worker setup: Firestore client, a warm Canvas connection, then the optional snapshot warmup"""
+    import profiler
+    if profiler.SAMPLING_ENABLED:
+        # Sampler threads don't survive a fork, so each worker starts its own
+        try:
+            profiler.sampler.start()
+        except ValueError as e:
+            print(f"Profiler sampler not started (GLIDE_PROFILER_INTERVAL_MS): {str(e)}")
+    threading.Thread(target=_open_clients, name='worker-init', daemon=True).start()
+    if warmup:
+        threading.Thread(target=warm_recent_users, name='warmup', daemon=True).start()
+
+
+def _open_clients():
+    from firebase_utils import initialize_firebase, get_firestore_client
+    try:
+        if initialize_firebase():
+            get_firestore_client()
+    except Exception as e:
+        print(f"Error opening Firestore client: {str(e)}")
+
+    canvas_url = os.getenv('CANVAS_URL')
+    if canvas_url:
+        from deadlines import DeadlineSession
+        try:
+            # Pays for DNS and the TLS handshake before the first user request does
+            DeadlineSession().get(f"{canvas_url.rstrip('/')}/health_check", timeout=5)
+        except Exception as e:
+            print(f"Error opening Canvas connection: {str(e)}")
+
+
+def warm_user(user_id):
+    """Load one user's current course snapshots into the cache store; 0 if admission turns it away"""
+    from admission import admission, Rejected, WARMUP_ROUTE
+    from canvas_manager import CanvasManager
+    try:
+        admitted = admission.admit(user_id, WARMUP_ROUTE)
+    except Rejected as e:
+        print(f"Skipping warmup of user {user_id}: {str(e)}")
+        return 0
+    started = time.perf_counter()
+    try:
+        canvas_manager = CanvasManager(user_id=user_id)
+        courses = canvas_manager.get_current_classes() or []
+        for course in courses:
+            # String ids share the snapshot cache entries of /course-data
+            canvas_manager.get_complete_class_data(str(course['course_id']))
+        return len(courses)
+    finally:
+        if admitted:
+            admission.release(time.perf_counter() - started)
+
+
+def warm_recent_users(limit=WARMUP_USERS):
+    users = active_users.recent(limit)
+    if not users:
+        return 0
+    started = time.perf_counter()
+    warmed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix='warmup') as executor:
+        for user_id, future in [(user_id, executor.submit(warm_user, user_id)) for user_id in users]:
+            try:
+                warmed += future.result()
+            except Exception as e:
+                print(f"Error warming up user {user_id}: {str(e)}")
+    print(f"Warmed {warmed} course snapshots for {len(users)} users in {time.perf_counter() - started:.1f}s")
+    return warmed
+
+
+IMPORT_PROBE = "import time; started = time.perf_counter(); import app; print(time.perf_counter() - started)"
+
+REQUEST_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+timings = []
+for _ in range(2):
+    request_started = time.perf_counter()
+    response = client.get(sys.argv[1])
+    timings.append((time.perf_counter() - request_started, response.status_code))
+print(json.dumps({'import': imported - started, 'first': timings[0], 'second': timings[1]}))
+"""
+
+
+def bench(path='/api/canvas/status', runs=5):
+    """Import time and first/second request latency, each measured in a fresh interpreter"""
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def probe(code, *args):
+        output = subprocess.run([sys.executable, '-c', code, *args], cwd=here, capture_output=True, text=True, check=True)
+        return output.stdout.strip().splitlines()[-1]
+
+    imports = [float(probe(IMPORT_PROBE)) for _ in range(runs)]
+    samples = [json.loads(probe(REQUEST_PROBE, path)) for _ in range(runs)]
+    return {
+        'runs': runs,
+        'path': path,
+        'import_seconds': round(statistics.median(imports), 4),
+        'first_request_seconds': round(statistics.median(run['first'][0] for run in samples), 4),
+        'second_request_seconds': round(statistics.median(run['second'][0] for run in samples), 4),
+        'status_codes': sorted({run['first'][1] for run in samples})
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['bench', 'warmup'])
+    parser.add_argument('--path', default='/api/canvas/status', help='route for the first-request measurement')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'bench':
+        print(json.dumps(bench(args.path, args.runs), indent=2))
+    else:
+        warm_recent_users()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from registry import UserRegistry
+from search_index import as_course_id
+from timeline_index import parse_canvas_datetime
+
+# Courses that only have a start date are assumed to run for about a semester
+DEFAULT_COURSE_LENGTH = timedelta(days=140)
+
+CURRENT = 'current'
+PAST = 'past'
+FUTURE = 'future'
+
+
+def legacy_term_prefix(now):
+    """The old "2026FA"-style name prefix, used only when Canvas gives no dates at all"""
+    if 1 <= now.month <= 5:
+        term = "SP"
+    elif 6 <= now.month <= 7:
+        term = "SU"
+    else:
+        term = "FA"
+    return f"{now.year}{term}"
+
+
+def course_window(course):
+    """
+    (start, end) for a course listing entry, preferring enrollment term dates
+    over course dates. Either side may be None when Canvas leaves it open.
+    """
+    term = course.get('term') or {}
+    start = parse_canvas_datetime(term.get('start_at'))
+    end = parse_canvas_datetime(term.get('end_at'))
+    if start or end:
+        return start, end
+
+    start = parse_canvas_datetime(course.get('start_date'))
+    end = parse_canvas_datetime(course.get('end_date'))
+    if start and not end:
+        end = start + DEFAULT_COURSE_LENGTH
+    return start, end
+
+
+class CourseTermIndex:
+    """
+    One user's course listing, with each course mapped to its term window.
+    Current/past/future sets are derived from the stored windows on each call,
+    so they stay correct as time passes without another listing.
+    """
+
+    def __init__(self):
+        self._courses = {}      # course_id -> (course dict, start, end)
+        self._order = []
+        self._lock = threading.RLock()
+        self.refreshed_at = 0
+
+    def is_stale(self, ttl_seconds):
+        return not self.refreshed_at or time.time() - self.refreshed_at >= ttl_seconds
+
+    def sync(self, courses):
+        """Replace the listing; windows are only recomputed for courses that changed"""
+        if courses is None:
+            return
+        with self._lock:
+            updated = {}
+            for course in courses:
+                existing = self._courses.get(course['course_id'])
+                if existing and existing[0] == course:
+                    updated[course['course_id']] = existing
+                else:
+                    updated[course['course_id']] = (course,) + course_window(course)
+            self._courses = updated
+            self._order = [course['course_id'] for course in courses]
+            self.refreshed_at = time.time()
+
+    def course(self, course_id):
+        """The listing entry for one course, or None"""
+        entry = self._courses.get(as_course_id(course_id))
+        return entry[0] if entry else None
+
+    def status(self, course_id, now=None):
+        entry = self._courses.get(course_id)
+        return self._status(entry, now or datetime.utcnow()) if entry else None
+
+    def _status(self, entry, now):
+        course, start, end = entry
+        if start is None and end is None:
+            return CURRENT if legacy_term_prefix(now) in (course.get('course_name') or '') else PAST
+        if start and now < start:
+            return FUTURE
+        if end and now > end:
+            return PAST
+        return CURRENT
+
+    def courses(self, statuses=None, now=None):
+        """Course dicts in listing order, optionally restricted to some statuses"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            result = []
+            for course_id in self._order:
+                entry = self._courses[course_id]
+                status = self._status(entry, now)
+                if statuses is None or status in statuses:
+                    result.append(dict(entry[0], term_status=status))
+            return result
+
+
+# One term index per user, refreshed from a single course listing
+term_indexes = UserRegistry(CourseTermIndex)
@@ -0,0 +1,152 @@
+"""
+Replays recorded Canvas events through the /api/canvas/events endpoint.
+
+    cd backend && python -m pytest -q test_events.py
+
+The cache store is a throwaway SQLite file, so a second process can play the
+part of another worker.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import shared_cache
+from canvas_manager import CanvasManager
+from event_replayer import replay
+from events import GLOBAL_ID_OFFSET, event_log, replay_events
+from timeline_index import timeline_indexes
+
+TOKEN = 'test-events-token'
+SHARD = 1234
+COURSE_ID = 42
+GLOBAL_COURSE_ID = SHARD * GLOBAL_ID_OFFSET + COURSE_ID
+OWNER = 'test-user'
+
+# As Canvas POSTs them: Live Events carry global ids, webhooks local ones
+ANNOUNCEMENT_EVENT = {
+    'metadata': {
+        'event_name': 'discussion_topic_created',
+        'event_time': '2024-03-01T10:00:00.000Z',
+        'context_type': 'Course',
+        'context_id': str(GLOBAL_COURSE_ID)
+    },
+    'body': {
+        'discussion_topic_id': str(SHARD * GLOBAL_ID_OFFSET + 900),
+        'is_announcement': True,
+        'title': 'Room change',
+        'body': '<p>Lecture moves to <b>room 2</b><script>alert(1)</script></p>',
+        'created_at': '2024-03-01T10:00:00Z'
+    }
+}
+ASSIGNMENT_EVENT = {
+    'metadata': {
+        'event_name': 'assignment_updated',
+        'event_time': '2024-03-01T10:05:00.000Z',
+        'context_type': 'Course',
+        'context_id': str(GLOBAL_COURSE_ID)
+    },
+    'body': {'assignment_id': str(SHARD * GLOBAL_ID_OFFSET + 77), 'title': 'Essay'}
+}
+WEBHOOK_EVENT = {'event_type': 'grade_change', 'course_id': COURSE_ID, 'data': {'score': 9}}
+
+
+def cache_key(method, course_id):
+    """The key cache_with_ttl uses for a per-course method of OWNER's manager"""
+    return f"{method.cache_prefix}(CanvasManager({OWNER}), {course_id!r}){{}}"
+
+
+class EventEndpointTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.cache_path = os.path.join(cls.directory.name, 'cache.sqlite3')
+        cls.previous_store = shared_cache._store
+        shared_cache._store = shared_cache.SQLiteCacheStore(cls.cache_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shared_cache._store = cls.previous_store
+        cls.directory.cleanup()
+
+    def setUp(self):
+        environment = mock.patch.dict(os.environ, {'GLIDE_EVENTS_TOKEN': TOKEN})
+        environment.start()
+        self.addCleanup(environment.stop)
+        self.store = shared_cache.get_cache_store()
+
+    def test_rejects_missing_or_wrong_token(self):
+        from app import app
+        client = app.test_client()
+        for headers in ({}, {'X-Glide-Events-Token': 'wrong'}):
+            response = client.post('/api/canvas/events', json=WEBHOOK_EVENT, headers=headers)
+            self.assertEqual(response.status_code, 403)
+
+    def test_rejects_every_token_when_unconfigured(self):
+        with mock.patch.dict(os.environ, {'GLIDE_EVENTS_TOKEN': ''}):
+            self.assertEqual(replay([WEBHOOK_EVENT], token=''), [{'error': 'Invalid or missing events token'}])
+
+    def test_global_ids_map_to_local_ids(self):
+        [response] = replay([ASSIGNMENT_EVENT], token=TOKEN)
+        summary = response['data'][0]
+        self.assertEqual(summary['course_id'], GLOBAL_COURSE_ID % 10 ** 13)
+        self.assertEqual(summary['course_id'], COURSE_ID)
+        self.assertFalse(summary['ignored'])
+
+    def test_assignment_event_invalidates_course_snapshot(self):
+        key = cache_key(CanvasManager.load_class_data, COURSE_ID)
+        self.store.set(key, {'course_id': COURSE_ID}, 60)
+        replay([ASSIGNMENT_EVENT], token=TOKEN)
+        self.assertFalse(self.store.get(key)[0])
+
+    def test_announcement_is_patched_into_cached_lists(self):
+        key = cache_key(CanvasManager.get_course_announcements, COURSE_ID)
+        older = {'id': 1, 'title': 'Welcome', 'message': '<p>Hi</p>', 'posted_at': None, 'author': {}}
+        self.store.set(key, [older], 60)
+
+        [response] = replay([ANNOUNCEMENT_EVENT, ANNOUNCEMENT_EVENT], token=TOKEN)[-1:]
+        self.assertEqual(response['data'][0]['patched'], 1)
+
+        found, announcements = self.store.get(key)
+        self.assertTrue(found)
+        # Replaying the same event again doesn't duplicate it
+        self.assertEqual([announcement['id'] for announcement in announcements], [900, 1])
+        self.assertEqual(announcements[0]['title'], 'Room change')
+        self.assertNotIn('<script>', announcements[0]['message'])
+        self.assertIn('room 2', announcements[0]['excerpt'])
+
+    def test_other_workers_replay_the_event(self):
+        timeline = timeline_indexes.get(OWNER)
+        timeline.course_refreshed_at[COURSE_ID] = time.time()
+        # This process starts reading the shared event log from now
+        event_log._read_at = 0
+        event_log.read_new()
+
+        # Another worker receives the event
+        script = (
+            "import json, sys; from event_replayer import replay; "
+            "print(json.dumps(replay([json.loads(sys.argv[1])], token=sys.argv[2])))"
+        )
+        environment = dict(os.environ, GLIDE_CACHE_BACKEND='sqlite', GLIDE_CACHE_PATH=self.cache_path)
+        output = subprocess.run(
+            [sys.executable, '-c', script, json.dumps(ASSIGNMENT_EVENT), TOKEN],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=environment,
+            capture_output=True, text=True, check=True
+        ).stdout
+        self.assertEqual(json.loads(output.strip().splitlines()[-1])[0]['data'][0]['course_id'], COURSE_ID)
+        self.assertIn(COURSE_ID, timeline.course_refreshed_at)
+
+        event_log._read_at = 0
+        self.assertEqual(replay_events(), 1)
+        self.assertNotIn(COURSE_ID, timeline.course_refreshed_at)
+        # Already replayed
+        event_log._read_at = 0
+        self.assertEqual(replay_events(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+"""
+Round trips through snapshot_diff: apply_patch(base, diff(base, new)) == new.
+
+    cd backend && python -m pytest -q test_snapshot_diff.py
+"""
+import copy
+import random
+import unittest
+
+from snapshot_diff import apply_patch, diff_snapshots, diff_value
+
+BASE = {
+    'course_id': 42,
+    'course_name': 'Biology',
+    'syllabus_excerpt': 'Cells',
+    'assignments': {
+        'upcoming': [
+            {'id': 1, 'name': 'Lab 1', 'due_date': '2024-03-01T00:00:00Z', 'points_possible': 10},
+            {'id': 2, 'name': 'Lab 2', 'due_date': '2024-03-08T00:00:00Z', 'points_possible': 10}
+        ],
+        'past': [{'id': 3, 'name': 'Quiz', 'score': 8, 'late': False}],
+        'missing': []
+    },
+    'announcements': [{'id': 10, 'title': 'Welcome', 'author': {'name': 'Prof'}}],
+    'professors': [{'id': 5, 'name': 'Prof', 'role': 'Teacher', 'email': None}],
+    'modules': [{'id': 7, 'name': 'Week 1', 'items': [{'id': 70, 'title': 'Reading'}]}],
+    'tags': ['lab', 'intro'],
+    'pending': []
+}
+
+
+class RoundTripTest(unittest.TestCase):
+    def assertRoundTrip(self, base, new):
+        original = copy.deepcopy(base)
+        patch = diff_snapshots(base, new)
+        self.assertEqual(apply_patch(base, patch), new if new is not None else {})
+        # Patches are applied to cached snapshots, which must stay as they were
+        self.assertEqual(base, original)
+        return patch
+
+    def updated(self, change):
+        new = copy.deepcopy(BASE)
+        change(new)
+        return new
+
+    def test_unchanged_snapshot_gives_empty_patch(self):
+        self.assertEqual(self.assertRoundTrip(BASE, copy.deepcopy(BASE)), {})
+
+    def test_scalar_changes(self):
+        def change(new):
+            new['course_name'] = 'Biology II'
+            new['syllabus_excerpt'] = None
+        self.assertRoundTrip(BASE, self.updated(change))
+
+    def test_removed_keys(self):
+        def change(new):
+            del new['syllabus_excerpt']
+            del new['assignments']['missing']
+            del new['announcements'][0]['author']
+        patch = self.assertRoundTrip(BASE, self.updated(change))
+        self.assertEqual(patch['unset'], ['syllabus_excerpt'])
+
+    def test_added_keys(self):
+        def change(new):
+            new['upcoming_tests'] = [{'id': 2, 'name': 'Lab 2'}]
+            new['assignments']['past'][0]['submitted_at'] = '2024-02-01T00:00:00Z'
+        self.assertRoundTrip(BASE, self.updated(change))
+
+    def test_entity_list_add_update_remove(self):
+        def change(new):
+            upcoming = new['assignments']['upcoming']
+            upcoming[0]['points_possible'] = 20
+            del upcoming[1]
+            upcoming.append({'id': 4, 'name': 'Lab 3', 'due_date': None, 'points_possible': 5})
+            new['announcements'].insert(0, {'id': 11, 'title': 'Room change', 'author': {}})
+        patch = self.assertRoundTrip(BASE, self.updated(change))
+        upcoming = patch['patch']['assignments']['patch']['upcoming']
+        self.assertEqual(upcoming['remove'], [2])
+        self.assertEqual([entity['id'] for entity in upcoming['add']], [4])
+
+    def test_entity_list_reordered(self):
+        def change(new):
+            new['assignments']['upcoming'].reverse()
+        patch = self.assertRoundTrip(BASE, self.updated(change))
+        self.assertEqual(patch['patch']['assignments']['patch']['upcoming']['order'], [2, 1])
+
+    def test_entities_moving_between_lists(self):
+        def change(new):
+            new['assignments']['missing'].append(new['assignments']['upcoming'].pop(0))
+        self.assertRoundTrip(BASE, self.updated(change))
+
+    def test_nested_entity_lists(self):
+        def change(new):
+            new['modules'][0]['items'].append({'id': 71, 'title': 'Slides'})
+            new['modules'][0]['items'][0]['title'] = 'Reading (updated)'
+            new['modules'].append({'id': 8, 'name': 'Week 2', 'items': []})
+        self.assertRoundTrip(BASE, self.updated(change))
+
+    def test_list_emptied_and_filled(self):
+        def change(new):
+            new['announcements'] = []
+            new['pending'] = [{'id': 'files'}]
+        self.assertRoundTrip(BASE, self.updated(change))
+
+    def test_lists_without_ids_are_replaced(self):
+        def change(new):
+            new['tags'] = ['intro']
+            # Duplicate ids aren't entities either
+            new['professors'] = [{'id': 5, 'name': 'Prof'}, {'id': 5, 'name': 'TA'}]
+        patch = self.assertRoundTrip(BASE, self.updated(change))
+        self.assertEqual(patch['set']['tags'], ['intro'])
+
+    def test_section_changes_type(self):
+        def change(new):
+            new['professors'] = None
+            new['tags'] = {'primary': 'lab'}
+        self.assertRoundTrip(BASE, self.updated(change))
+
+    def test_missing_base(self):
+        self.assertRoundTrip(None, copy.deepcopy(BASE))
+        self.assertEqual(apply_patch(None, diff_snapshots(None, BASE)), BASE)
+
+    def test_missing_new(self):
+        self.assertRoundTrip(BASE, None)
+
+    def test_missing_section_in_base(self):
+        # A section the base never had still patches from nothing
+        new = copy.deepcopy(BASE)
+        base = copy.deepcopy(BASE)
+        del base['modules']
+        self.assertRoundTrip(base, new)
+        patch = diff_value([], new['modules'])
+        self.assertEqual(apply_patch(None, patch), new['modules'])
+
+    def test_random_edits(self):
+        generator = random.Random(7)
+        for _ in range(200):
+            new = copy.deepcopy(BASE)
+            for _ in range(generator.randint(1, 4)):
+                random_edit(generator, new)
+            self.assertRoundTrip(BASE, new)
+
+
+def random_edit(generator, snapshot):
+    section = generator.choice(['upcoming', 'past', 'announcements', 'modules', 'scalar'])
+    if section == 'scalar':
+        key = generator.choice(['course_name', 'syllabus_excerpt', 'new_key'])
+        if key in snapshot and generator.random() < 0.3:
+            del snapshot[key]
+        else:
+            snapshot[key] = generator.randint(0, 100)
+        return
+
+    entities = snapshot['assignments'][section] if section in ('upcoming', 'past') else snapshot[section]
+    action = generator.choice(['add', 'remove', 'update', 'shuffle'])
+    if action == 'add':
+        entities.insert(generator.randint(0, len(entities)), {'id': generator.randint(100, 10 ** 6), 'name': 'new'})
+    elif action == 'remove' and entities:
+        entities.pop(generator.randrange(len(entities)))
+    elif action == 'update' and entities:
+        entity = generator.choice(entities)
+        entity[generator.choice(['name', 'score', 'extra'])] = generator.randint(0, 100)
+    else:
+        generator.shuffle(entities)
+
+
+if __name__ == '__main__':
+    unittest.main()
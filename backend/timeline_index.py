@@ -0,0 +1,214 @@
+import base64
+import binascii
+import bisect
+import calendar
+import functools
+import json
+import threading
+import time
+from datetime import datetime
+
+from registry import UserRegistry
+from search_index import as_course_id
+
+# Assignment names containing any of these are treated as tests
+TEST_TERMS = ['test', 'quiz', 'exam', 'midterm', 'final']
+# How often /upcoming re-checks the course list, and how old a course's entries get before they are fetched again
+TIMELINE_SYNC_INTERVAL = 300
+TIMELINE_COURSE_TTL = 900
+
+
+@functools.lru_cache(maxsize=8192)
+def parse_canvas_datetime(value):
+    """
+    Parse a Canvas ISO-8601 timestamp ("2026-10-19T23:59:00Z") into a naive UTC datetime.
+    Canvas repeats the same due dates across many payloads, so results are memoized.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+    except ValueError:
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = datetime.utcfromtimestamp(parsed.timestamp())
+        return parsed
+
+
+def canvas_timestamp(value):
+    """Epoch seconds for a Canvas timestamp, or None if it can't be parsed"""
+    parsed = parse_canvas_datetime(value)
+    return calendar.timegm(parsed.timetuple()) if parsed else None
+
+
+def is_test_name(name):
+    lower_name = (name or '').lower()
+    return any(term in lower_name for term in TEST_TERMS)
+
+
+def encode_cursor(entry):
+    return base64.urlsafe_b64encode(json.dumps(list(entry)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """The (timestamp, type, course, id) entry a cursor points after; ValueError if it isn't one"""
+    try:
+        entry = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (UnicodeEncodeError, binascii.Error, json.JSONDecodeError) as e:
+        raise ValueError(f"malformed cursor ({str(e)})")
+    if (not isinstance(entry, list) or len(entry) != 4 or isinstance(entry[0], bool)
+            or not isinstance(entry[0], (int, float)) or not all(isinstance(value, str) for value in entry[1:])):
+        raise ValueError("cursor does not point at a timeline entry")
+    return tuple(entry)
+
+
+class TimelineIndex:
+    """
+    Time-ordered index of one user's dated work: assignments, tests and calendar events.
+    Entries live in a sorted list of (timestamp, type, course, id) tuples so that window
+    queries are a bisect plus a slice, and a course's entries can be swapped out in place
+    when its snapshot changes.
+    """
+
+    def __init__(self):
+        self._entries = []          # sorted (timestamp, type, str(course_id), str(id))
+        self._items = {}            # entry tuple -> item dict
+        self._keys = {}             # (source, course_id) -> set of entry tuples
+        self._course_names = {}
+        self.course_refreshed_at = {}
+        self.synced_at = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def set_course_name(self, course_id, course_name):
+        if course_name:
+            self._course_names[as_course_id(course_id)] = course_name
+
+    def is_course_stale(self, course_id, ttl_seconds):
+        refreshed_at = self.course_refreshed_at.get(as_course_id(course_id))
+        return refreshed_at is None or time.time() - refreshed_at >= ttl_seconds
+
+    def replace_assignments(self, course_id, assignments):
+        """
+        Swap in a course's assignments (the bucketed dict from get_class_assignments).
+        Assignments whose due date is unchanged keep their place in the index.
+        """
+        course_id = as_course_id(course_id)
+        items = []
+        for status in ('upcoming', 'past', 'missing'):
+            for assignment in (assignments or {}).get(status) or []:
+                timestamp = canvas_timestamp(assignment.get('due_date'))
+                if timestamp is None:
+                    continue
+                items.append((timestamp, {
+                    'type': 'test' if is_test_name(assignment.get('name')) else 'assignment',
+                    'id': assignment.get('id'),
+                    'title': assignment.get('name'),
+                    'course_id': course_id,
+                    'due_at': assignment.get('due_date'),
+                    'status': status,
+                    'points_possible': assignment.get('points_possible'),
+                    'score': assignment.get('score'),
+                    'submission_status': assignment.get('submission_status')
+                }))
+
+        with self._lock:
+            self._replace(('assignments', course_id), items)
+            self.course_refreshed_at[course_id] = time.time()
+
+    def replace_events(self, start_at, end_at, events):
+        """
+        Swap in the calendar events fetched for a date window.
+        Events outside the window are left alone, since the fetch didn't cover them.
+        """
+        start_ts = canvas_timestamp(start_at) or 0
+        end_ts = canvas_timestamp(end_at) or float('inf')
+        by_context = {}
+        for event in events or []:
+            timestamp = canvas_timestamp(event.get('start_at'))
+            if timestamp is None:
+                continue
+            context_code = event.get('context_code') or ''
+            context = as_course_id(context_code[len('course_'):]) if context_code.startswith('course_') else None
+            by_context.setdefault(context, []).append((timestamp, {
+                'type': 'event',
+                'id': event.get('id'),
+                'title': event.get('title'),
+                'course_id': context,
+                'due_at': event.get('start_at'),
+                'end_at': event.get('end_at'),
+                'location_name': event.get('location_name')
+            }))
+
+        with self._lock:
+            contexts = {course_id for source, course_id in self._keys if source == 'events'} | set(by_context)
+            for context in contexts:
+                source = ('events', context)
+                outside = [
+                    (entry[0], self._items[entry]) for entry in self._keys.get(source, ())
+                    if not start_ts <= entry[0] <= end_ts
+                ]
+                self._replace(source, outside + by_context.get(context, []))
+
+    def _replace(self, source, items):
+        previous = self._keys.get(source, set())
+        current = set()
+        for timestamp, item in items:
+            entry = (timestamp, item['type'], str(item['course_id']), str(item['id']))
+            current.add(entry)
+            if entry not in self._items:
+                bisect.insort(self._entries, entry)
+            self._items[entry] = item
+
+        for entry in previous - current:
+            self._items.pop(entry, None)
+            position = bisect.bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+
+        self._keys[source] = current
+
+    def query(self, start_ts=None, end_ts=None, course_ids=None, types=None, limit=50, cursor=None):
+        """
+        Items due in [start_ts, end_ts], ordered by due date.
+        Returns (items, next_cursor); pass next_cursor back to continue the window.
+        """
+        if course_ids:
+            course_ids = {as_course_id(course_id) for course_id in course_ids}
+        if types:
+            types = set(types)
+
+        with self._lock:
+            if cursor:
+                position = bisect.bisect_right(self._entries, decode_cursor(cursor))
+            else:
+                position = bisect.bisect_left(self._entries, (start_ts,)) if start_ts is not None else 0
+
+            items = []
+            last_entry = None
+            while position < len(self._entries):
+                entry = self._entries[position]
+                position += 1
+                if end_ts is not None and entry[0] > end_ts:
+                    break
+                item = self._items[entry]
+                if course_ids and item['course_id'] not in course_ids:
+                    continue
+                if types and item['type'] not in types:
+                    continue
+                if len(items) == limit:
+                    # There is at least one more match, so hand back a cursor
+                    return items, encode_cursor(last_entry)
+                items.append(dict(item, course_name=self._course_names.get(item['course_id'])))
+                last_entry = entry
+
+        return items, None
+
+
+# One timeline per user, fed by get_class_assignments and get_calendar_events
+timeline_indexes = UserRegistry(TimelineIndex)
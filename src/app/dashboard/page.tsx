@@ -4,7 +4,14 @@ import { signOut } from 'firebase/auth';
 import { auth } from '@/lib/firebase';
 import { useRouter } from 'next/navigation';
 import { useEffect, useState } from 'react';
-import { fetchAllCanvasDataFromBackend, isCacheExpired, clearCanvasCache } from '@/utils/canvas';
+import {
+  fetchAllCanvasDataFromBackend,
+  fetchDashboardView,
+  fetchUserProfile,
+  clearCanvasCache,
+  subscribeToCanvasUpdates,
+  DashboardView
+} from '@/utils/canvas';
 import Dashboard from '@/components/dashboard/Dashboard';
 import { extractUserProfile } from '@/utils/dashboardHelpers';
 
@@ -13,6 +20,7 @@ type CanvasDataResponse = Record<string, { data: unknown | null; error: string |
 
 export default function DashboardPage() {
   const router = useRouter();
+  const [dashboardView, setDashboardView] = useState<DashboardView | null>(null);
   const [canvasData, setCanvasData] = useState<CanvasDataResponse | null>(null);
   const [userName, setUserName] = useState('Student');
   const [userMajor, setUserMajor] = useState('Undeclared');
@@ -20,63 +28,80 @@ export default function DashboardPage() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
 
-  useEffect(() => {
-    const loadCanvasData = async () => {
-      setLoading(true);
-      setError(null);
-
-      try {
-        // Check if we need to refresh the cache
-        const shouldRefresh = isCacheExpired(30);
-
-        if (shouldRefresh) {
-          console.log('Cache expired or not found, fetching fresh Canvas data');
-        } else {
-          console.log('Using cached Canvas data');
-        }
-
-        // Fetch data from the Python backend
-        const data = await fetchAllCanvasDataFromBackend();
-
-        if (!data || Object.keys(data).length === 0) {
-          console.error('Empty Canvas data received');
-          setError('Failed to fetch Canvas data. Please try again later.');
-        } else {
-          console.log('Canvas data loaded successfully');
-          console.log('Canvas data keys:', Object.keys(data));
-
-          // Log a sample of the data structure
-          const sampleKey = Object.keys(data)[0];
-          if (sampleKey) {
-            console.log(`Sample data structure for ${sampleKey}:`, data[sampleKey]);
-          }
-
-          setCanvasData(data);
-
-          // Extract user profile information from Canvas data
-          const userProfile = extractUserProfile(data);
-          setUserName(userProfile.userName);
-          setUserMajor(userProfile.userMajor);
-          setUserInitials(userProfile.userInitials);
-        }
-      } catch (error) {
-        console.error('Error fetching Canvas data:', error);
-        setError('An error occurred while fetching Canvas data. Please try again later.');
-      } finally {
-        setLoading(false);
+  const applyUserProfile = (data: CanvasDataResponse) => {
+    const userProfile = extractUserProfile(data);
+    setUserName(userProfile.userName);
+    setUserMajor(userProfile.userMajor);
+    setUserInitials(userProfile.userInitials);
+  };
+
+  /**
+   * Load the dashboard the backend builds and keeps up to date. The full Canvas
+   * data is only fetched (and turned into a dashboard here) if that view can't be loaded.
+   */
+  const loadDashboard = async () => {
+    setLoading(true);
+    setError(null);
+
+    try {
+      const [view, profile] = await Promise.all([fetchDashboardView(), fetchUserProfile()]);
+
+      if (view) {
+        console.log(`Dashboard loaded (${view.loaded_courses} of ${view.courses.length} courses)`);
+        setDashboardView(view);
+        setCanvasData(null);
+        applyUserProfile({ user_profile: { data: profile, error: null } });
+        return;
       }
-    };
 
-    loadCanvasData();
+      console.log('Dashboard view unavailable, fetching all Canvas data');
+      const data = await fetchAllCanvasDataFromBackend();
 
-    // Set up a refresh interval (every 30 minutes)
-    const refreshInterval = setInterval(() => {
-      console.log('Refreshing Canvas data in the background');
-      loadCanvasData();
-    }, 30 * 60 * 1000); // 30 minutes
+      if (!data || Object.keys(data).length === 0) {
+        console.error('Empty Canvas data received');
+        setError('Failed to fetch Canvas data. Please try again later.');
+      } else {
+        console.log('Canvas data loaded successfully');
+        setDashboardView(null);
+        setCanvasData(data);
+        applyUserProfile(data);
+      }
+    } catch (error) {
+      console.error('Error fetching Canvas data:', error);
+      setError('An error occurred while fetching Canvas data. Please try again later.');
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const refreshDashboardView = async () => {
+    const view = await fetchDashboardView();
+    if (view) {
+      setDashboardView(view);
+      setCanvasData(null);
+    }
+  };
+
+  useEffect(() => {
+    loadDashboard();
+
+    // Course changes are pushed by the backend, so there is no periodic reload.
+    // The backend rebuilds the changed course's part of the view, so it is fetched
+    // again; a full reload only happens when the stream reports missed updates
+    const unsubscribe = subscribeToCanvasUpdates(
+      data => {
+        // Patched Canvas data only matters while the dashboard is built from it
+        setCanvasData(current => (current && data ? data : current));
+        refreshDashboardView();
+      },
+      () => {
+        console.log('Missed Canvas updates, reloading');
+        loadDashboard();
+      }
+    );
 
     return () => {
-      clearInterval(refreshInterval);
+      unsubscribe();
     };
   }, []);
 
@@ -93,34 +118,9 @@ export default function DashboardPage() {
 
   const handleRefresh = async () => {
     // Force a refresh of the Canvas data
+    console.log('Manually refreshing Canvas data...');
     clearCanvasCache();
-    setLoading(true);
-    setError(null);
-
-    try {
-      console.log('Manually refreshing Canvas data...');
-      const data = await fetchAllCanvasDataFromBackend();
-
-      if (!data || Object.keys(data).length === 0) {
-        console.error('Empty Canvas data received during refresh');
-        setError('Failed to refresh Canvas data. Please try again later.');
-      } else {
-        console.log('Canvas data refreshed successfully');
-        console.log('Refreshed Canvas data keys:', Object.keys(data));
-        setCanvasData(data);
-
-        // Extract user profile information from Canvas data
-        const userProfile = extractUserProfile(data);
-        setUserName(userProfile.userName);
-        setUserMajor(userProfile.userMajor);
-        setUserInitials(userProfile.userInitials);
-      }
-    } catch (error) {
-      console.error('Error refreshing Canvas data:', error);
-      setError('An error occurred while refreshing Canvas data. Please try again later.');
-    } finally {
-      setLoading(false);
-    }
+    await loadDashboard();
   };
 
   return (
@@ -130,6 +130,7 @@ export default function DashboardPage() {
       userInitials={userInitials}
       onLogout={handleLogout}
       onRefresh={handleRefresh}
+      dashboardView={dashboardView}
       canvasData={canvasData}
       loading={loading}
       error={error}
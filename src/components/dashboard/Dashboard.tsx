@@ -20,7 +20,7 @@ import {
   extractStatistics
 } from '@/utils/dashboardHelpers';
 import { saveCustomCourseName, getAllCustomCourseNames } from '@/utils/courseNameUtils';
-import { fetchCourseDetails } from '@/utils/canvas';
+import { fetchCourseDetails, DashboardView } from '@/utils/canvas';
 
 // Empty arrays for when Canvas data is not yet loaded
 const emptyCourses: DashboardCourse[] = [];
@@ -33,6 +33,7 @@ export interface DashboardProps {
   userInitials?: string;
   onLogout?: () => void;
   onRefresh?: () => void;
+  dashboardView?: DashboardView | null;
   canvasData?: CanvasDataResponse | null;
   loading?: boolean;
   error?: string | null;
@@ -44,6 +45,7 @@ const Dashboard: React.FC<DashboardProps> = ({
   userInitials = 'JD',
   onLogout,
   onRefresh,
+  dashboardView,
   canvasData,
   loading = false,
   error = null,
@@ -65,9 +67,33 @@ const Dashboard: React.FC<DashboardProps> = ({
   const [isEditModalOpen, setIsEditModalOpen] = useState(false);
   const [selectedCourse, setSelectedCourse] = useState<DashboardCourse | null>(null);
 
-  // Extract data from Canvas API response
+  // Use the dashboard built by the backend
   useEffect(() => {
-    if (canvasData) {
+    if (!dashboardView) return;
+
+    const applyView = async () => {
+      // Custom course names live in Firestore, so they are applied here
+      let customCourseNames: Record<number, string> = {};
+      try {
+        customCourseNames = await getAllCustomCourseNames();
+      } catch (error) {
+        console.error('Error loading custom course names:', error);
+      }
+
+      setCourses(dashboardView.courses.map(course =>
+        customCourseNames[course.id] ? { ...course, name: customCourseNames[course.id] } : course
+      ));
+    };
+
+    applyView();
+    setAssignments(dashboardView.assignments);
+    setAnnouncements(dashboardView.announcements);
+    setStats(dashboardView.statistics);
+  }, [dashboardView]);
+
+  // Extract data from Canvas API response (when the backend's dashboard couldn't be loaded)
+  useEffect(() => {
+    if (canvasData && !dashboardView) {
       console.log('Dashboard received canvasData:', Object.keys(canvasData));
 
       // Extract courses (async function)
@@ -154,7 +180,7 @@ const Dashboard: React.FC<DashboardProps> = ({
       console.log('Extracted stats:', extractedStats);
       setStats(extractedStats);
     }
-  }, [canvasData]);
+  }, [canvasData, dashboardView]);
 
   // Color mapping for course cards
   const colorOptions = ['blue', 'purple', 'green', 'amber', 'pink', 'indigo', 'emerald', 'rose'] as const;
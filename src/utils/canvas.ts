@@ -1,4 +1,5 @@
 import { auth } from '@/lib/firebase';
+import type { DashboardCourse, DashboardAssignment, DashboardAnnouncement } from './dashboardHelpers';
 
 // Type definitions
 export interface CanvasDataResponse {
@@ -189,6 +190,82 @@ export async function fetchCourseDetails(courseId: string): Promise<CanvasDataRe
   }
 }
 
+// Dashboard document precomputed by the backend
+export interface DashboardView {
+  courses: DashboardCourse[];
+  assignments: DashboardAssignment[];
+  announcements: DashboardAnnouncement[];
+  statistics: {
+    gpa: string;
+    completedCredits: number;
+    upcomingDeadlines: number;
+    dueThisWeek: number;
+  };
+  loaded_courses: number;
+  generated_at: number;
+}
+
+/**
+ * Fetch the user's dashboard, already built by the backend
+ * @returns Promise that resolves to the dashboard, or null if it couldn't be loaded
+ */
+export async function fetchDashboardView(): Promise<DashboardView | null> {
+  try {
+    const response = await fetch(`${PYTHON_BACKEND_URL}/api/canvas/dashboard?user_id=${auth.currentUser?.uid}`);
+
+    if (!response.ok) {
+      throw new Error(`Failed to fetch dashboard: ${response.statusText}`);
+    }
+
+    const data = await response.json();
+
+    if (data.error) {
+      throw new Error(`Error fetching dashboard: ${data.error}`);
+    }
+
+    return data.data as DashboardView;
+  } catch (error) {
+    console.error('Error fetching dashboard:', error);
+    return null;
+  }
+}
+
+/**
+ * Fetch the current user's Canvas profile
+ * @returns Promise that resolves to the profile, or null if it couldn't be loaded
+ */
+export async function fetchUserProfile(): Promise<unknown | null> {
+  try {
+    const response = await fetch(`${PYTHON_BACKEND_URL}/api/canvas/user-profile?user_id=${auth.currentUser?.uid}`);
+
+    if (!response.ok) {
+      throw new Error(`Failed to fetch user profile: ${response.statusText}`);
+    }
+
+    const data = await response.json();
+
+    if (data.error) {
+      throw new Error(`Error fetching user profile: ${data.error}`);
+    }
+
+    return data.data;
+  } catch (error) {
+    console.error('Error fetching user profile:', error);
+    return null;
+  }
+}
+
+/**
+ * URL of a course file served through the backend's shared file cache
+ * (use it instead of the Canvas file URL; byte ranges are supported)
+ * @param courseId The Canvas course ID
+ * @param fileId The Canvas file ID
+ * @returns The download URL for the current user
+ */
+export function courseFileUrl(courseId: number | string, fileId: number | string): string {
+  return `${PYTHON_BACKEND_URL}/api/canvas/course-files/${courseId}/${fileId}/content?user_id=${auth.currentUser?.uid}`;
+}
+
 /**
  * Fetch all Canvas data from the backend
  * This is the main function used by the dashboard to get all data
@@ -348,3 +425,159 @@ export function clearCanvasCache(): void {
     console.error('Error clearing Canvas cache:', error);
   }
 }
+
+// Patch format produced by backend/snapshot_diff.py
+interface SnapshotPatch {
+  set?: Record<string, unknown>;
+  unset?: string[];
+  patch?: Record<string, SnapshotPatch>;
+  add?: Record<string, unknown>[];
+  update?: [unknown, SnapshotPatch][];
+  remove?: unknown[];
+  order?: unknown[];
+}
+
+function isListPatch(patch: SnapshotPatch): boolean {
+  return ['add', 'update', 'remove', 'order'].some(key => key in patch);
+}
+
+/**
+ * Whether a patch changes content the cached value doesn't have, e.g. a section
+ * left out because the course was loaded with load_*=false
+ * @param value The cached value
+ * @param patch The patch to apply
+ * @returns True if the full value should be fetched instead of patched
+ */
+function patchNeedsBase(value: unknown, patch: SnapshotPatch): boolean {
+  if (value === undefined || value === null) {
+    return Boolean(
+      patch.update?.length || patch.remove?.length || patch.unset?.length || Object.keys(patch.patch || {}).length
+    );
+  }
+  if (Array.isArray(value)) {
+    return false;
+  }
+  return Object.entries(patch.patch || {}).some(([key, subPatch]) =>
+    patchNeedsBase((value as Record<string, unknown>)[key], subPatch)
+  );
+}
+
+/**
+ * Fetch one course's full snapshot, bypassing the local cache
+ * @param courseId The course ID
+ * @returns The course data, or null if it couldn't be loaded
+ */
+async function fetchCourseSnapshot(courseId: string): Promise<CourseData | null> {
+  const response = await fetch(`${PYTHON_BACKEND_URL}/api/canvas/course-data/${courseId}?user_id=${auth.currentUser?.uid}`);
+  if (!response.ok) {
+    return null;
+  }
+  const data = await response.json();
+  return data.error ? null : (data.course_data as CourseData);
+}
+
+/**
+ * Apply a course snapshot patch from the backend without mutating the input
+ * @param value The cached value (object, or list of entities with ids)
+ * @param patch The patch to apply
+ * @returns The patched value
+ */
+function applySnapshotPatch(value: unknown, patch: SnapshotPatch): unknown {
+  // A section missing from the cached value takes its container type from the patch
+  const isMissing = value === undefined || value === null;
+  if (Array.isArray(value) || (isMissing && isListPatch(patch))) {
+    const removed = new Set(patch.remove || []);
+    const updates = new Map(patch.update || []);
+    const entities = Array.isArray(value) ? value : [];
+    const result = entities
+      .filter(entity => !removed.has(entity.id))
+      .map(entity => (updates.has(entity.id) ? applySnapshotPatch(entity, updates.get(entity.id)!) : entity));
+    result.push(...(patch.add || []));
+
+    if (patch.order) {
+      const position = new Map(patch.order.map((id, index) => [id, index]));
+      result.sort((a, b) => (position.get(a.id) ?? position.size) - (position.get(b.id) ?? position.size));
+    }
+    return result;
+  }
+
+  const result: Record<string, unknown> = { ...((value as Record<string, unknown>) || {}) };
+  (patch.unset || []).forEach(key => delete result[key]);
+  Object.assign(result, patch.set || {});
+  Object.entries(patch.patch || {}).forEach(([key, subPatch]) => {
+    result[key] = applySnapshotPatch(result[key], subPatch);
+  });
+  return result;
+}
+
+/**
+ * Subscribe to pushed course updates from the backend.
+ * Patches are applied to the cached course data, which keeps the cache fresh for as long
+ * as the stream is open, so no periodic full reload is needed. A course whose cached copy
+ * lacks a section the patch changes is fetched in full instead. Without cached data
+ * (e.g. on the dashboard, which loads its view from the backend) onUpdate gets null.
+ * @param onUpdate Called with the patched data and the updated course after every update
+ * @param onResync Called when updates may have been missed and the data should be reloaded
+ * @returns A function that closes the stream
+ */
+export function subscribeToCanvasUpdates(
+  onUpdate: (data: CanvasDataResponse | null, courseId: number) => void,
+  onResync?: () => void
+): () => void {
+  const source = new EventSource(`${PYTHON_BACKEND_URL}/api/canvas/stream?user_id=${auth.currentUser?.uid}`);
+  let disconnected = false;
+
+  // EventSource reconnects by itself; anything pushed while it was away is lost
+  source.addEventListener('error', () => {
+    disconnected = true;
+  });
+  source.addEventListener('ready', () => {
+    if (disconnected) {
+      disconnected = false;
+      localStorage.removeItem(CANVAS_CACHE_TIMESTAMP_KEY);
+      onResync?.();
+    }
+  });
+
+  source.addEventListener('course_update', async event => {
+    try {
+      const update = JSON.parse((event as MessageEvent).data);
+      if (!getCachedCanvasData()) {
+        onUpdate(null, update.course_id);
+        return;
+      }
+
+      const cacheKey = `complete_class_data_${update.course_id}`;
+      const cachedCourse = getCachedCanvasData()?.[cacheKey]?.data;
+
+      let courseData: CourseData | null;
+      if (!cachedCourse || patchNeedsBase(cachedCourse, update.patch)) {
+        courseData = await fetchCourseSnapshot(String(update.course_id));
+      } else {
+        courseData = applySnapshotPatch(cachedCourse, update.patch) as CourseData;
+      }
+
+      // Read the cache again: it may have changed while the course was loading
+      const cachedData = getCachedCanvasData();
+      if (!cachedData || !courseData) return;
+
+      const newCachedData = { ...cachedData, [cacheKey]: { data: courseData, error: null } };
+      if (courseData.professors) {
+        newCachedData[`class_professors_${update.course_id}`] = { data: courseData.professors, error: null };
+      }
+
+      updateCanvasCache(newCachedData);
+      onUpdate(newCachedData, update.course_id);
+    } catch (error) {
+      console.error('Error applying Canvas update:', error);
+    }
+  });
+
+  // The server dropped updates we never saw; refetch everything
+  source.addEventListener('resync', () => {
+    localStorage.removeItem(CANVAS_CACHE_TIMESTAMP_KEY);
+    onResync?.();
+  });
+
+  return () => source.close();
+}